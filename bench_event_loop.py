@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+事件循环延迟测试：发送大数据请求的同时，持续请求 /health 测量插件（即AstrBot事件循环）的响应延迟
+
+分别用 offload_threshold_kb 为默认值和设为很大的值（相当于全部在事件循环中执行）运行，对比负载下的延迟。
+"""
+
+import os
+import statistics
+import threading
+import time
+
+import requests
+
+# 测试配置
+BASE_URL = "http://localhost:11451"
+API_PATH = "/api/render/image"
+HEADERS = {
+    'X-Html-Template': 'notification',
+    'X-Target-Type': 'group',
+    'X-Target-Id': '000000000',
+}
+IMAGE_SIZE = 3 * 1024 * 1024
+LOAD_REQUESTS = 10
+LOAD_PARALLEL = 2
+PROBE_INTERVAL = 0.01
+
+def probe_latency(stop_event, latencies):
+    """持续请求 /health，记录每次的响应时间(ms)"""
+    session = requests.Session()
+    while not stop_event.is_set():
+        start_time = time.perf_counter()
+        try:
+            session.get(f"{BASE_URL}/health", timeout=30)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(PROBE_INTERVAL)
+
+def send_large_requests(count, results):
+    """发送带大图片的模板渲染请求（每次内容不同，避免命中渲染缓存）"""
+    session = requests.Session()
+    for i in range(count):
+        image = b'\x89PNG\r\n\x1a\n' + os.urandom(IMAGE_SIZE)
+        data = {'title': f'事件循环延迟测试 {i}', 'content': '大图片负载'}
+        files = {'image': ('large.png', image, 'image/png')}
+        try:
+            response = session.post(f"{BASE_URL}{API_PATH}", headers=HEADERS, data=data, files=files, timeout=120)
+            results.append(response.status_code)
+        except requests.exceptions.RequestException as e:
+            results.append(e.__class__.__name__)
+
+def summarize(title, latencies):
+    if not latencies:
+        print(f"   {title}: 没有数据")
+        return
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+    print(f"   {title}: {len(latencies):4d} 次  p50 {statistics.median(latencies):7.2f} ms  "
+          f"p95 {p95:7.2f} ms  最大 {latencies[-1]:7.2f} ms")
+
+def measure(duration=None, load=False):
+    stop_event = threading.Event()
+    latencies = []
+    prober = threading.Thread(target=probe_latency, args=(stop_event, latencies))
+    prober.start()
+
+    results = []
+    if load:
+        workers = [threading.Thread(target=send_large_requests, args=(LOAD_REQUESTS // LOAD_PARALLEL, results))
+                   for _ in range(LOAD_PARALLEL)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    else:
+        time.sleep(duration)
+
+    stop_event.set()
+    prober.join()
+    return latencies, results
+
+if __name__ == "__main__":
+    print("🚀 事件循环延迟测试")
+    print(f"📡 目标: {BASE_URL}")
+    print(f"📦 负载: {LOAD_REQUESTS} 个 {IMAGE_SIZE // 1024 // 1024}MB 图片请求，{LOAD_PARALLEL} 个并发")
+    print("-" * 50)
+
+    try:
+        requests.get(f"{BASE_URL}/health", timeout=5).raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 无法连接到插件: {e}")
+        raise SystemExit(1)
+
+    idle_latencies, _ = measure(duration=3)
+    load_latencies, results = measure(load=True)
+
+    print("\n⏱️ /health 响应延迟")
+    summarize("空闲", idle_latencies)
+    summarize("负载", load_latencies)
+    print(f"\n📨 负载请求结果: {results}")
+
+    offload = requests.get(f"{BASE_URL}/health", timeout=5).json().get('offload', {})
+    print(f"\n🧵 执行器: {offload.get('mode')}，{offload.get('max_workers')} 个工作线程/进程，阈值 {offload.get('threshold_bytes')} bytes")
+    for stage, stats in offload.get('stages', {}).items():
+        print(f"   {stage:16s} 内联 {stats['inline']:4d}  转交 {stats['offloaded']:4d}  "
+              f"平均排队 {stats['avg_wait_ms']:6.2f} ms  平均执行 {stats['avg_run_ms']:7.2f} ms")
+
+    print("\n" + "="*50)
+    print("📝 说明:")
+    print("负载下的延迟应与空闲时接近；把 offload_threshold_kb 设为很大的值后重新运行，可以看到大请求阻塞事件循环时的延迟")
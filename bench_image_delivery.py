@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+渲染图片发送方式性能对比
+
+对每种大小的图片，比较构建图片消息段的几种方式：
+- 同步编码：在事件循环中一次性读取并base64编码（旧的做法）
+- 线程编码：在线程中分块读取并编码（image_delivery=base64，缓存未命中）
+- 缓存命中：同一张图片再次发送（image_delivery=base64，缓存命中）
+- file路径：直接传递 file:// 路径（image_delivery=file）
+
+同时记录事件循环在构建期间的最长阻塞时间。
+"""
+
+import asyncio
+import base64
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from image_processing import read_file_base64
+
+# 测试配置
+ROUNDS = 10
+IMAGE_SIZES_MB = [1, 4, 16]
+
+def encode_inline(path):
+    with open(path, 'rb') as f:
+        return f"base64://{base64.b64encode(f.read()).decode('utf-8')}"
+
+async def encode_in_thread(path):
+    return f"base64://{await asyncio.to_thread(read_file_base64, path)}"
+
+async def measure(build):
+    """重复构建ROUNDS次，返回(平均耗时ms, 事件循环最长阻塞ms)"""
+    lags = []
+    running = True
+
+    async def heartbeat():
+        while running:
+            start_time = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - start_time - 0.001)
+
+    beat_task = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0.01)
+    elapsed = 0.0
+    for _ in range(ROUNDS):
+        start_time = time.perf_counter()
+        await build()
+        elapsed += time.perf_counter() - start_time
+        # 留出时间让心跳任务运行，每次阻塞单独计算
+        await asyncio.sleep(0.005)
+    running = False
+    await beat_task
+    return elapsed / ROUNDS * 1000, max(lags) * 1000 if lags else 0.0
+
+async def main():
+    print("🚀 渲染图片发送方式性能对比")
+    print(f"🔁 每项 {ROUNDS} 次")
+    print("-" * 50)
+
+    for size_mb in IMAGE_SIZES_MB:
+        fd, path = tempfile.mkstemp(suffix='.png')
+        os.write(fd, b'\x89PNG\r\n\x1a\n' + os.urandom(size_mb * 1024 * 1024))
+        os.close(fd)
+        try:
+            cache = {}
+
+            async def sync_build():
+                encode_inline(path)
+
+            async def thread_build():
+                await encode_in_thread(path)
+
+            async def cached_build():
+                key = (path, os.path.getsize(path), os.stat(path).st_mtime_ns)
+                if key not in cache:
+                    cache[key] = await encode_in_thread(path)
+                return cache[key]
+
+            async def file_build():
+                Path(os.path.abspath(path)).as_uri()
+
+            print(f"\n🖼️ {size_mb}MB 图片")
+            for title, build in (('同步编码', sync_build), ('线程编码', thread_build),
+                                 ('缓存命中', cached_build), ('file路径', file_build)):
+                elapsed, max_lag = await measure(build)
+                print(f"   {title}: 平均 {elapsed:8.2f} ms  事件循环最长阻塞 {max_lag:7.2f} ms")
+        finally:
+            os.remove(path)
+
+    print("\n" + "="*50)
+    print("📝 说明:")
+    print("缓存命中的平均耗时包含第一次编码；file路径要求OneBot实现能以相同路径读取插件的文件")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+二维码生成性能对比：本地编码器 vs 在线API
+"""
+
+import os
+import sys
+import time
+from urllib.parse import quote
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from qr_encoder import generate_qr_code
+
+# 测试配置
+REMOTE_API = "https://api.2dcode.biz/v1/create-qr-code?data="
+LOCAL_ROUNDS = 50
+REMOTE_ROUNDS = 5
+TEST_URLS = [
+    "https://github.com/Akinokuni/astrbot_plugin_http_render_bridge",
+    "https://example.com/activity/2024/registration?id=123456&from=astrbot&channel=group",
+    "https://example.com/" + "a" * 300,
+]
+
+def bench_local(url, image_format='png', error_correction='M'):
+    """本地生成，返回平均耗时(ms)和图片大小"""
+    start_time = time.perf_counter()
+    for _ in range(LOCAL_ROUNDS):
+        image = generate_qr_code(url, error_correction=error_correction, image_format=image_format)
+    return (time.perf_counter() - start_time) / LOCAL_ROUNDS * 1000, len(image)
+
+def bench_remote(url):
+    """调用在线API，返回平均耗时(ms)和图片大小；网络不可用时返回None"""
+    session = requests.Session()
+    try:
+        start_time = time.perf_counter()
+        for _ in range(REMOTE_ROUNDS):
+            response = session.get(REMOTE_API + quote(url, safe=''), timeout=10)
+            response.raise_for_status()
+        return (time.perf_counter() - start_time) / REMOTE_ROUNDS * 1000, len(response.content)
+    except requests.exceptions.RequestException as e:
+        print(f"   ⚠️ 在线API不可用: {e.__class__.__name__}")
+        return None
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    print("🚀 二维码生成性能对比")
+    print(f"🔁 本地每项 {LOCAL_ROUNDS} 次，在线API每项 {REMOTE_ROUNDS} 次")
+    print("-" * 50)
+
+    for url in TEST_URLS:
+        print(f"\n🔗 {url[:60]}{'...' if len(url) > 60 else ''} ({len(url)} 字符)")
+        for image_format in ('png', 'svg'):
+            for level in ('L', 'M', 'H'):
+                avg_ms, size = bench_local(url, image_format, level)
+                print(f"   本地 {image_format} {level}: {avg_ms:8.2f} ms  {size:6d} bytes")
+
+        result = bench_remote(url)
+        if result:
+            avg_ms, size = result
+            print(f"   在线API png: {avg_ms:8.2f} ms  {size:6d} bytes")
+
+    print("\n" + "="*50)
+    print("📝 说明:")
+    print("本地生成在插件中会放到线程中执行，不阻塞事件循环；在线API的耗时包含网络往返")
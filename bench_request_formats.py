@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+请求体格式性能对比：multipart/form-data vs JSON vs MessagePack
+
+在本地启动一个只解析请求体的aiohttp服务，分别统计客户端编码耗时、服务端解析耗时和请求体大小。
+服务端的multipart解析与插件一致（逐字段分块读取），JSON/MessagePack使用插件的 parse_structured_body。
+"""
+
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from request_body import MSGPACK_AVAILABLE, parse_structured_body
+
+if MSGPACK_AVAILABLE:
+    import msgpack
+
+# 测试配置
+ROUNDS = 200
+PORT = 18451
+IMAGE = b'\x89PNG\r\n\x1a\n' + os.urandom(200 * 1024)
+PAYLOADS = {
+    "3个短文本字段": {"title": "服务器告警", "content": "CPU使用率超过90%", "timestamp": "2024-10-30 18:00"},
+    "文本+200KB图片": {"title": "图片通知", "content": "带图片的通知", "image": ("image.png", IMAGE)},
+    "50行报表": {"title": "日报", "rows": [{"name": f"项目{i}", "value": i * 1.5, "ok": i % 3 != 0} for i in range(50)]},
+}
+
+def encode_multipart(fields):
+    """构建multipart请求体；结构化字段只能序列化成JSON字符串"""
+    writer = aiohttp.MultipartWriter('form-data')
+    for name, value in fields.items():
+        if isinstance(value, tuple):
+            part = writer.append(value[1], {'Content-Type': 'application/octet-stream'})
+            part.set_content_disposition('form-data', name=name, filename=value[0])
+        else:
+            text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+            part = writer.append(text)
+            part.set_content_disposition('form-data', name=name)
+    return writer
+
+def encode_json(fields):
+    payload = {
+        name: {"filename": value[0], "base64": base64.b64encode(value[1]).decode('ascii')} if isinstance(value, tuple) else value
+        for name, value in fields.items()
+    }
+    return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+def encode_msgpack(fields):
+    payload = {
+        name: {"filename": value[0], "data": value[1]} if isinstance(value, tuple) else value
+        for name, value in fields.items()
+    }
+    return msgpack.packb(payload, use_bin_type=True)
+
+parse_times = []
+
+async def parse_handler(request):
+    start_time = time.perf_counter()
+    if request.content_type == 'multipart/form-data':
+        reader = await request.multipart()
+        async for field in reader:
+            chunks = []
+            while True:
+                chunk = await field.read_chunk(64 * 1024)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            if not field.filename:
+                field.decode(b''.join(chunks)).decode('utf-8')
+    else:
+        parse_structured_body(await request.read(), request.content_type)
+    parse_times.append(time.perf_counter() - start_time)
+    return web.Response(text='ok')
+
+async def bench(session, name, make_body, content_type=None):
+    """返回(编码耗时ms, 解析耗时ms, 请求体大小)"""
+    parse_times.clear()
+    encode_time = 0
+    size = 0
+    for _ in range(ROUNDS):
+        start_time = time.perf_counter()
+        body = make_body()
+        encode_time += time.perf_counter() - start_time
+        if isinstance(body, aiohttp.MultipartWriter):
+            size = body.size
+            async with session.post(f'http://127.0.0.1:{PORT}/parse', data=body) as response:
+                await response.read()
+        else:
+            size = len(body)
+            async with session.post(f'http://127.0.0.1:{PORT}/parse', data=body, headers={'Content-Type': content_type}) as response:
+                await response.read()
+    return encode_time / ROUNDS * 1000, sum(parse_times) / len(parse_times) * 1000, size
+
+async def main():
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post('/parse', parse_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', PORT).start()
+
+    print("🚀 请求体格式性能对比")
+    print(f"🔁 每项 {ROUNDS} 次" + ("" if MSGPACK_AVAILABLE else "（未安装msgpack，跳过MessagePack）"))
+    print("-" * 50)
+
+    async with aiohttp.ClientSession() as session:
+        for title, fields in PAYLOADS.items():
+            print(f"\n📦 {title}")
+            formats = [
+                ('multipart', lambda: encode_multipart(fields), None),
+                ('json', lambda: encode_json(fields), 'application/json'),
+            ]
+            if MSGPACK_AVAILABLE:
+                formats.append(('msgpack', lambda: encode_msgpack(fields), 'application/msgpack'))
+            for name, make_body, content_type in formats:
+                encode_ms, parse_ms, size = await bench(session, name, make_body, content_type)
+                print(f"   {name:10s} 编码 {encode_ms:7.3f} ms  解析 {parse_ms:7.3f} ms  {size:8d} bytes")
+
+    await runner.cleanup()
+
+    print("\n" + "="*50)
+    print("📝 说明:")
+    print("multipart中的结构化字段（如报表行）只能作为JSON字符串传递，模板无法直接遍历")
+    print("JSON中的图片需要base64编码，体积增加约三分之一；MessagePack直接传输二进制")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,599 @@
+"""
+渲染结果、二维码、上传资源和渲染图片消息段数据的缓存
+
+缓存只在事件循环中访问，文件读写在线程中进行。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+from .image_processing import IMAGE_HEADER_SIZE, detect_image_type
+
+# 资源存储复制文件时每次读取的字节数
+COPY_CHUNK_SIZE = 256 * 1024
+
+
+def delete_file(path: str):
+    """删除文件，文件不存在或无法删除时忽略"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class RenderCache:
+    """渲染结果缓存 - 以模板名、模板版本和渲染数据的哈希为键的LRU缓存
+
+    本地图片会被复制到缓存目录中由缓存自行管理，容量同时受条目数和总字节数限制。
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 256, max_bytes: int = 128 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def load(self):
+        """启动时清理上次运行留下的缓存文件（没有索引，无法复用），在线程中执行避免阻塞事件循环"""
+        await asyncio.to_thread(shutil.rmtree, self.cache_dir, True)
+
+    @staticmethod
+    def make_key(template_name: str, template_version: str, data: Dict[str, Any],
+                 default: Callable[[Any], Any] = str) -> str:
+        """根据模板名、模板版本和规范化后的渲染数据计算缓存键，default用于序列化JSON不支持的值（如上传图片）"""
+        normalized = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=default)
+        digest = hashlib.sha256()
+        for part in (template_name, template_version, normalized):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """查询缓存，命中时返回图片路径或URL"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        # 过期或文件已被删除的条目视为未命中
+        if entry['expires_at'] <= time.monotonic() or (entry['local'] and not os.path.exists(entry['path'])):
+            self._remove(key)
+            self.misses += 1
+            return None
+        
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry['path']
+
+    async def put(self, key: str, template_name: str, image: str, ttl: float):
+        """写入缓存，本地图片会复制一份到缓存目录"""
+        if ttl <= 0 or self.max_entries <= 0 or not image:
+            return
+        
+        local = not image.startswith('http') and os.path.exists(image)
+        path = image
+        size = len(image)
+        try:
+            if local:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                ext = os.path.splitext(image)[1] or '.png'
+                path = os.path.join(self.cache_dir, f"{key}{ext}")
+                await asyncio.to_thread(shutil.copyfile, image, path)
+                size = os.path.getsize(path)
+        except Exception as e:
+            logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 写入渲染缓存失败: {e}")
+            return
+        
+        if key in self.entries:
+            self._remove(key)
+        
+        if size > self.max_bytes:
+            if local:
+                delete_file(path)
+            return
+        
+        self.entries[key] = {
+            'path': path,
+            'local': local,
+            'size': size,
+            'template': template_name,
+            'expires_at': time.monotonic() + ttl
+        }
+        self.total_bytes += size
+        
+        # 超出容量时淘汰最久未使用的条目
+        while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            oldest_key = next(iter(self.entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def invalidate_template(self, template_name: str) -> int:
+        """使指定模板的所有缓存条目失效，返回失效的条目数"""
+        keys = [key for key, entry in self.entries.items() if entry['template'] == template_name]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.total_bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.total_bytes -= entry['size']
+        if entry['local']:
+            delete_file(entry['path'])
+
+
+class QRCodeCache:
+    """二维码缓存 - 内存LRU + 按内容寻址的磁盘存储
+
+    键由链接和二维码参数计算得出；磁盘上 keys/ 目录记录键到内容哈希的映射，objects/ 目录按内容哈希保存图片，
+    相同内容只存一份，重启后仍然有效。两层分别受条目数/字节数和磁盘字节数限制。
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 512, max_bytes: int = 16 * 1024 * 1024,
+                 max_disk_bytes: int = 64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.keys_dir = os.path.join(cache_dir, 'keys')
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self.total_bytes = 0
+        self.disk_objects: "OrderedDict[str, int]" = OrderedDict()
+        # 内容哈希 -> 指向它的键，删除内容时一起删除键文件；以及反向的 键 -> 内容哈希
+        self.disk_keys: Dict[str, set] = {}
+        self.disk_key_hashes: Dict[str, str] = {}
+        self.disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    async def load(self):
+        """启动时在线程中扫描磁盘缓存，避免阻塞事件循环"""
+        if self.max_disk_bytes > 0:
+            await asyncio.to_thread(self._scan_disk)
+
+    @staticmethod
+    def make_key(data: str, *options: Any) -> str:
+        """根据链接和二维码参数（引擎、格式、纠错等级、尺寸等）计算缓存键"""
+        digest = hashlib.sha256()
+        for part in (data, *options):
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """查询缓存，先查内存再查磁盘，磁盘命中的内容会放回内存"""
+        image = self.entries.get(key)
+        if image is not None:
+            self.entries.move_to_end(key)
+            self.memory_hits += 1
+            return image
+
+        if self.max_disk_bytes > 0:
+            content_hash, image = await asyncio.to_thread(self._read_disk, key)
+            if image is not None:
+                if content_hash in self.disk_objects:
+                    self.disk_objects.move_to_end(content_hash)
+                self.disk_hits += 1
+                self._put_memory(key, image)
+                return image
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, image: bytes):
+        """写入两层缓存
+
+        磁盘记录在事件循环中更新，超出磁盘容量时淘汰的文件和新内容在同一次线程调用中删除和写入。
+        """
+        if not image:
+            return
+        self._put_memory(key, image)
+
+        if self.max_disk_bytes <= 0 or len(image) > self.max_disk_bytes:
+            return
+        content_hash = hashlib.sha256(image).hexdigest()
+        new_object = content_hash not in self.disk_objects
+        if new_object:
+            self.disk_objects[content_hash] = len(image)
+            self.disk_bytes += len(image)
+        self.disk_objects.move_to_end(content_hash)
+        # 键改为指向新的内容时，从旧内容的键集合中移除，旧内容被淘汰时不再删除这个键
+        old_hash = self.disk_key_hashes.get(key)
+        if old_hash is not None and old_hash != content_hash:
+            self._forget_disk_key(key, old_hash)
+        self.disk_key_hashes[key] = content_hash
+        self.disk_keys.setdefault(content_hash, set()).add(key)
+
+        # 超出磁盘容量时淘汰最久未使用的内容和指向它的键
+        evicted_paths = []
+        while self.disk_objects and self.disk_bytes > self.max_disk_bytes:
+            oldest_hash, size = self.disk_objects.popitem(last=False)
+            self.disk_bytes -= size
+            self.disk_evictions += 1
+            evicted_paths.append(os.path.join(self.objects_dir, oldest_hash))
+            for old_key in self.disk_keys.pop(oldest_hash, ()):
+                self.disk_key_hashes.pop(old_key, None)
+                evicted_paths.append(os.path.join(self.keys_dir, old_key))
+
+        try:
+            await asyncio.to_thread(self._write_disk, key, content_hash, image, evicted_paths)
+        except OSError as e:
+            logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 写入二维码磁盘缓存失败: {e}")
+            # 撤销本次写入的记录（淘汰的文件已经删除）
+            if self.disk_key_hashes.get(key) == content_hash:
+                self._forget_disk_key(key, content_hash)
+                del self.disk_key_hashes[key]
+            if new_object and content_hash in self.disk_objects and not self.disk_keys.get(content_hash):
+                self.disk_bytes -= self.disk_objects.pop(content_hash)
+
+    def _forget_disk_key(self, key: str, content_hash: str):
+        keys = self.disk_keys.get(content_hash)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.disk_keys[content_hash]
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.total_bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'disk_objects': len(self.disk_objects),
+            'disk_bytes': self.disk_bytes,
+            'max_disk_bytes': self.max_disk_bytes,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'disk_evictions': self.disk_evictions,
+            'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+        }
+
+    def _put_memory(self, key: str, image: bytes):
+        if self.max_entries <= 0 or len(image) > self.max_bytes:
+            return
+        old_image = self.entries.pop(key, None)
+        if old_image is not None:
+            self.total_bytes -= len(old_image)
+        self.entries[key] = image
+        self.total_bytes += len(image)
+
+        # 超出容量时淘汰最久未使用的条目
+        while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+            self.evictions += 1
+
+    def _scan_disk(self):
+        """启动时按修改时间从旧到新载入磁盘上已有的内容，删除指向不存在内容的键文件"""
+        try:
+            os.makedirs(self.keys_dir, exist_ok=True)
+            os.makedirs(self.objects_dir, exist_ok=True)
+            objects = []
+            with os.scandir(self.objects_dir) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.endswith('.tmp'):
+                        stat = entry.stat()
+                        objects.append((stat.st_mtime, entry.name, stat.st_size))
+            known_hashes = {name for _, name, _ in objects}
+            
+            disk_keys: Dict[str, set] = {}
+            orphaned_keys = 0
+            with os.scandir(self.keys_dir) as it:
+                for entry in it:
+                    if not entry.is_file():
+                        continue
+                    try:
+                        with open(entry.path, 'r', encoding='utf-8') as f:
+                            content_hash = f.read().strip()
+                    except OSError:
+                        content_hash = ''
+                    if entry.name.endswith('.tmp') or content_hash not in known_hashes:
+                        delete_file(entry.path)
+                        orphaned_keys += 1
+                    else:
+                        disk_keys.setdefault(content_hash, set()).add(entry.name)
+        except OSError as e:
+            logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 读取二维码磁盘缓存失败: {e}")
+            return
+
+        # 扫描期间已经写入的内容保留原记录
+        for _, name, size in sorted(objects, reverse=True):
+            if name not in self.disk_objects:
+                self.disk_objects[name] = size
+                self.disk_objects.move_to_end(name, last=False)
+                self.disk_bytes += size
+        for content_hash, keys in disk_keys.items():
+            for key in keys:
+                if key not in self.disk_key_hashes:
+                    self.disk_key_hashes[key] = content_hash
+                    self.disk_keys.setdefault(content_hash, set()).add(key)
+        logger.info(f"[AstrBot Plugin HTTP Render Bridge] 载入二维码磁盘缓存: {len(self.disk_objects)} 个文件，"
+                    f"{self.disk_bytes} bytes，清理了 {orphaned_keys} 个失效的键")
+
+    def _read_disk(self, key: str) -> Tuple[Optional[str], Optional[bytes]]:
+        key_path = os.path.join(self.keys_dir, key)
+        try:
+            with open(key_path, 'r', encoding='utf-8') as f:
+                content_hash = f.read().strip()
+        except OSError:
+            return None, None
+        object_path = os.path.join(self.objects_dir, content_hash)
+        try:
+            with open(object_path, 'rb') as f:
+                image = f.read()
+        except OSError:
+            # 内容已被删除，键文件随之删除
+            delete_file(key_path)
+            return None, None
+
+        # 内容损坏时删除，视为未命中
+        if hashlib.sha256(image).hexdigest() != content_hash:
+            delete_file(key_path)
+            delete_file(object_path)
+            return None, None
+        os.utime(object_path)
+        return content_hash, image
+
+    def _write_disk(self, key: str, content_hash: str, image: bytes, evicted_paths: List[str] = ()):
+        for path in evicted_paths:
+            delete_file(path)
+        os.makedirs(self.keys_dir, exist_ok=True)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        object_path = os.path.join(self.objects_dir, content_hash)
+        if not os.path.exists(object_path):
+            self._write_atomic(object_path, image)
+        self._write_atomic(os.path.join(self.keys_dir, key), content_hash.encode('utf-8'))
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+
+class AssetStore:
+    """按内容哈希寻址的资源存储 - 上传的图片保存为文件，通过 /assets/{hash} 提供给渲染器，模板中只引用URL
+
+    相同内容只保存一份；超过有效期未被使用的资源，以及总大小超限时最久未使用的资源会被删除。
+    """
+
+    def __init__(self, asset_dir: str, ttl: float = 3600, max_bytes: int = 256 * 1024 * 1024):
+        self.asset_dir = asset_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # 按最近使用时间排序：哈希 -> {'size', 'mime_type', 'last_used'}
+        self.assets: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.total_bytes = 0
+        self.stored = 0
+        self.deduplicated = 0
+        self.served = 0
+        self.expired = 0
+        self.evictions = 0
+
+    async def load(self):
+        """启动时在线程中扫描资源目录（需要读取每个文件的头部），避免阻塞事件循环"""
+        await asyncio.to_thread(self._scan)
+
+    async def put(self, source, mime_type: str) -> str:
+        """保存资源（bytes或文件对象），返回内容哈希"""
+        asset_hash, size = await asyncio.to_thread(self._write, source)
+        entry = self.assets.get(asset_hash)
+        if entry is None:
+            self.assets[asset_hash] = {'size': size, 'mime_type': mime_type, 'last_used': time.time()}
+            self.total_bytes += size
+            self.stored += 1
+        else:
+            entry['last_used'] = time.time()
+            self.assets.move_to_end(asset_hash)
+            self.deduplicated += 1
+        self._purge(keep=asset_hash)
+        return asset_hash
+
+    def get(self, asset_hash: str) -> Optional[Tuple[str, str]]:
+        """查询资源，返回(文件路径, MIME类型)，不存在或已过期时返回None"""
+        entry = self.assets.get(asset_hash)
+        if entry is None:
+            return None
+        path = os.path.join(self.asset_dir, asset_hash)
+        if entry['last_used'] + self.ttl <= time.time() or not os.path.exists(path):
+            self._remove(asset_hash)
+            self.expired += 1
+            return None
+        entry['last_used'] = time.time()
+        self.assets.move_to_end(asset_hash)
+        self.served += 1
+        return path, entry['mime_type']
+
+    def stats(self) -> Dict[str, Any]:
+        """资源存储统计信息"""
+        self._purge()
+        return {
+            'assets': len(self.assets),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+            'stored': self.stored,
+            'deduplicated': self.deduplicated,
+            'served': self.served,
+            'expired': self.expired,
+            'evictions': self.evictions
+        }
+
+    def _purge(self, keep: Optional[str] = None):
+        """删除过期资源，总大小超限时再淘汰最久未使用的资源"""
+        now = time.time()
+        while self.assets:
+            oldest_hash, entry = next(iter(self.assets.items()))
+            if oldest_hash == keep or entry['last_used'] + self.ttl > now:
+                break
+            self._remove(oldest_hash)
+            self.expired += 1
+
+        while self.total_bytes > self.max_bytes and len(self.assets) > 1:
+            oldest_hash = next(iter(self.assets))
+            if oldest_hash == keep:
+                self.assets.move_to_end(keep)
+                continue
+            self._remove(oldest_hash)
+            self.evictions += 1
+
+    def _remove(self, asset_hash: str):
+        entry = self.assets.pop(asset_hash, None)
+        if entry is not None:
+            self.total_bytes -= entry['size']
+        delete_file(os.path.join(self.asset_dir, asset_hash))
+
+    def _scan(self):
+        """启动时载入目录中已有的资源（按修改时间作为最近使用时间），清理未写完的临时文件"""
+        try:
+            os.makedirs(self.asset_dir, exist_ok=True)
+            found = []
+            with os.scandir(self.asset_dir) as it:
+                for entry in it:
+                    if not entry.is_file():
+                        continue
+                    if entry.name.endswith('.tmp'):
+                        delete_file(entry.path)
+                        continue
+                    with open(entry.path, 'rb') as f:
+                        mime_type = detect_image_type(f.read(IMAGE_HEADER_SIZE))
+                    if mime_type is None:
+                        continue
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, entry.name, stat.st_size, mime_type))
+        except OSError as e:
+            logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 读取资源目录失败: {e}")
+            return
+
+        # 扫描期间已经写入的资源保留原记录
+        for mtime, name, size, mime_type in sorted(found, reverse=True):
+            if name not in self.assets:
+                self.assets[name] = {'size': size, 'mime_type': mime_type, 'last_used': mtime}
+                self.assets.move_to_end(name, last=False)
+                self.total_bytes += size
+        self._purge()
+
+    def _write(self, source) -> Tuple[str, int]:
+        """写入临时文件的同时计算哈希，内容已存在时只更新修改时间"""
+        os.makedirs(self.asset_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        temp_path = os.path.join(self.asset_dir, f"{uuid.uuid4().hex}.tmp")
+        size = 0
+        try:
+            with open(temp_path, 'wb') as f:
+                if isinstance(source, (bytes, bytearray, memoryview)):
+                    digest.update(source)
+                    f.write(source)
+                    size = len(source)
+                else:
+                    source.seek(0)
+                    while True:
+                        chunk = source.read(COPY_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        f.write(chunk)
+                        size += len(chunk)
+            asset_hash = digest.hexdigest()
+            path = os.path.join(self.asset_dir, asset_hash)
+            if os.path.exists(path):
+                os.remove(temp_path)
+                os.utime(path)
+            else:
+                os.replace(temp_path, path)
+            return asset_hash, size
+        except BaseException:
+            delete_file(temp_path)
+            raise
+
+
+class ImagePayloadCache:
+    """渲染图片的消息段数据缓存 - 以文件路径、大小和修改时间为键缓存 base64:// 数据，同一张图片多次发送时不再重复读取和编码
+
+    渲染结果缓存命中时返回的是同一个文件，因此重复请求也能复用编码结果；容量按总字节数LRU淘汰。
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(path: str) -> Tuple[str, int, int]:
+        """文件被替换或修改后键随之变化，旧条目自然失效"""
+        file_stat = os.stat(path)
+        return os.path.abspath(path), file_stat.st_size, file_stat.st_mtime_ns
+
+    def get(self, key: Tuple[str, int, int]) -> Optional[str]:
+        payload = self.entries.get(key)
+        if payload is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return payload
+
+    def put(self, key: Tuple[str, int, int], payload: str):
+        if len(payload) > self.max_bytes:
+            return
+        old_payload = self.entries.pop(key, None)
+        if old_payload is not None:
+            self.total_bytes -= len(old_payload)
+        self.entries[key] = payload
+        self.total_bytes += len(payload)
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
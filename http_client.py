@@ -0,0 +1,77 @@
+"""
+插件共用的出站HTTP客户端
+
+所有外部请求（如远程二维码API）复用同一个带连接池的aiohttp.ClientSession。
+"""
+
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+
+class SharedHttpClient:
+    """插件共用的出站HTTP客户端 - 所有外部请求复用同一个带连接池的ClientSession
+
+    通过TraceConfig统计新建连接、复用连接和DNS缓存命中次数。
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 10, keepalive_timeout: float = 30,
+                 dns_cache_ttl: int = 300):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """获取共享会话，尚未创建或已关闭时重新创建"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True
+            )
+            self._session = aiohttp.ClientSession(connector=connector, trace_configs=[self._trace_config()])
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self) -> Dict[str, Any]:
+        """连接池统计信息"""
+        connections = self.connections_created + self.connections_reused
+        return {
+            'open': self._session is not None and not self._session.closed,
+            'limit': self.limit,
+            'limit_per_host': self.limit_per_host,
+            'requests': self.requests,
+            'connections_created': self.connections_created,
+            'connections_reused': self.connections_reused,
+            'reuse_rate': round(self.connections_reused / connections, 4) if connections else 0.0,
+            'dns_cache_hits': self.dns_cache_hits,
+            'dns_cache_misses': self.dns_cache_misses
+        }
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        def counter(name: str):
+            async def increment(session, context, params):
+                setattr(self, name, getattr(self, name) + 1)
+            return increment
+
+        trace_config.on_request_start.append(counter('requests'))
+        trace_config.on_connection_create_end.append(counter('connections_created'))
+        trace_config.on_connection_reuseconn.append(counter('connections_reused'))
+        trace_config.on_dns_cache_hit.append(counter('dns_cache_hits'))
+        trace_config.on_dns_cache_miss.append(counter('dns_cache_misses'))
+        return trace_config
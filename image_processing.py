@@ -0,0 +1,118 @@
+"""
+上传图片的类型识别、缩放处理和base64编码
+
+Pillow为可选依赖，未安装时不缩放。这里的函数只接收和返回bytes/str，可以在线程池或进程池中执行。
+"""
+
+import base64
+import io
+import math
+from typing import Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+PIL_AVAILABLE = Image is not None
+
+# 支持的图片类型（按文件头魔数判断）
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+IMAGE_HEADER_SIZE = 12
+
+# 缩放后的输出格式：JPEG/WebP保持原格式，其余（PNG、BMP、静态GIF）输出为PNG
+OUTPUT_FORMATS = {
+    'image/jpeg': ('JPEG', 'image/jpeg'),
+    'image/webp': ('WEBP', 'image/webp'),
+}
+
+# EXIF方向为5-8时图片显示时会旋转90度，宽高互换
+EXIF_ORIENTATION_TAG = 0x0112
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def detect_image_type(header: bytes) -> Optional[str]:
+    """根据文件头的魔数判断图片类型，返回MIME类型，不支持时返回None"""
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def downscale_image(data: bytes, mime_type: str, max_width: int = 0, max_height: int = 0,
+                    quality: int = 85) -> Optional[Tuple[bytes, str]]:
+    """按最大宽高等比缩小图片并重新编码，返回(图片数据, MIME类型)
+
+    宽高限制为0表示不限制；图片本身不超过限制、是动图或者未安装Pillow时返回None，调用方继续使用原图。
+    """
+    if not PIL_AVAILABLE or not (max_width or max_height):
+        return None
+
+    with Image.open(io.BytesIO(data)) as image:
+        if getattr(image, 'is_animated', False):
+            return None
+
+        # 按显示方向（考虑EXIF旋转）计算缩放比例
+        width, height = image.size
+        orientation = image.getexif().get(EXIF_ORIENTATION_TAG, 1)
+        display_width, display_height = (height, width) if orientation in TRANSPOSED_ORIENTATIONS else (width, height)
+        scale = min(max_width / display_width if max_width else 1, max_height / display_height if max_height else 1)
+        if scale >= 1:
+            return None
+
+        # JPEG可以在解码时直接按比例缩小，大幅减少解码耗时和内存
+        image.draft('RGB', (math.ceil(width * scale), math.ceil(height * scale)))
+        resized = ImageOps.exif_transpose(image)
+        target_size = (max(1, round(display_width * scale)), max(1, round(display_height * scale)))
+        resized = resized.resize(target_size, Image.LANCZOS)
+
+        output_format, output_mime = OUTPUT_FORMATS.get(mime_type, ('PNG', 'image/png'))
+        if output_format == 'JPEG' and resized.mode not in ('RGB', 'L'):
+            resized = resized.convert('RGB')
+        elif output_format == 'PNG' and resized.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+            resized = resized.convert('RGBA')
+
+        buffer = io.BytesIO()
+        if output_format == 'PNG':
+            resized.save(buffer, output_format)
+        else:
+            resized.save(buffer, output_format, quality=quality)
+        return buffer.getvalue(), output_mime
+
+
+# 分块编码的块大小（3的倍数，拼接结果与整体编码一致）
+BASE64_CHUNK_SIZE = 3 * 64 * 1024
+
+
+def encode_base64(data: bytes) -> str:
+    """分块进行base64编码；b64encode执行期间不释放GIL，分块后在线程中编码时事件循环可以在块之间获得执行机会"""
+    view = memoryview(data)
+    return b''.join(
+        base64.b64encode(view[offset:offset + BASE64_CHUNK_SIZE]) for offset in range(0, len(view), BASE64_CHUNK_SIZE)
+    ).decode('ascii')
+
+
+def build_data_uri(data: bytes, mime_type: str) -> str:
+    """把图片数据编码为 data:{mime};base64,... 格式的数据URI"""
+    return f"data:{mime_type};base64,{encode_base64(data)}"
+
+
+def read_file_base64(path: str) -> str:
+    """分块读取文件并编码为base64文本，不需要先把整个文件读入内存"""
+    parts = []
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(BASE64_CHUNK_SIZE)
+            if not chunk:
+                break
+            parts.append(base64.b64encode(chunk))
+    return b''.join(parts).decode('ascii')
@@ -0,0 +1,168 @@
+"""
+异步任务和幂等键记录
+
+JobStore保存X-Async请求的任务状态，IdempotencyStore保存Idempotency-Key对应的处理中请求和已保存的响应。
+两者都是有容量上限的内存存储，这里的代码不依赖AstrBot。
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+
+class JobStore:
+    """异步任务记录 - 有容量上限的内存存储，已结束的任务在有效期后过期"""
+
+    FINISHED_STATUSES = ('done', 'failed')
+
+    def __init__(self, max_jobs: int = 1000, ttl: float = 3600):
+        self.max_jobs = max(1, max_jobs)
+        self.ttl = ttl
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def create(self, job_type: str, target: str, **extra) -> Dict[str, Any]:
+        """创建排队中的任务"""
+        self._purge()
+        now = time.monotonic()
+        job = {
+            'id': uuid.uuid4().hex,
+            'type': job_type,
+            'target': target,
+            'status': 'queued',
+            'created_at': datetime.now().isoformat(),
+            'updated_at': datetime.now().isoformat(),
+            'timings': {},
+            'result': None,
+            'http_status': None,
+            '_created': now,
+            '_stage_started': now,
+            '_finished': None
+        }
+        job.update(extra)
+        self.jobs[job['id']] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        self._purge()
+        return self.jobs.get(job_id)
+
+    def set_status(self, job: Optional[Dict[str, Any]], status: str):
+        """切换任务状态，并记录上一阶段的耗时（job为None时忽略，便于同步请求复用同一流程）"""
+        if job is None:
+            return
+        now = time.monotonic()
+        previous = job['status']
+        job['timings'][f'{previous}_ms'] = round((now - job['_stage_started']) * 1000, 1)
+        job['status'] = status
+        job['updated_at'] = datetime.now().isoformat()
+        job['_stage_started'] = now
+
+    def finish(self, job: Dict[str, Any], result: Dict[str, Any], http_status: int):
+        """记录任务结果；发件箱安排了重试（结果带outbox）时进入未结束的retrying状态，重试结束后再次调用"""
+        job['result'] = result
+        job['http_status'] = http_status
+        if 'outbox' in result:
+            self.set_status(job, 'retrying')
+            return
+        self.set_status(job, 'done' if http_status == 200 else 'failed')
+        job['_finished'] = time.monotonic()
+        job['timings']['total_ms'] = round((job['_finished'] - job['_created']) * 1000, 1)
+
+    @staticmethod
+    def view(job: Dict[str, Any]) -> Dict[str, Any]:
+        """任务的对外展示形式（去掉内部字段）"""
+        return {key: value for key, value in job.items() if not key.startswith('_')}
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        return {
+            'jobs': len(self.jobs),
+            'max_jobs': self.max_jobs,
+            'by_status': counts
+        }
+
+    def _purge(self):
+        """删除过期的已结束任务，超出容量时优先淘汰最早结束的任务"""
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job['_finished'] is not None and now - job['_finished'] > self.ttl]
+        for job_id in expired:
+            del self.jobs[job_id]
+        
+        while len(self.jobs) >= self.max_jobs:
+            finished = [job for job in self.jobs.values() if job['_finished'] is not None]
+            if finished:
+                oldest = min(finished, key=lambda job: job['_finished'])
+                del self.jobs[oldest['id']]
+            else:
+                self.jobs.popitem(last=False)
+
+
+class IdempotencyStore:
+    """幂等键记录 - Idempotency-Key对应正在处理的请求或已保存的响应
+
+    有容量上限，已完成的记录在有效期后过期；超出容量时优先淘汰最早完成的记录，处理中的记录不会被淘汰。
+    """
+
+    def __init__(self, max_keys: int = 10000, ttl: float = 3600):
+        self.max_keys = max(1, max_keys)
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.replayed = 0
+        self.waited = 0
+        self.mismatched = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        self._purge()
+        return self.entries.get(key)
+
+    def begin(self, key: str, fingerprint: str) -> Dict[str, Any]:
+        """登记正在处理的请求，重复的请求等待entry['future']"""
+        self._purge()
+        while len(self.entries) >= self.max_keys:
+            oldest = next((item_key for item_key, item in self.entries.items() if item['response'] is not None), None)
+            if oldest is None:
+                break
+            del self.entries[oldest]
+        entry = {
+            'fingerprint': fingerprint,
+            'future': asyncio.get_running_loop().create_future(),
+            'response': None,
+            'expires': None
+        }
+        self.entries[key] = entry
+        return entry
+
+    def finish(self, key: str, entry: Dict[str, Any], response: Optional[Tuple[int, bytes, str]]):
+        """保存响应并唤醒等待的重复请求；response为None时删除记录，之后的重复请求会重新处理"""
+        if response is None:
+            if self.entries.get(key) is entry:
+                del self.entries[key]
+        else:
+            entry['response'] = response
+            entry['expires'] = time.monotonic() + self.ttl
+            self.entries.move_to_end(key)
+        if not entry['future'].done():
+            entry['future'].set_result(response)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'keys': len(self.entries),
+            'in_progress': sum(1 for entry in self.entries.values() if entry['response'] is None),
+            'max_keys': self.max_keys,
+            'replayed': self.replayed,
+            'waited': self.waited,
+            'mismatched': self.mismatched
+        }
+
+    def _purge(self):
+        now = time.monotonic()
+        expired = [key for key, entry in self.entries.items()
+                   if entry['expires'] is not None and entry['expires'] <= now]
+        for key in expired:
+            del self.entries[key]
@@ -1,35 +1,84 @@
 import asyncio
 import base64
+import functools
+import hashlib
+import io
 import json
 import os
+import re
+import tempfile
+import time
+import uuid
 from datetime import datetime
-from typing import Optional, Dict, Any
+from pathlib import Path
+from typing import Optional, Callable, Dict, Any, List, Tuple
 from urllib.parse import quote
 
 import aiohttp
 from aiohttp import web, MultipartReader
-from jinja2 import Template, TemplateError
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, TemplateError, meta, nodes
 
 from astrbot.api import logger
 from astrbot.api.star import Context, Star, register
 from astrbot.core.config import AstrBotConfig
 
+from .caches import AssetStore, ImagePayloadCache, QRCodeCache, RenderCache
+from .http_client import SharedHttpClient
+from .image_processing import (
+    IMAGE_HEADER_SIZE, PIL_AVAILABLE, build_data_uri, detect_image_type, downscale_image, read_file_base64
+)
+from .jobs import IdempotencyStore, JobStore
+from .offload import OffloadExecutor
+from .outbox import Outbox, retry_delay
+from .platforms import PlatformRegistry
+from .qr_encoder import generate_qr_code
+from .request_body import (
+    JSON_CONTENT_TYPES, MSGPACK_AVAILABLE, MSGPACK_CONTENT_TYPES, BodyFormatError, body_digest, parse_structured_body
+)
+from .scheduling import RenderQueueFull, RenderScheduler, SendScheduler, SingleFlight
+
+try:
+    from astrbot.api.star import StarTools
+except ImportError:  # 旧版本AstrBot没有StarTools
+    StarTools = None
+
+
+PLUGIN_NAME = 'astrbot_plugin_http_render_bridge'
+
+
+def get_plugin_data_dir() -> str:
+    """获取插件数据目录（优先使用AstrBot提供的目录）"""
+    if StarTools is not None:
+        try:
+            return str(StarTools.get_data_dir(PLUGIN_NAME))
+        except Exception as e:
+            logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 获取插件数据目录失败，使用默认目录: {e}")
+    data_dir = os.path.join(os.getcwd(), 'data', 'plugin_data', PLUGIN_NAME)
+    os.makedirs(data_dir, exist_ok=True)
+    return data_dir
+
+
+async def fetch_qr_code_as_base64(url: str, session: Optional[aiohttp.ClientSession] = None) -> str:
+    """从在线API获取二维码的base64编码（参考http_forwarder项目），仅在启用远程二维码时使用
 
-async def fetch_qr_code_as_base64(url: str) -> str:
-    """从在线API获取二维码的base64编码（参考http_forwarder项目）"""
+    传入session时复用其连接池，否则临时创建一个会话。
+    """
     try:
         # 构建二维码API URL
         encoded_url = quote(url, safe='')
         qr_api_url = f"https://api.2dcode.biz/v1/create-qr-code?data={encoded_url}"
         
-        async with aiohttp.ClientSession() as session:
-            # 添加超时防止挂起
-            async with session.get(qr_api_url, timeout=10) as response:
-                response.raise_for_status()
-                image_data = await response.read()
-                encoded_image = base64.b64encode(image_data).decode('utf-8')
-                logger.info(f"[AstrBot Plugin HTTP Render Bridge] 二维码Base64字符串长度: {len(encoded_image)}")
-                return encoded_image
+        if session is None:
+            async with aiohttp.ClientSession() as temp_session:
+                return await fetch_qr_code_as_base64(url, temp_session)
+        
+        # 添加超时防止挂起
+        async with session.get(qr_api_url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            response.raise_for_status()
+            image_data = await response.read()
+            encoded_image = base64.b64encode(image_data).decode('utf-8')
+            logger.info(f"[AstrBot Plugin HTTP Render Bridge] 二维码Base64字符串长度: {len(encoded_image)}")
+            return encoded_image
     except aiohttp.ClientError as e:
         logger.error(f"[AstrBot Plugin HTTP Render Bridge] 从 {url} 获取二维码时网络错误: {e}")
         return ""
@@ -41,46 +90,314 @@ async def fetch_qr_code_as_base64(url: str) -> str:
         return ""
 
 
-async def process_uploaded_image(filename: str, file_data: bytes) -> Optional[Dict[str, Any]]:
-    """处理上传的图片文件"""
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """上传内容超出大小限制"""
+
+
+def base64_length(size: int) -> int:
+    """计算size字节的数据base64编码后的长度"""
+    return (size + 2) // 3 * 4
+
+
+class UploadedImage:
+    """上传的图片 - 保存原始字节，只有模板或消息真正用到时才生成base64 data URI，生成后缓存
+
+    在模板中输出（str）时得到data URI；渲染前调用encode()可以让较大的图片在执行器中完成编码。
+    渲染缓存键使用内容哈希，计算缓存键不会触发编码。
+    """
+
+    __slots__ = ('data', 'mime_type', 'filename', 'digest', '_data_uri')
+
+    def __init__(self, data: bytes, mime_type: str, filename: str = '', digest: Optional[str] = None):
+        self.data = data
+        self.mime_type = mime_type
+        self.filename = filename
+        self.digest = digest or hashlib.sha256(data).hexdigest()
+        self._data_uri: Optional[str] = None
+
+    @classmethod
+    def from_file(cls, file_obj, mime_type: str, filename: str = '') -> "UploadedImage":
+        """从临时文件读取图片并计算哈希（会阻塞，应在线程中调用）"""
+        file_obj.seek(0)
+        data = file_obj.read()
+        return cls(data, mime_type, filename, hashlib.sha256(data).hexdigest())
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def encoded(self) -> bool:
+        return self._data_uri is not None
+
+    def data_uri(self) -> str:
+        """返回 data:{mime};base64,... 格式的数据URI，首次调用时编码"""
+        if self._data_uri is None:
+            self._data_uri = build_data_uri(self.data, self.mime_type)
+        return self._data_uri
+
+    async def encode(self, offload: Optional["OffloadExecutor"] = None) -> str:
+        """生成数据URI；传入offload时，超过其大小阈值的图片在执行器中编码"""
+        if self._data_uri is None and offload is not None:
+            self._data_uri = await offload.run('upload_base64', build_data_uri, self.data, self.mime_type,
+                                               size=len(self.data))
+        return self.data_uri()
+
+    def cache_key(self) -> str:
+        """用于渲染缓存键的内容标识"""
+        return f"{self.mime_type};sha256={self.digest}"
+
+    def memory_bytes(self) -> int:
+        """当前占用的数据大小：原始字节加上已生成的数据URI"""
+        return len(self.data) + (len(self._data_uri) if self._data_uri is not None else 0)
+
+    def __str__(self) -> str:
+        return self.data_uri()
+
+    def __repr__(self) -> str:
+        return f"UploadedImage({self.filename!r}, {self.mime_type}, {len(self.data)} bytes)"
+
+
+class DeferredFieldTasks:
+    """解析模板请求的请求体时登记的字段任务（图片处理、二维码生成）
+
+    模板的必填字段全部出现之前任务只登记不启动，缺少必填字段的请求不会做这些耗时的处理；
+    必填字段齐全后已登记的任务立即启动，之后登记的任务直接启动，与后续字段的读取并行进行。
+    """
+
+    def __init__(self, form_data: Dict[str, Any], required: List[str]):
+        self.form_data = form_data
+        self.required = list(required)
+        self.missing = set(required)
+        # (字段名, 协程工厂, 上传文件)，上传文件在任务没有启动就被丢弃时关闭
+        self.deferred: List[Tuple[str, Callable[[], Any], Any]] = []
+
+    def field_present(self, name: str, value: Any):
+        """记录解析到的字段，必填字段齐全时启动已登记的任务"""
+        if value not in (None, ''):
+            self.missing.discard(name)
+        if not self.missing:
+            self.flush()
+
+    def add(self, key: str, factory: Callable[[], Any], upload_file: Any = None):
+        """登记字段任务，结果（字段字典）由 _resolve_pending_fields 合并到表单数据的key位置"""
+        if self.missing:
+            self.deferred.append((key, factory, upload_file))
+        else:
+            self.form_data[key] = asyncio.create_task(factory())
+
+    def flush(self):
+        deferred, self.deferred = self.deferred, []
+        for key, factory, _ in deferred:
+            self.form_data[key] = asyncio.create_task(factory())
+
+    def missing_fields(self) -> List[str]:
+        return [field for field in self.required if field in self.missing]
+
+    def discard(self):
+        """丢弃尚未启动的任务，关闭它们持有的上传文件"""
+        deferred, self.deferred = self.deferred, []
+        for _, _, upload_file in deferred:
+            if upload_file is not None:
+                upload_file.close()
+
+
+class RenderMemoryStats:
+    """渲染内存统计 - 记录每次渲染时请求持有的上传图片原始字节、已生成的base64和HTML大小之和（峰值）
+
+    同时统计因模板没有用到而省去的base64编码，用来验证按需编码节省的内存。
+    """
+
+    def __init__(self):
+        self.renders = 0
+        self.last_peak_bytes = 0
+        self.max_peak_bytes = 0
+        self.total_peak_bytes = 0
+        self.skipped_encodes = 0
+        self.skipped_encode_bytes = 0
+
+    def record(self, uploads: List[UploadedImage], html_size: int):
+        peak = html_size + sum(upload.memory_bytes() for upload in uploads)
+        self.renders += 1
+        self.last_peak_bytes = peak
+        self.max_peak_bytes = max(self.max_peak_bytes, peak)
+        self.total_peak_bytes += peak
+        for upload in uploads:
+            if not upload.encoded:
+                self.skipped_encodes += 1
+                self.skipped_encode_bytes += base64_length(upload.size)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'renders': self.renders,
+            'last_peak_bytes': self.last_peak_bytes,
+            'max_peak_bytes': self.max_peak_bytes,
+            'avg_peak_bytes': self.total_peak_bytes // self.renders if self.renders else 0,
+            'skipped_encodes': self.skipped_encodes,
+            'skipped_encode_bytes': self.skipped_encode_bytes
+        }
+
+
+def estimate_render_size(data: Any) -> int:
+    """估算渲染数据的大小：字符串按长度、上传图片按base64长度、其余值按固定开销计，用来决定模板渲染是否转交给执行器"""
+    total = 0
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            total += len(value)
+        elif isinstance(value, UploadedImage):
+            total += base64_length(value.size)
+        elif isinstance(value, dict):
+            total += 8 * len(value)
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            total += 8 * len(value)
+            stack.extend(value)
+        else:
+            total += 8
+    return total
+
+
+def json_default(value: Any) -> Any:
+    """json.dumps的default：上传图片使用内容哈希，其余对象转为字符串"""
+    if isinstance(value, UploadedImage):
+        return value.cache_key()
+    return str(value)
+
+
+def encode_outbox_payload(payload: Dict[str, Any]) -> str:
+    """序列化发件箱任务：上传图片保存为base64，读取时由outbox_object_hook还原"""
+    def default(value: Any) -> Any:
+        if isinstance(value, UploadedImage):
+            return {'__upload__': [value.mime_type, value.filename, base64.b64encode(value.data).decode('ascii')]}
+        return str(value)
+    return json.dumps(payload, ensure_ascii=False, default=default)
+
+
+def outbox_object_hook(obj: Dict[str, Any]) -> Any:
+    upload = obj.get('__upload__')
+    if isinstance(upload, list) and len(obj) == 1:
+        return UploadedImage(base64.b64decode(upload[2]), upload[0], upload[1])
+    return obj
+
+
+async def process_uploaded_image(filename: str, file_obj, size: int, mime_type: str, max_width: int = 0,
+                                 max_height: int = 0, quality: int = 85, offload: Optional["OffloadExecutor"] = None,
+                                 asset_store: Optional["AssetStore"] = None) -> Optional[Dict[str, Any]]:
+    """处理上传的图片文件
+
+    file_obj为已经按魔数确认类型、大小也已检查过的临时文件，在线程中读出原始字节，处理完后关闭（磁盘上的临时文件随之删除）。
+    结果中的image为UploadedImage，base64在模板或消息真正用到时才生成。
+    指定了最大宽高且安装了Pillow时，先等比缩小并重新编码（通过offload在线程池或进程池中进行）。
+    传入asset_store时不保留图片数据，而是把图片存入资源存储，结果中的asset为内容哈希。
+    """
     try:
-        # 检查文件大小（限制为5MB）
-        max_size = 5 * 1024 * 1024  # 5MB
-        if len(file_data) > max_size:
-            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 图片文件过大: {len(file_data)} bytes > {max_size} bytes")
-            return None
-        
-        # 检查文件扩展名
-        allowed_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
-        file_ext = os.path.splitext(filename.lower())[1]
-        if file_ext not in allowed_extensions:
-            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 不支持的图片格式: {file_ext}")
-            return None
+        if (max_width or max_height) and PIL_AVAILABLE:
+            file_obj.seek(0)
+            file_data = await asyncio.to_thread(file_obj.read)
+            try:
+                if offload is not None:
+                    resized = await offload.run('image_resize', downscale_image, file_data, mime_type,
+                                                max_width, max_height, quality, size=len(file_data))
+                else:
+                    resized = await asyncio.to_thread(downscale_image, file_data, mime_type, max_width, max_height, quality)
+            except Exception as e:
+                logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 图片缩放失败，使用原图: {e}")
+                resized = None
+            
+            if resized:
+                image_data, resized_mime_type = resized
+                logger.info(f"[AstrBot Plugin HTTP Render Bridge] 图片已缩小: {filename} {size} -> {len(image_data)} bytes")
+                file_info = {
+                    'filename': filename,
+                    'size': len(image_data),
+                    'original_size': size,
+                    'mime_type': resized_mime_type
+                }
+                if asset_store is not None:
+                    file_info['asset'] = await asset_store.put(image_data, resized_mime_type)
+                else:
+                    file_info['image'] = UploadedImage(image_data, resized_mime_type, filename)
+                return file_info
         
-        # 转换为base64
-        base64_data = base64.b64encode(file_data).decode('utf-8')
-        
-        # 确定MIME类型
-        mime_types = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg', 
-            '.png': 'image/png',
-            '.gif': 'image/gif',
-            '.webp': 'image/webp',
-            '.bmp': 'image/bmp'
-        }
-        mime_type = mime_types.get(file_ext, 'image/jpeg')
+        if asset_store is not None:
+            return {
+                'filename': filename,
+                'size': size,
+                'mime_type': mime_type,
+                'asset': await asset_store.put(file_obj, mime_type)
+            }
         
         return {
             'filename': filename,
-            'size': len(file_data),
+            'size': size,
             'mime_type': mime_type,
-            'base64': f"data:{mime_type};base64,{base64_data}"
+            'image': await asyncio.to_thread(UploadedImage.from_file, file_obj, mime_type, filename)
         }
         
     except Exception as e:
         logger.error(f"[AstrBot Plugin HTTP Render Bridge] 处理图片文件失败: {e}")
         return None
+    finally:
+        file_obj.close()
+
+
+# 由插件自动提供、不需要调用方传入的模板变量
+PLUGIN_PROVIDED_FIELDS = {'qr_code_base64', 'qr_code_svg', 'qr_code_data_uri'}
+PLUGIN_PROVIDED_SUFFIXES = ('_filename', '_size')
+
+
+def analyze_template_fields(env: Environment, source: str, _visited: Optional[set] = None) -> Dict[str, List[str]]:
+    """静态分析模板使用的外部变量，区分必填字段和可选字段
+
+    带default过滤器、出现在if条件中、作为or左侧或经过is defined检查的变量视为可选；
+    extends/include引用的模板会一并分析。
+    """
+    visited = _visited if _visited is not None else set()
+    ast = env.parse(source)
+    variables = set(meta.find_undeclared_variables(ast))
+    optional = set()
+    
+    for node in ast.find_all((nodes.Filter, nodes.If, nodes.CondExpr, nodes.Or, nodes.Test)):
+        if isinstance(node, nodes.Filter):
+            guarded = node.node if node.name in ('default', 'd') else None
+        elif isinstance(node, (nodes.If, nodes.CondExpr)):
+            guarded = node.test
+        elif isinstance(node, nodes.Or):
+            guarded = node.left
+        else:
+            guarded = node.node if node.name in ('defined', 'undefined', 'none') else None
+        
+        if guarded is None:
+            continue
+        if isinstance(guarded, nodes.Name):
+            optional.add(guarded.name)
+        optional.update(name.name for name in guarded.find_all(nodes.Name))
+    
+    # 公共布局和片段中的变量
+    for referenced in meta.find_referenced_templates(ast):
+        if not isinstance(referenced, str) or referenced in visited:
+            continue
+        visited.add(referenced)
+        try:
+            referenced_source = env.loader.get_source(env, referenced)[0]
+        except Exception:
+            continue
+        referenced_fields = analyze_template_fields(env, referenced_source, visited)
+        variables.update(referenced_fields['required'])
+        variables.update(referenced_fields['optional'])
+        optional.update(referenced_fields['optional'])
+    
+    variables = {name for name in variables
+                 if name not in PLUGIN_PROVIDED_FIELDS and not name.endswith(PLUGIN_PROVIDED_SUFFIXES)}
+    return {
+        'required': sorted(variables - optional),
+        'optional': sorted(variables & optional)
+    }
 
 
 @register(
@@ -97,8 +414,125 @@ class HttpRenderBridge(Star):
         self.config = config or AstrBotConfig({})
         self.runner: Optional[web.AppRunner] = None
         self.templates_cache: Dict[str, Dict[str, Any]] = {}
+        self.template_options = self._load_template_options()
+        # 公共布局/片段的文件状态和内容哈希，以及加载失败的模板文件状态（文件未再修改前不重复加载）
+        self._shared_signature = None
+        self._shared_version = ''
+        self._failed_template_stats: Dict[str, Tuple[int, int]] = {}
         
         logger.info("[AstrBot Plugin HTTP Render Bridge] 插件初始化开始")
+        # 调试：打印配置内容（不输出认证令牌）
+        config_view = dict(self.config)
+        if config_view.get('auth_token'):
+            config_view['auth_token'] = '***'
+        logger.info(f"[AstrBot Plugin HTTP Render Bridge] 配置内容: {config_view}")
+        
+        # 所有模板共用一个Jinja2环境：支持extends/include，编译结果缓存到磁盘，重启后未修改的模板无需重新编译
+        plugin_dir = os.path.dirname(os.path.abspath(__file__))
+        self.templates_dir = os.path.join(plugin_dir, 'templates')
+        bytecode_dir = os.path.join(get_plugin_data_dir(), 'jinja_bytecode')
+        os.makedirs(bytecode_dir, exist_ok=True)
+        self.jinja_env = Environment(
+            loader=FileSystemLoader(self.templates_dir, encoding='utf-8'),
+            bytecode_cache=FileSystemBytecodeCache(bytecode_dir),
+            auto_reload=True
+        )
+        
+        # 初始化渲染结果缓存
+        self.render_cache = RenderCache(
+            os.path.join(get_plugin_data_dir(), 'render_cache'),
+            max_entries=int(self.config.get('render_cache_max_entries', 256)),
+            max_bytes=int(self.config.get('render_cache_max_mb', 128)) * 1024 * 1024
+        )
+        # 初始化二维码缓存（内存 + 磁盘）
+        self.qr_cache = QRCodeCache(
+            os.path.join(get_plugin_data_dir(), 'qr_cache'),
+            max_entries=int(self.config.get('qr_cache_max_entries', 512)),
+            max_bytes=int(self.config.get('qr_cache_max_mb', 16)) * 1024 * 1024,
+            max_disk_bytes=int(self.config.get('qr_disk_cache_max_mb', 64)) * 1024 * 1024
+        )
+        # 合并相同的并发渲染请求和模板编译
+        self.render_flights = SingleFlight()
+        # 发送消息使用的平台客户端（缓存，支持指定平台和多账号负载均衡）
+        self.platform_registry = PlatformRegistry(
+            self.context,
+            balance=self.config.get('platform_balance', 'first'),
+            membership_ttl=float(self.config.get('platform_membership_ttl', 300))
+        )
+        # 渲染图片的发送方式：base64（默认）或file（OneBot实现与插件共享文件系统时直接传file://路径）
+        self.image_delivery = self.config.get('image_delivery', 'base64')
+        self.image_payload_cache = ImagePayloadCache(
+            max_bytes=int(self.config.get('image_payload_cache_mb', 32)) * 1024 * 1024
+        )
+        self.payload_flights = SingleFlight()
+        self.compile_flights = SingleFlight()
+        # 限制同时进行的渲染数量
+        self.render_scheduler = RenderScheduler(
+            max_workers=int(self.config.get('render_max_workers', 3)),
+            max_queue=int(self.config.get('render_max_queue', 50))
+        )
+        # 按目标和平台账号限速的发送队列
+        self.send_scheduler = SendScheduler(
+            target_rate=float(self.config.get('send_target_rate', 0.0)),
+            target_burst=float(self.config.get('send_target_burst', 5)),
+            account_rate=float(self.config.get('send_account_rate', 0.0)),
+            account_burst=float(self.config.get('send_account_burst', 10))
+        )
+        # Idempotency-Key对应的处理中请求和已保存的响应
+        self.idempotency_store = IdempotencyStore(
+            max_keys=int(self.config.get('idempotency_max_keys', 10000)),
+            ttl=float(self.config.get('idempotency_ttl', 3600))
+        )
+        # 异步任务记录
+        self.job_store = JobStore(
+            max_jobs=int(self.config.get('job_store_max_jobs', 1000)),
+            ttl=float(self.config.get('job_ttl', 3600))
+        )
+        self.background_tasks = set()
+        # 上传大小限制：单个文件、整个请求，以及超过多大的文件写入临时文件
+        self.upload_max_file_bytes = int(float(self.config.get('upload_max_file_mb', 5)) * 1024 * 1024)
+        self.request_max_bytes = int(float(self.config.get('request_max_size_mb', 20)) * 1024 * 1024)
+        self.upload_spill_bytes = int(self.config.get('upload_spill_threshold_kb', 1024)) * 1024
+        self.render_memory = RenderMemoryStats()
+        # 上传图片的资源存储（asset_mode为url且设置了asset_base_url时使用）
+        self.asset_store = AssetStore(
+            os.path.join(get_plugin_data_dir(), 'assets'),
+            ttl=float(self.config.get('asset_ttl', 3600)),
+            max_bytes=int(self.config.get('asset_max_mb', 256)) * 1024 * 1024
+        )
+        # 渲染器不一定与插件在同一台机器上，没有显式设置地址时不猜测，图片仍以data URI内嵌
+        self.asset_base_url = str(self.config.get('asset_base_url', '') or '').rstrip('/')
+        if not self.asset_base_url and (self.config.get('asset_mode', 'inline') == 'url' or any(
+                isinstance(options, dict) and options.get('asset_mode') == 'url'
+                for options in self.template_options.values())):
+            logger.warning("[AstrBot Plugin HTTP Render Bridge] asset_mode为url但没有设置asset_base_url，上传图片仍以data URI内嵌")
+        # 模板渲染、base64编码、图片缩放等CPU密集步骤超过阈值时转交给线程池（或进程池）
+        self.offload = OffloadExecutor(
+            mode=self.config.get('offload_executor', 'thread'),
+            max_workers=int(self.config.get('offload_workers', 4)),
+            threshold=int(self.config.get('offload_threshold_kb', 64)) * 1024
+        )
+        # 持久化发件箱：已接受的任务在确认前写入SQLite，发送失败时退避重试，插件重启后继续发送
+        self.outbox: Optional[Outbox] = None
+        if self.config.get('outbox_enabled', False):
+            self.outbox = Outbox(os.path.join(get_plugin_data_dir(), 'outbox.db'))
+        self.outbox_max_attempts = max(1, int(self.config.get('outbox_max_attempts', 5)))
+        self.outbox_retry_base = float(self.config.get('outbox_retry_base', 5))
+        self.outbox_retry_max = float(self.config.get('outbox_retry_max', 600))
+        # 等待重试的发件箱任务，由_outbox_worker按下次重试时间执行
+        self.outbox_retries: Dict[str, Dict[str, Any]] = {}
+        self.outbox_wakeup = asyncio.Event()
+        if not PIL_AVAILABLE and (self.config.get('image_max_width') or self.config.get('image_max_height') or any(
+                isinstance(options, dict) and ('image_max_width' in options or 'image_max_height' in options)
+                for options in self.template_options.values())):
+            logger.warning("[AstrBot Plugin HTTP Render Bridge] 配置了图片最大尺寸但未安装Pillow，上传的图片不会被缩小")
+        # 出站HTTP请求共用的连接池，在start_server中创建，terminate时关闭
+        self.http_client = SharedHttpClient(
+            limit=int(self.config.get('http_pool_limit', 100)),
+            limit_per_host=int(self.config.get('http_pool_limit_per_host', 10)),
+            keepalive_timeout=float(self.config.get('http_keepalive_timeout', 30)),
+            dns_cache_ttl=int(self.config.get('http_dns_cache_ttl', 300))
+        )
         
         # 初始化默认模板
         self._init_default_templates()
@@ -106,68 +540,351 @@ class HttpRenderBridge(Star):
         # 启动HTTP服务器
         asyncio.create_task(self.start_server())
         
+        # 后台预热：在线程中编译模板，不阻塞插件加载
+        if self.config.get('template_warmup', True):
+            self._run_in_background(self._warm_up_templates())
+        
+        # 启动模板热重载监视器
+        if float(self.config.get('template_watch_interval', 2)) > 0:
+            self._run_in_background(self._watch_templates())
+        
         logger.info("[AstrBot Plugin HTTP Render Bridge] 插件初始化完成")
 
     def _init_default_templates(self):
         """初始化默认模板"""
         self._reload_templates()
 
+    def _load_template_options(self) -> Dict[str, Dict[str, Any]]:
+        """解析按模板划分的选项配置（JSON格式）"""
+        raw_options = self.config.get('template_options', '') or '{}'
+        try:
+            options = json.loads(raw_options) if isinstance(raw_options, str) else dict(raw_options)
+            if not isinstance(options, dict):
+                raise ValueError('template_options must be a JSON object')
+            return options
+        except Exception as e:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 解析template_options失败，将忽略该配置: {e}")
+            return {}
+
+    def _get_template_option(self, template_name: str, key: str, default: Any = None) -> Any:
+        """获取指定模板的选项，未配置时返回默认值"""
+        options = self.template_options.get(template_name)
+        if isinstance(options, dict) and key in options:
+            return options[key]
+        return default
+
     def _reload_templates(self):
-        """重新加载模板缓存"""
-        self.templates_cache.clear()
-        
-        # 调试：打印配置内容
-        logger.info(f"[AstrBot Plugin HTTP Render Bridge] 配置内容: {dict(self.config)}")
-        
-        # 获取插件目录路径
-        plugin_dir = os.path.dirname(os.path.abspath(__file__))
-        templates_dir = os.path.join(plugin_dir, 'templates')
+        """重新加载模板索引
+
+        启动和完整重载时只记录模板文件的名称、大小和修改时间，模板在第一次使用时（或后台预热时）才编译。
+        运行中的完整重载在线程中执行 _build_template_index，再在事件循环中调用 _apply_template_index。
+        """
+        self._apply_template_index(*self._build_template_index())
+
+    def _build_template_index(self) -> Tuple[Any, str, Dict[str, Dict[str, Any]]]:
+        """扫描模板目录，返回(公共布局文件状态, 公共布局版本, 新的模板索引)；只读取文件，可以在线程中调用"""
+        shared_signature, shared_version = self._shared_signature, self._shared_version
+        new_cache: Dict[str, Dict[str, Any]] = {}
+        templates_dir = self.templates_dir
         
         # 注意：render_width和render_quality参数已移除，因为AstrBot的html_render方法不支持这些选项
         
         # 自动扫描templates目录下的所有HTML文件
         if os.path.exists(templates_dir):
             try:
-                for filename in os.listdir(templates_dir):
-                    if filename.endswith('.html'):
-                        template_name = filename[:-5]  # 移除.html后缀
-                        template_file = os.path.join(templates_dir, filename)
-                        
-                        try:
-                            with open(template_file, 'r', encoding='utf-8') as f:
-                                html_content = f.read()
-                            
-                            self.templates_cache[template_name] = {
-                                'template': Template(html_content),
-                                'name': f'{template_name.title()}模板',
-                                'description': f'基于{filename}的模板',
-                                'file': filename
-                            }
-                            logger.info(f"[AstrBot Plugin HTTP Render Bridge] 已加载模板: {template_name} ({filename})")
-                            
-                        except Exception as e:
-                            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 加载模板文件 {filename} 失败: {e}")
+                shared_signature = self._shared_templates_signature()
+                shared_version = self._shared_templates_version()
+                for filename, file_stat in self._scan_template_files().items():
+                    new_cache[filename[:-5]] = self._index_template(filename, file_stat)
                             
             except Exception as e:
                 logger.error(f"[AstrBot Plugin HTTP Render Bridge] 扫描模板目录失败: {e}")
         else:
             logger.error(f"[AstrBot Plugin HTTP Render Bridge] 模板目录不存在: {templates_dir}")
+        return shared_signature, shared_version, new_cache
+
+    def _apply_template_index(self, shared_signature: Any, shared_version: str, new_cache: Dict[str, Dict[str, Any]]):
+        """替换模板索引，并清除发生变化的模板的渲染缓存"""
+        old_cache = self.templates_cache
+        old_shared_version = self._shared_version
+        self._shared_signature = shared_signature
+        self._shared_version = shared_version
+        self._failed_template_stats.clear()
+        
+        # 整体替换，避免重建过程中出现模板暂时不存在的情况
+        self.templates_cache = new_cache
         
         # 确保至少有一个可用的模板
         if not self.templates_cache:
             logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 没有找到任何可用的模板文件")
         else:
             template_names = list(self.templates_cache.keys())
-            logger.info(f"[AstrBot Plugin HTTP Render Bridge] 共加载 {len(template_names)} 个模板: {', '.join(template_names)}")
+            logger.info(f"[AstrBot Plugin HTTP Render Bridge] 共索引 {len(template_names)} 个模板: {', '.join(template_names)}")
+        
+        # 只让文件发生变化或已被删除的模板的渲染缓存失效（公共布局变化时全部失效）
+        shared_changed = self._shared_version != old_shared_version
+        for template_name, old_info in old_cache.items():
+            new_info = self.templates_cache.get(template_name)
+            if (new_info is None or shared_changed
+                    or (new_info['mtime_ns'], new_info['size']) != (old_info.get('mtime_ns'), old_info.get('size'))):
+                removed = self.render_cache.invalidate_template(template_name)
+                logger.info(f"[AstrBot Plugin HTTP Render Bridge] 模板 {template_name} 已变更，清除 {removed} 条渲染缓存")
+
+    def _scan_template_files(self) -> Dict[str, Tuple[int, int]]:
+        """扫描模板目录，返回 文件名 -> (修改时间, 文件大小)
+
+        以下划线开头的文件和子目录中的文件是供extends/include使用的公共布局和片段，不作为独立模板
+        """
+        template_files = {}
+        with os.scandir(self.templates_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith('.html') and not entry.name.startswith('_'):
+                    file_stat = entry.stat()
+                    template_files[entry.name] = (file_stat.st_mtime_ns, file_stat.st_size)
+        return template_files
+
+    @staticmethod
+    def _index_template(filename: str, file_stat: Tuple[int, int]) -> Dict[str, Any]:
+        """构建尚未编译的模板索引条目"""
+        template_name = filename[:-5]  # 移除.html后缀
+        return {
+            'template': None,
+            'name': f'{template_name.title()}模板',
+            'description': f'基于{filename}的模板',
+            'file': filename,
+            'version': None,
+            'schema': None,
+            'mtime_ns': file_stat[0],
+            'size': file_stat[1]
+        }
+
+    def _load_template(self, filename: str, file_stat: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+        """读取并编译单个模板文件，失败时返回None（在线程中调用，不修改插件状态）"""
+        template_name = filename[:-5]  # 移除.html后缀
+        template_file = os.path.join(self.templates_dir, filename)
+        
+        try:
+            with open(template_file, 'r', encoding='utf-8') as f:
+                html_content = f.read()
+            
+            template_info = self._index_template(filename, file_stat)
+            template_info['template'] = self.jinja_env.get_template(filename)
+            template_info['schema'] = self._build_template_schema(template_name, html_content)
+            # 公共布局和片段的变化也会影响渲染结果，一并计入模板版本
+            template_info['version'] = hashlib.sha1((html_content + self._shared_version).encode('utf-8')).hexdigest()
+            logger.info(f"[AstrBot Plugin HTTP Render Bridge] 已编译模板: {template_name} ({filename})")
+            return template_info
+            
+        except Exception as e:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 加载模板文件 {filename} 失败: {e}")
+            return None
+
+    def _build_template_schema(self, template_name: str, html_content: str) -> Dict[str, List[str]]:
+        """生成模板字段定义：静态分析结果，再按template_options中的required_fields/optional_fields修正"""
+        schema = analyze_template_fields(self.jinja_env, html_content)
+        required = set(schema['required'])
+        optional = set(schema['optional'])
+        
+        declared_required = set(self._get_template_option(template_name, 'required_fields', []) or [])
+        declared_optional = set(self._get_template_option(template_name, 'optional_fields', []) or [])
+        required = (required | declared_required) - declared_optional
+        optional = (optional | declared_optional) - required
+        
+        return {'required': sorted(required), 'optional': sorted(optional)}
+
+    async def _template_required_fields(self, template_alias: str) -> List[str]:
+        """模板的必填字段（模板不存在或编译失败时返回空列表，由渲染流程报错）"""
+        template_info = await self._get_compiled_template(template_alias)
+        if not template_info or not template_info.get('schema'):
+            return []
+        return template_info['schema']['required']
+
+    async def _validate_template_fields(self, template_alias: str, form_data: Dict[str, Any]) -> List[str]:
+        """在渲染前检查必填字段，返回缺少的字段列表"""
+        required = await self._template_required_fields(template_alias)
+        return [field for field in required if form_data.get(field) in (None, '')]
+
+    @staticmethod
+    def _missing_fields_message(template_alias: str, missing_fields: List[str]) -> str:
+        return f"Missing required fields for template '{template_alias}': {', '.join(missing_fields)}"
+
+    async def _get_compiled_template(self, template_name: str) -> Optional[Dict[str, Any]]:
+        """获取已编译的模板条目，尚未编译时在线程中编译（同一模板的并发请求只编译一次）"""
+        template_info = self.templates_cache.get(template_name)
+        if template_info is None or template_info['template'] is not None:
+            return template_info
+        
+        compile_key = f"{template_name}:{template_info['mtime_ns']}:{template_info['size']}"
+        return await self.compile_flights.do(compile_key, lambda: self._compile_indexed_template(template_name, template_info))
+
+    async def _compile_indexed_template(self, template_name: str, indexed_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """编译索引中的模板，并替换索引条目"""
+        file_stat = (indexed_info['mtime_ns'], indexed_info['size'])
+        template_info = await asyncio.to_thread(self._load_template, indexed_info['file'], file_stat)
+        if template_info is None:
+            self._failed_template_stats[indexed_info['file']] = file_stat
+        else:
+            self._failed_template_stats.pop(indexed_info['file'], None)
+        # 编译期间条目可能已被热重载替换，此时不覆盖新的条目
+        if template_info is not None and self.templates_cache.get(template_name) is indexed_info:
+            self.templates_cache[template_name] = template_info
+        return template_info
+
+    async def _warm_up_templates(self):
+        """后台预热：逐个在线程中编译尚未编译的模板"""
+        started_at = time.monotonic()
+        compiled = 0
+        for template_name in list(self.templates_cache.keys()):
+            template_info = self.templates_cache.get(template_name)
+            if template_info is None or template_info['template'] is not None:
+                continue
+            if await self._get_compiled_template(template_name):
+                compiled += 1
+        logger.info(f"[AstrBot Plugin HTTP Render Bridge] 模板预热完成，编译 {compiled} 个模板，耗时 {time.monotonic() - started_at:.2f}s")
+
+    def _shared_template_files(self) -> List[str]:
+        """公共布局和片段文件（下划线开头的文件及子目录中的文件）的路径列表"""
+        shared_files = []
+        for root, dirs, files in os.walk(self.templates_dir):
+            dirs.sort()
+            for filename in sorted(files):
+                if root == self.templates_dir and not filename.startswith('_'):
+                    continue
+                shared_files.append(os.path.join(root, filename))
+        return shared_files
+
+    def _shared_templates_signature(self) -> Tuple:
+        """公共布局和片段的文件状态，用于低成本地判断它们是否发生变化"""
+        signature = []
+        for file_path in self._shared_template_files():
+            file_stat = os.stat(file_path)
+            signature.append((file_path, file_stat.st_mtime_ns, file_stat.st_size))
+        return tuple(signature)
+
+    def _shared_templates_version(self) -> str:
+        """计算公共布局和片段内容的哈希"""
+        digest = hashlib.sha1()
+        for file_path in self._shared_template_files():
+            digest.update(os.path.relpath(file_path, self.templates_dir).encode('utf-8'))
+            with open(file_path, 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    async def _watch_templates(self):
+        """定期检查模板目录的文件修改时间，增量重载发生变化的模板"""
+        interval = float(self.config.get('template_watch_interval', 2))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._refresh_templates()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[AstrBot Plugin HTTP Render Bridge] 检查模板变化失败: {e}")
+
+    async def _refresh_templates(self):
+        """增量重载模板：只处理新增或修改的文件，移除已删除的文件
+
+        文件扫描和编译在线程中进行；每个模板条目整体替换，正在进行的渲染继续使用旧条目，不受影响。
+        """
+        if not os.path.exists(self.templates_dir):
+            return
+        
+        # 公共布局/片段变化会影响所有模板，此时完整重载
+        shared_signature = await asyncio.to_thread(self._shared_templates_signature)
+        if shared_signature != self._shared_signature:
+            logger.info(f"[AstrBot Plugin HTTP Render Bridge] 公共布局或片段已变化，重新加载全部模板")
+            await asyncio.to_thread(self.jinja_env.cache.clear)
+            self._apply_template_index(*await asyncio.to_thread(self._build_template_index))
+            if self.config.get('template_warmup', True):
+                self._run_in_background(self._warm_up_templates())
+            return
+        
+        known_templates = {
+            info['file']: ((info['mtime_ns'], info['size']), info['template'] is not None)
+            for info in self.templates_cache.values()
+        }
+        # 编译失败的文件在再次修改前不重复编译
+        for filename, file_stat in self._failed_template_stats.items():
+            if filename in known_templates:
+                known_templates[filename] = (file_stat, True)
+        updates, failed_stats = await asyncio.to_thread(self._load_changed_templates, known_templates)
+        
+        for filename, file_stat in failed_stats.items():
+            if file_stat is None:
+                self._failed_template_stats.pop(filename, None)
+            else:
+                self._failed_template_stats[filename] = file_stat
+        for template_name, template_info in updates.items():
+            if template_info is None:
+                self.templates_cache.pop(template_name, None)
+                logger.info(f"[AstrBot Plugin HTTP Render Bridge] 模板已删除: {template_name}")
+            else:
+                self.templates_cache[template_name] = template_info
+            removed = self.render_cache.invalidate_template(template_name)
+            if removed:
+                logger.info(f"[AstrBot Plugin HTTP Render Bridge] 模板 {template_name} 已变更，清除 {removed} 条渲染缓存")
+
+    def _load_changed_templates(self, known_templates: Dict[str, Tuple[Tuple[int, int], bool]]
+                                ) -> Tuple[Dict[str, Optional[Dict[str, Any]]], Dict[str, Optional[Tuple[int, int]]]]:
+        """处理状态发生变化的模板文件（在线程中调用），返回(模板名 -> 新条目, 文件名 -> 编译失败的文件状态)
+
+        已编译过的模板立即重新编译（失败时保留旧版本），未编译过的只更新索引。新条目为None表示模板已删除；
+        文件状态为None表示清除该文件的编译失败记录（重新编译成功或已删除），由调用方在事件循环中应用。
+        """
+        updates: Dict[str, Optional[Dict[str, Any]]] = {}
+        failed_stats: Dict[str, Optional[Tuple[int, int]]] = {}
+        template_files = self._scan_template_files()
+        
+        for filename, file_stat in template_files.items():
+            known = known_templates.get(filename)
+            if known is not None and known[0] == file_stat:
+                continue
+            if known is not None and known[1]:
+                template_info = self._load_template(filename, file_stat)
+                if template_info:
+                    updates[filename[:-5]] = template_info
+                failed_stats[filename] = None if template_info else file_stat
+            else:
+                updates[filename[:-5]] = self._index_template(filename, file_stat)
+                failed_stats[filename] = None
+        
+        for filename in known_templates:
+            if filename not in template_files:
+                failed_stats[filename] = None
+                updates[filename[:-5]] = None
+        
+        return updates, failed_stats
 
     async def start_server(self):
         """启动HTTP服务器"""
         try:
-            app = web.Application()
+            # 创建共享的出站HTTP连接池
+            self.http_client.get_session()
+            
+            # 载入磁盘上的缓存和资源（在线程中执行）
+            await asyncio.gather(self.render_cache.load(), self.qr_cache.load(), self.asset_store.load())
+            
+            # 打开发件箱并恢复上次未完成的任务
+            await self._open_outbox()
+            
+            # client_max_size限制一次性读取的请求体（如批量接口的JSON），multipart请求体由_parse_form_data流式检查
+            app = web.Application(client_max_size=self.request_max_bytes)
             
             # 添加路由
             api_path = self.config.get('api_path', '/api/render/image')
             app.router.add_post(api_path, self.render_handler)
+            app.router.add_post(f"{api_path.rstrip('/')}/batch", self.batch_handler)
+            
+            # 添加资源文件端点（模板通过URL引用上传的图片）
+            app.router.add_get('/assets/{asset_hash}', self.asset_handler)
+            
+            # 添加异步任务查询端点
+            app.router.add_get('/api/jobs/{job_id}', self.job_status_handler)
+            
+            # 添加死信查询和重新投递端点
+            app.router.add_get('/api/outbox/dead', self.dead_letter_handler)
+            app.router.add_post('/api/outbox/dead/{entry_id}/replay', self.replay_handler)
             
             # 添加健康检查端点
             app.router.add_get('/health', self.health_handler)
@@ -193,7 +910,9 @@ class HttpRenderBridge(Star):
             available_templates.append({
                 'name': name,
                 'file': info.get('file', f'{name}.html'),
-                'description': info.get('description', '')
+                'description': info.get('description', ''),
+                'compiled': info.get('template') is not None,
+                'schema': info.get('schema')
             })
         
         return web.json_response({
@@ -201,7 +920,22 @@ class HttpRenderBridge(Star):
             'plugin': 'astrbot_plugin_http_render_bridge',
             'version': '1.0.0',
             'templates_count': len(self.templates_cache),
+            'templates_compiled': sum(1 for info in self.templates_cache.values() if info.get('template') is not None),
             'available_templates': available_templates,
+            'render_cache': self.render_cache.stats(),
+            'qr_cache': self.qr_cache.stats(),
+            'http_client': self.http_client.stats(),
+            'platforms': self.platform_registry.stats(),
+            'image_payload_cache': self.image_payload_cache.stats(),
+            'assets': self.asset_store.stats(),
+            'render_memory': self.render_memory.stats(),
+            'offload': self.offload.stats(),
+            'render_coalescing': self.render_flights.stats(),
+            'render_scheduler': self.render_scheduler.stats(),
+            'send_scheduler': self.send_scheduler.stats(),
+            'jobs': self.job_store.stats(),
+            'idempotency': self.idempotency_store.stats(),
+            'outbox': self._outbox_stats(),
             'timestamp': datetime.now().isoformat()
         })
 
@@ -213,15 +947,12 @@ class HttpRenderBridge(Star):
             if auth_result:
                 return auth_result
             
-            # 2. 检查消息类型
-            message_type = request.headers.get('X-Message-Type', 'template')
+            # 2. 带Idempotency-Key的请求：解析请求体后检查，重复请求等待第一次处理的结果或直接返回保存的响应
+            idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+            if idempotency_key:
+                return await self._handle_idempotent_request(request, idempotency_key)
             
-            if message_type == 'template':
-                # 传统的HTML模板渲染模式
-                return await self._handle_template_render(request)
-            else:
-                # 直接消息发送模式
-                return await self._handle_direct_message(request, message_type)
+            return await self._dispatch_message(request)
             
         except Exception as e:
             logger.error(f"[AstrBot Plugin HTTP Render Bridge] 处理请求时发生错误: {e}")
@@ -230,59 +961,206 @@ class HttpRenderBridge(Star):
                 'message': 'Internal server error'
             }, status=500)
 
+    async def _dispatch_message(self, request: web.Request) -> web.Response:
+        """按消息类型处理请求"""
+        message_type = request.headers.get('X-Message-Type', 'template')
+        
+        if message_type == 'template':
+            # 传统的HTML模板渲染模式
+            return await self._handle_template_render(request)
+        else:
+            # 直接消息发送模式
+            return await self._handle_direct_message(request, message_type)
+
+    async def _handle_idempotent_request(self, request: web.Request, idempotency_key: str) -> web.Response:
+        """处理带Idempotency-Key的请求
+
+        同一个键只处理一次：处理中的重复请求等待第一次的结果，之后的重复请求直接返回保存的响应（带Idempotent-Replayed头）。
+        键在解析完请求体后由 _claim_idempotency_key 登记；5xx和429响应不保存，生产者重试时会重新处理。
+        """
+        if len(idempotency_key) > 255:
+            return web.json_response({
+                'status': 'error',
+                'message': 'Idempotency-Key must be at most 255 characters'
+            }, status=400)
+        
+        request['idempotency_key'] = idempotency_key
+        saved = None
+        try:
+            response = await self._dispatch_message(request)
+            if response.status < 500 and response.status != 429 and isinstance(response.body, bytes):
+                saved = (response.status, response.body, response.content_type)
+            return response
+        finally:
+            entry = request.get('idempotency_entry')
+            if entry is not None:
+                self.idempotency_store.finish(idempotency_key, entry, saved)
+
+    async def _claim_idempotency_key(self, request: web.Request) -> Optional[web.Response]:
+        """解析完请求体后登记Idempotency-Key，重复的请求返回保存的响应，键已用于不同的请求时返回422；没有键或登记成功时返回None"""
+        idempotency_key = request.get('idempotency_key')
+        if not idempotency_key:
+            return None
+        
+        fingerprint = self._request_fingerprint(request)
+        while True:
+            entry = self.idempotency_store.get(idempotency_key)
+            if entry is None:
+                break
+            if entry['fingerprint'] != fingerprint:
+                self.idempotency_store.mismatched += 1
+                return web.json_response({
+                    'status': 'error',
+                    'message': 'Idempotency-Key was already used for a different request'
+                }, status=422)
+            if entry['response'] is not None:
+                self.idempotency_store.replayed += 1
+                return self._replay_response(entry['response'])
+            
+            # 第一次请求还在处理，等待它的结果；没有可保存的结果时重新检查（可能由本请求重新处理）
+            self.idempotency_store.waited += 1
+            response = await asyncio.shield(entry['future'])
+            if response is not None:
+                self.idempotency_store.replayed += 1
+                return self._replay_response(response)
+        
+        request['idempotency_entry'] = self.idempotency_store.begin(idempotency_key, fingerprint)
+        return None
+
+    @staticmethod
+    def _request_fingerprint(request: web.Request) -> str:
+        """根据决定请求含义的请求头和请求体摘要（解析请求体时计算）生成指纹，用于发现同一个Idempotency-Key被用于不同的请求"""
+        parts = [request.path] + [
+            request.headers.get(name, '') for name in
+            ('X-Message-Type', 'X-Html-Template', 'X-Target-Type', 'X-Target-Id', 'X-Platform', 'X-Async')
+        ] + [request.get('body_digest', '')]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _replay_response(saved: Tuple[int, bytes, str]) -> web.Response:
+        status, body, content_type = saved
+        return web.Response(body=body, status=status, content_type=content_type,
+                            headers={'Idempotent-Replayed': 'true'})
+
     async def _handle_template_render(self, request: web.Request):
         """处理HTML模板渲染请求"""
+        form_data = None
         try:
             # 验证请求头
             headers_result = self._validate_headers(request)
             if isinstance(headers_result, web.Response):
                 return headers_result
             
-            template_alias, target_type, target_id = headers_result
+            template_alias, target_type = headers_result
             
-            # 解析请求体
-            form_data = await self._parse_form_data(request)
+            platform = self._resolve_platform(request)
+            if isinstance(platform, web.Response):
+                return platform
+            
+            # 渲染队列已满时立即拒绝，不再解析请求体
+            if self.render_scheduler.is_full():
+                return self._render_queue_full_response(self.render_scheduler.reject())
+            
+            # 解析请求体（检查模板必填字段，字段齐全后启动图片处理和二维码生成）
+            form_data = await self._parse_form_data(request, template_alias)
             if isinstance(form_data, web.Response):
                 return form_data
             
-            # 渲染图片
-            image_url = await self._render_template_to_image(template_alias, form_data)
-            if not image_url:
-                return web.json_response({
-                    'status': 'error',
-                    'message': 'Failed to render template to image'
-                }, status=500)
+            # 带Idempotency-Key的重复请求直接返回第一次的结果
+            replayed = await self._claim_idempotency_key(request)
+            if replayed is not None:
+                self._cancel_pending_fields(form_data)
+                return replayed
             
-            # 发送消息
-            send_result = await self._send_message(target_type, target_id, image_url)
-            if not send_result:
-                return web.json_response({
-                    'status': 'error',
-                    'message': 'Failed to send message to target'
-                }, status=500)
+            # 解析发送目标（支持多个）
+            target_ids = self._resolve_target_ids(request, form_data)
+            if isinstance(target_ids, web.Response):
+                self._cancel_pending_fields(form_data)
+                return target_ids
             
-            return web.json_response({
-                'status': 'success',
-                'message': 'Image sent successfully',
-                'template_used': template_alias,
-                'target': f"{target_type}:{target_id}"
-            })
+            # 异步请求在确认之前写入发件箱，同步请求在发送失败时才写入（需要先等待图片处理和二维码生成，得到可以保存的字段值）
+            form_data = await self._resolve_pending_fields(form_data)
+            is_async = self._is_async_request(request)
+            entry = await self._accept_outbox_entry('template', target_ids, {
+                'template': template_alias,
+                'target_type': target_type,
+                'platform': platform,
+                'fields': form_data
+            }, persist=is_async)
+            if entry is None:
+                return self._outbox_unavailable_response()
+            
+            # 异步模式：入队后立即返回任务ID
+            if is_async:
+                job = self.job_store.create('template', f"{target_type}:{','.join(target_ids)}",
+                                            template=template_alias, outbox_id=entry['id'])
+                entry['job_id'] = job['id']
+                self._run_in_background(self._run_job(job, self._deliver_outbox_entry(entry, job)))
+                return self._job_accepted_response(job)
+            
+            try:
+                result, status = await self._deliver_outbox_entry(entry, requeue_when_full=False)
+            except RenderQueueFull as e:
+                return self._render_queue_full_response(e.retry_after)
+            return web.json_response(result, status=status)
             
         except Exception as e:
             logger.error(f"[AstrBot Plugin HTTP Render Bridge] 模板渲染处理失败: {e}")
+            self._cancel_pending_fields(form_data)
             return web.json_response({
                 'status': 'error',
                 'message': 'Template render failed'
             }, status=500)
 
+    async def _execute_template_render(self, template_alias: str, target_type: str, target_ids: List[str],
+                                       form_data: Dict[str, Any], job: Optional[Dict[str, Any]] = None,
+                                       platform: Optional[str] = None):
+        """渲染模板并发送图片，返回(响应数据, 状态码)"""
+        # 渲染图片
+        self.job_store.set_status(job, 'rendering')
+        image_url = await self._render_template_to_image(template_alias, form_data)
+        if not image_url:
+            return {
+                'status': 'error',
+                'message': 'Failed to render template to image'
+            }, 500
+        
+        # 发送消息
+        self.job_store.set_status(job, 'sending')
+        if len(target_ids) > 1:
+            # 多目标：只渲染和编码一次，然后并发发送
+            message_data = await self._build_image_message(image_url)
+            if not message_data:
+                return {
+                    'status': 'error',
+                    'message': 'Failed to send message to target'
+                }, 500
+            results = await self._send_to_targets(target_type, target_ids, message_data, platform)
+            return self._fan_out_result(results, 'Image', template_used=template_alias)
+        
+        target_id = target_ids[0]
+        success, retryable = await self._send_message(target_type, target_id, image_url, platform)
+        if not success:
+            return {
+                'status': 'error',
+                'message': 'Failed to send message to target',
+                '_retryable': retryable
+            }, 500
+        
+        return {
+            'status': 'success',
+            'message': 'Image sent successfully',
+            'template_used': template_alias,
+            'target': f"{target_type}:{target_id}"
+        }, 200
+
     async def _handle_direct_message(self, request: web.Request, message_type: str):
         """处理直接消息发送请求"""
         try:
             # 验证基本请求头（不需要模板）
             target_type = request.headers.get('X-Target-Type')
-            target_id = request.headers.get('X-Target-Id')
             
-            if not target_type or not target_id:
+            if not target_type:
                 return web.json_response({
                     'status': 'error',
                     'message': 'Missing X-Target-Type or X-Target-Id header'
@@ -294,11 +1172,25 @@ class HttpRenderBridge(Star):
                     'message': "X-Target-Type must be 'group' or 'private'"
                 }, status=400)
             
+            platform = self._resolve_platform(request)
+            if isinstance(platform, web.Response):
+                return platform
+            
             # 解析请求体
             form_data = await self._parse_form_data(request)
             if isinstance(form_data, web.Response):
                 return form_data
             
+            # 带Idempotency-Key的重复请求直接返回第一次的结果
+            replayed = await self._claim_idempotency_key(request)
+            if replayed is not None:
+                return replayed
+            
+            # 解析发送目标（支持多个）
+            target_ids = self._resolve_target_ids(request, form_data)
+            if isinstance(target_ids, web.Response):
+                return target_ids
+            
             # 构建消息内容
             message_content = await self._build_message_content(message_type, form_data)
             if not message_content:
@@ -307,20 +1199,26 @@ class HttpRenderBridge(Star):
                     'message': f'Failed to build message content for type: {message_type}'
                 }, status=400)
             
-            # 发送消息
-            send_result = await self._send_direct_message(target_type, target_id, message_content)
-            if not send_result:
-                return web.json_response({
-                    'status': 'error',
-                    'message': 'Failed to send message to target'
-                }, status=500)
-            
-            return web.json_response({
-                'status': 'success',
-                'message': f'{message_type.title()} message sent successfully',
+            # 异步请求在确认之前写入发件箱，同步请求在发送失败时才写入
+            is_async = self._is_async_request(request)
+            entry = await self._accept_outbox_entry('direct', target_ids, {
                 'message_type': message_type,
-                'target': f"{target_type}:{target_id}"
-            })
+                'target_type': target_type,
+                'platform': platform,
+                'message': message_content
+            }, persist=is_async)
+            if entry is None:
+                return self._outbox_unavailable_response()
+            
+            # 异步模式：入队后立即返回任务ID
+            if is_async:
+                job = self.job_store.create(message_type, f"{target_type}:{','.join(target_ids)}", outbox_id=entry['id'])
+                entry['job_id'] = job['id']
+                self._run_in_background(self._run_job(job, self._deliver_outbox_entry(entry, job)))
+                return self._job_accepted_response(job)
+            
+            result, status = await self._deliver_outbox_entry(entry)
+            return web.json_response(result, status=status)
             
         except Exception as e:
             logger.error(f"[AstrBot Plugin HTTP Render Bridge] 直接消息处理失败: {e}")
@@ -329,6 +1227,536 @@ class HttpRenderBridge(Star):
                 'message': 'Direct message failed'
             }, status=500)
 
+    async def _execute_direct_message(self, message_type: str, target_type: str, target_ids: List[str],
+                                      message_content, job: Optional[Dict[str, Any]] = None,
+                                      platform: Optional[str] = None):
+        """发送直接消息，返回(响应数据, 状态码)"""
+        self.job_store.set_status(job, 'sending')
+        if len(target_ids) > 1:
+            results = await self._send_to_targets(target_type, target_ids, message_content, platform)
+            return self._fan_out_result(results, f'{message_type.title()} message', message_type=message_type)
+        
+        target_id = target_ids[0]
+        success, retryable = await self._send_direct_message(target_type, target_id, message_content, platform)
+        if not success:
+            return {
+                'status': 'error',
+                'message': 'Failed to send message to target',
+                '_retryable': retryable
+            }, 500
+        
+        return {
+            'status': 'success',
+            'message': f'{message_type.title()} message sent successfully',
+            'message_type': message_type,
+            'target': f"{target_type}:{target_id}"
+        }, 200
+
+    async def batch_handler(self, request: web.Request):
+        """批量渲染处理器 - 接收JSON数组，按完成顺序以NDJSON流式返回每一项的结果"""
+        auth_result = self._check_authentication(request)
+        if auth_result:
+            return auth_result
+        
+        try:
+            items = await request.json()
+        except Exception:
+            items = None
+        if not isinstance(items, list) or not items:
+            return web.json_response({
+                'status': 'error',
+                'message': 'Request body must be a non-empty JSON array'
+            }, status=400)
+        
+        max_items = int(self.config.get('batch_max_items', 500))
+        if len(items) > max_items:
+            return web.json_response({
+                'status': 'error',
+                'message': f'Too many batch items: {len(items)} > {max_items}'
+            }, status=400)
+        
+        # 开始返回结果之前校验所有项目；项目在发送失败时才写入发件箱
+        prepared = await asyncio.gather(*(self._prepare_batch_item(item) for item in items), return_exceptions=True)
+        for index, entry in enumerate(prepared):
+            if isinstance(entry, Exception):
+                logger.error(f"[AstrBot Plugin HTTP Render Bridge] 批量渲染项校验失败: {entry}")
+                prepared[index] = ({'status': 'error', 'message': 'Template render failed'}, 500)
+        
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson; charset=utf-8'})
+        await response.prepare(request)
+        
+        semaphore = asyncio.Semaphore(max(1, int(self.config.get('batch_max_parallel', 4))))
+        
+        async def run_item(index: int, item) -> Dict[str, Any]:
+            async with semaphore:
+                result, status = await self._execute_batch_item(prepared[index])
+            line = {'index': index, 'id': item.get('id') if isinstance(item, dict) else None, 'http_status': status}
+            line.update(result)
+            return line
+        
+        tasks = [asyncio.ensure_future(run_item(index, item)) for index, item in enumerate(items)]
+        succeeded = 0
+        retrying = 0
+        try:
+            # 哪一项先完成就先返回哪一项，不必等待最慢的一项
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                if line['http_status'] == 200:
+                    succeeded += 1
+                elif line['http_status'] == 202:
+                    retrying += 1
+                await response.write((json.dumps(line, ensure_ascii=False) + '\n').encode('utf-8'))
+            
+            summary = {'done': True, 'total': len(items), 'succeeded': succeeded, 'retrying': retrying,
+                       'failed': len(items) - succeeded - retrying}
+            await response.write((json.dumps(summary) + '\n').encode('utf-8'))
+            await response.write_eof()
+        except ConnectionResetError:
+            logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 批量请求的客户端已断开，剩余项目在后台继续执行")
+            return response
+        finally:
+            # 客户端提前断开时剩余的项目在后台继续执行，结果照常记录到发件箱（完成、重试或移入死信表）
+            for task in tasks:
+                if not task.done():
+                    self.background_tasks.add(task)
+                    task.add_done_callback(self.background_tasks.discard)
+        
+        logger.info(f"[AstrBot Plugin HTTP Render Bridge] 批量渲染完成: {succeeded}/{len(items)} 成功")
+        return response
+
+    async def _prepare_batch_item(self, item):
+        """校验批量请求中的一项，返回发件箱任务（发送失败时才写入发件箱），校验失败时返回(结果数据, 状态码)"""
+        if not isinstance(item, dict):
+            return {'status': 'error', 'message': 'Batch item must be a JSON object'}, 400
+        
+        template_alias = str(item.get('template') or '')
+        if template_alias.endswith('.html'):
+            template_alias = template_alias[:-5]
+        if template_alias not in self.templates_cache:
+            return {'status': 'error', 'message': f"Template '{template_alias}' not found"}, 400
+        
+        target_type = item.get('target_type')
+        if target_type not in ['group', 'private']:
+            return {'status': 'error', 'message': "'target_type' must be 'group' or 'private'"}, 400
+        
+        target_ids = self._split_target_ids(item.get('target_id', ''))
+        error_message = self._check_target_ids(target_ids)
+        if error_message:
+            return {'status': 'error', 'message': error_message}, 400
+        
+        fields = item.get('fields') or {}
+        if not isinstance(fields, dict):
+            return {'status': 'error', 'message': "'fields' must be a JSON object"}, 400
+        
+        platform = str(item.get('platform') or '') or None
+        if platform and self.platform_registry.find(platform) is None:
+            return {'status': 'error', 'message': f"Platform '{platform}' not found"}, 400
+        
+        missing_fields = await self._validate_template_fields(template_alias, fields)
+        if missing_fields:
+            return {
+                'status': 'error',
+                'message': self._missing_fields_message(template_alias, missing_fields),
+                'missing_fields': missing_fields
+            }, 400
+        
+        return await self._accept_outbox_entry('template', target_ids, {
+            'template': template_alias,
+            'target_type': target_type,
+            'platform': platform,
+            'fields': dict(fields)
+        }, persist=False)
+
+    async def _execute_batch_item(self, entry):
+        """执行批量请求中校验通过的一项，返回(结果数据, 状态码)"""
+        if isinstance(entry, tuple):
+            return entry
+        
+        try:
+            return await self._deliver_outbox_entry(entry, requeue_when_full=False)
+        except RenderQueueFull as e:
+            return {
+                'status': 'error',
+                'message': 'Render queue is full, please retry later',
+                'retry_after': e.retry_after
+            }, 429
+        except Exception as e:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 批量渲染项处理失败: {e}")
+            return {'status': 'error', 'message': 'Template render failed'}, 500
+
+    @staticmethod
+    def _is_async_request(request: web.Request) -> bool:
+        """请求是否启用了异步任务模式（X-Async: true）"""
+        return request.headers.get('X-Async', '').strip().lower() in ('true', '1', 'yes')
+
+    def _job_accepted_response(self, job: Dict[str, Any]) -> web.Response:
+        """异步任务已接受的202响应"""
+        return web.json_response({
+            'status': 'accepted',
+            'message': 'Job accepted',
+            'job_id': job['id'],
+            'job_url': f"/api/jobs/{job['id']}"
+        }, status=202)
+
+    def _run_in_background(self, coro) -> asyncio.Task:
+        """启动后台任务并保持引用，插件终止时统一取消"""
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    async def _run_job(self, job: Dict[str, Any], coro):
+        """执行异步任务并记录最终结果"""
+        try:
+            result, status = await coro
+        except RenderQueueFull as e:
+            result, status = {
+                'status': 'error',
+                'message': 'Render queue is full, please retry later',
+                'retry_after': e.retry_after
+            }, 429
+        except Exception as e:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 异步任务 {job['id']} 执行失败: {e}")
+            result, status = {
+                'status': 'error',
+                'message': str(e)
+            }, 500
+        self.job_store.finish(job, result, status)
+
+    async def _open_outbox(self):
+        """打开发件箱，把上次运行时未完成的任务加入重试队列，并启动重试任务"""
+        if self.outbox is None:
+            return
+        try:
+            rows = await self.outbox.open()
+        except Exception as e:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 打开发件箱失败，本次运行不持久化任务: {e}")
+            self.outbox = None
+            return
+        
+        for row in rows:
+            try:
+                payload = json.loads(row['payload'], object_hook=outbox_object_hook)
+            except Exception as e:
+                logger.error(f"[AstrBot Plugin HTTP Render Bridge] 发件箱任务 {row['id']} 无法读取: {e}")
+                continue
+            self.outbox_retries[row['id']] = {
+                'id': row['id'],
+                'kind': row['kind'],
+                'payload': payload,
+                'targets': row['targets'],
+                'attempts': row['attempts'],
+                'next_attempt_at': row['next_attempt_at'],
+                'persisted': True
+            }
+        if self.outbox_retries:
+            logger.info(f"[AstrBot Plugin HTTP Render Bridge] 从发件箱恢复了 {len(self.outbox_retries)} 个未完成的任务")
+        self._run_in_background(self._outbox_worker())
+
+    async def _accept_outbox_entry(self, kind: str, target_ids: List[str], payload: Dict[str, Any],
+                                   persist: bool = True) -> Optional[Dict[str, Any]]:
+        """创建发件箱任务，persist为True且启用发件箱时写入数据库后才返回，写入失败时返回None
+
+        同步请求不在这里写入（persist为False），发送失败需要重试或移入死信表时才写入，成功的请求不经过数据库。
+        """
+        entry = {'id': uuid.uuid4().hex, 'kind': kind, 'payload': payload, 'targets': list(target_ids),
+                 'attempts': 0, 'persisted': False}
+        if self.outbox is None or not persist:
+            return entry
+        try:
+            text = await self._encode_outbox_payload(entry)
+            await self.outbox.add(entry['id'], kind, text, entry['targets'])
+        except asyncio.CancelledError:
+            # 写入可能已经提交：交给重试任务发送，避免留下没人处理的任务
+            entry['persisted'] = True
+            entry['next_attempt_at'] = time.time()
+            self.outbox_retries[entry['id']] = entry
+            self.outbox_wakeup.set()
+            raise
+        except Exception as e:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 写入发件箱失败: {e}")
+            return None
+        entry['persisted'] = True
+        return entry
+
+    async def _encode_outbox_payload(self, entry: Dict[str, Any]) -> str:
+        return await self.offload.run('outbox_encode', encode_outbox_payload, entry['payload'],
+                                      size=estimate_render_size(entry['payload']), process_safe=False)
+
+    @staticmethod
+    def _outbox_unavailable_response() -> web.Response:
+        return web.json_response({
+            'status': 'error',
+            'message': 'Failed to persist request, please retry later'
+        }, status=503)
+
+    async def _deliver_outbox_entry(self, entry: Dict[str, Any], job: Optional[Dict[str, Any]] = None,
+                                    requeue_when_full: bool = True):
+        """执行一次发件箱任务（渲染并发送到剩余目标），记录结果，返回(响应数据, 状态码)
+
+        渲染队列已满时，requeue_when_full为True则稍后重试，否则删除任务并抛出RenderQueueFull（由调用方返回429）。
+        """
+        payload = entry['payload']
+        try:
+            if entry['kind'] == 'template':
+                result, status = await self._execute_template_render(
+                    payload['template'], payload['target_type'], entry['targets'], dict(payload['fields']),
+                    job, payload.get('platform')
+                )
+            else:
+                result, status = await self._execute_direct_message(
+                    payload['message_type'], payload['target_type'], entry['targets'], payload['message'],
+                    job, payload.get('platform')
+                )
+        except RenderQueueFull as e:
+            if not requeue_when_full or self.outbox is None:
+                await self._finish_outbox_entry(entry)
+                raise
+            await self._schedule_outbox_retry(entry, e.retry_after, 'Render queue is full')
+            return {
+                'status': 'retrying',
+                'message': 'Render queue is full, will retry later',
+                'outbox': {'id': entry['id'], 'attempts': entry['attempts'], 'retry_in': e.retry_after}
+            }, 202
+        except Exception as e:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 发件箱任务 {entry['id']} 执行失败: {e}")
+            result, status = {'status': 'error', 'message': str(e) or e.__class__.__name__}, 500
+        return await self._record_delivery(entry, result, status)
+
+    async def _record_delivery(self, entry: Dict[str, Any], result: Dict[str, Any], status: int):
+        """根据执行结果删除任务、安排重试或移入死信表，重试时在响应中附带发件箱信息
+
+        只有暂时性的发送失败（结果带_retryable，多目标时为_retry_targets中的目标）会重试；渲染失败、模板错误、
+        平台拒绝（如群不存在）等重试也不会成功，直接移入死信表。
+        """
+        retry_targets = result.get('_retry_targets')
+        if retry_targets is None:
+            retry_targets = entry['targets'] if result.get('_retryable') else []
+        result = {key: value for key, value in result.items() if key not in ('_retryable', '_retry_targets')}
+        if 'targets' in result:
+            failed = [item['target'].split(':', 1)[1] for item in result['targets'] if not item['success']]
+        else:
+            failed = [] if status == 200 else entry['targets']
+        if not failed:
+            await self._finish_outbox_entry(entry)
+            return result, status
+        
+        error = str(result.get('message', ''))
+        if self.outbox is None:
+            return result, status
+        entry['attempts'] += 1
+        retry_targets = [target_id for target_id in failed if target_id in retry_targets]
+        if not retry_targets or entry['attempts'] >= self.outbox_max_attempts:
+            entry['targets'] = failed
+            await self._bury_outbox_entry(entry, failed, error)
+            return result, status
+        
+        # 部分目标无法发送时单独移入死信表，其余目标继续重试
+        permanent = [target_id for target_id in failed if target_id not in retry_targets]
+        if permanent:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 发件箱任务 {entry['id']} 的目标 {permanent} 发送失败且无法重试")
+            await self._bury_outbox_targets(entry, permanent, error)
+        entry['targets'] = retry_targets
+        delay = retry_delay(entry['attempts'], self.outbox_retry_base, self.outbox_retry_max)
+        await self._schedule_outbox_retry(entry, delay, error)
+        if result.get('status') == 'error':
+            result['status'] = 'retrying'
+            status = 202
+        result['outbox'] = {'id': entry['id'], 'attempts': entry['attempts'], 'retry_in': round(delay, 1)}
+        return result, status
+
+    async def _finish_outbox_entry(self, entry: Dict[str, Any]):
+        self.outbox_retries.pop(entry['id'], None)
+        if self.outbox is None or not entry.get('persisted'):
+            return
+        try:
+            await self.outbox.complete(entry['id'])
+        except Exception as e:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 删除发件箱任务 {entry['id']} 失败: {e}")
+
+    async def _schedule_outbox_retry(self, entry: Dict[str, Any], delay: float, error: str):
+        entry['next_attempt_at'] = time.time() + delay
+        self.outbox_retries[entry['id']] = entry
+        self.outbox_wakeup.set()
+        logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 发件箱任务 {entry['id']} 第 {entry['attempts']} 次失败，"
+                       f"{delay:.1f} 秒后重试 {len(entry['targets'])} 个目标: {error}")
+        try:
+            if entry.get('persisted'):
+                await self.outbox.reschedule(entry['id'], entry['targets'], entry['attempts'], entry['next_attempt_at'], error)
+            else:
+                # 同步请求第一次失败时才写入发件箱
+                await self.outbox.add(entry['id'], entry['kind'], await self._encode_outbox_payload(entry), entry['targets'],
+                                      entry['attempts'], entry['next_attempt_at'], error)
+                entry['persisted'] = True
+        except Exception as e:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 更新发件箱任务 {entry['id']} 失败: {e}")
+
+    async def _bury_outbox_entry(self, entry: Dict[str, Any], targets: List[str], error: str):
+        self.outbox_retries.pop(entry['id'], None)
+        logger.error(f"[AstrBot Plugin HTTP Render Bridge] 发件箱任务 {entry['id']} 已移入死信表"
+                     f"（{entry['attempts']} 次尝试）: {error}")
+        try:
+            if entry.get('persisted'):
+                await self.outbox.bury(entry['id'], targets, entry['attempts'], error)
+            else:
+                await self.outbox.add_dead(entry['id'], entry['kind'], await self._encode_outbox_payload(entry),
+                                           targets, entry['attempts'], error)
+        except Exception as e:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 移动发件箱任务 {entry['id']} 失败: {e}")
+
+    async def _bury_outbox_targets(self, entry: Dict[str, Any], targets: List[str], error: str):
+        """把任务的部分目标作为新的死信任务保存（任务本身继续重试其余目标）"""
+        try:
+            text = await self._encode_outbox_payload(entry)
+            await self.outbox.add_dead(uuid.uuid4().hex, entry['kind'], text, targets, entry['attempts'], error)
+        except Exception as e:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 保存发件箱任务 {entry['id']} 的死信目标失败: {e}")
+
+    async def _outbox_worker(self):
+        """按下次重试时间执行等待重试的发件箱任务，同时重试的数量受send_max_parallel限制"""
+        semaphore = asyncio.Semaphore(max(1, int(self.config.get('send_max_parallel', 5))))
+        while True:
+            self.outbox_wakeup.clear()
+            now = time.time()
+            waiting = [entry for entry in self.outbox_retries.values() if not entry.get('running')]
+            for entry in waiting:
+                if entry['next_attempt_at'] <= now:
+                    entry['running'] = True
+                    self._run_in_background(self._retry_outbox_entry(entry, semaphore))
+            
+            upcoming = [entry['next_attempt_at'] for entry in waiting if entry['next_attempt_at'] > now]
+            try:
+                await asyncio.wait_for(self.outbox_wakeup.wait(), timeout=min(upcoming) - now if upcoming else None)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _retry_outbox_entry(self, entry: Dict[str, Any], semaphore: asyncio.Semaphore):
+        try:
+            async with semaphore:
+                logger.info(f"[AstrBot Plugin HTTP Render Bridge] 重试发件箱任务 {entry['id']}"
+                            f"（第 {entry['attempts'] + 1} 次），目标: {entry['targets']}")
+                # 异步请求的任务记录随重试结果更新（重启后恢复的任务没有任务记录）
+                job = self.job_store.get(entry['job_id']) if entry.get('job_id') else None
+                result, status = await self._deliver_outbox_entry(entry, job)
+                if job is not None:
+                    self.job_store.finish(job, result, status)
+        except Exception as e:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 重试发件箱任务 {entry['id']} 失败: {e}")
+        finally:
+            entry['running'] = False
+            self.outbox_wakeup.set()
+
+    def _outbox_stats(self) -> Dict[str, Any]:
+        if self.outbox is None:
+            return {'enabled': False}
+        stats = {'enabled': True, 'retrying': len(self.outbox_retries)}
+        stats.update(self.outbox.stats())
+        return stats
+
+    async def dead_letter_handler(self, request: web.Request):
+        """死信任务查询处理器"""
+        auth_result = self._check_authentication(request)
+        if auth_result:
+            return auth_result
+        if self.outbox is None:
+            return self._outbox_disabled_response()
+        
+        try:
+            limit = max(1, min(1000, int(request.query.get('limit', 100))))
+        except ValueError:
+            limit = 100
+        return web.json_response({
+            'status': 'success',
+            'dead_letters': await self.outbox.list_dead(limit)
+        })
+
+    async def replay_handler(self, request: web.Request):
+        """死信任务重新投递处理器 - 任务移回发件箱，重置重试次数后立即重试"""
+        auth_result = self._check_authentication(request)
+        if auth_result:
+            return auth_result
+        if self.outbox is None:
+            return self._outbox_disabled_response()
+        
+        row = await self.outbox.replay(request.match_info['entry_id'])
+        if row is None:
+            return web.json_response({
+                'status': 'error',
+                'message': 'Dead letter not found'
+            }, status=404)
+        
+        entry = {
+            'id': row['id'],
+            'kind': row['kind'],
+            'payload': json.loads(row['payload'], object_hook=outbox_object_hook),
+            'targets': row['targets'],
+            'attempts': 0,
+            'next_attempt_at': row['next_attempt_at'],
+            'persisted': True
+        }
+        self.outbox_retries[entry['id']] = entry
+        self.outbox_wakeup.set()
+        return web.json_response({
+            'status': 'queued',
+            'message': 'Dead letter requeued',
+            'outbox_id': entry['id'],
+            'targets': entry['targets']
+        }, status=202)
+
+    @staticmethod
+    def _outbox_disabled_response() -> web.Response:
+        return web.json_response({
+            'status': 'error',
+            'message': 'Outbox is disabled'
+        }, status=503)
+
+    def _asset_url(self, asset_hash: str) -> str:
+        """资源的访问地址（渲染器需要能访问到这个地址）"""
+        return f"{self.asset_base_url}/assets/{asset_hash}"
+
+    async def asset_handler(self, request: web.Request):
+        """资源文件处理器 - 地址由内容哈希决定，内容不会变化，可以永久缓存"""
+        asset_hash = request.match_info['asset_hash']
+        found = self.asset_store.get(asset_hash) if re.fullmatch(r'[0-9a-f]{64}', asset_hash) else None
+        if found is None:
+            return web.json_response({
+                'status': 'error',
+                'message': 'Asset not found or expired'
+            }, status=404)
+        
+        path, mime_type = found
+        return web.FileResponse(path, headers={
+            'Content-Type': mime_type,
+            'Cache-Control': 'public, max-age=31536000, immutable'
+        })
+
+    async def job_status_handler(self, request: web.Request):
+        """异步任务状态查询处理器"""
+        auth_result = self._check_authentication(request)
+        if auth_result:
+            return auth_result
+        
+        job = self.job_store.get(request.match_info['job_id'])
+        if job is None:
+            return web.json_response({
+                'status': 'error',
+                'message': 'Job not found or expired'
+            }, status=404)
+        
+        return web.json_response({
+            'status': 'success',
+            'job': self.job_store.view(job)
+        })
+
+    def _render_queue_full_response(self, retry_after: int) -> web.Response:
+        """渲染队列已满时的429响应"""
+        logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 渲染队列已满，拒绝请求，建议 {retry_after} 秒后重试")
+        return web.json_response({
+            'status': 'error',
+            'message': 'Render queue is full, please retry later',
+            'retry_after': retry_after
+        }, status=429, headers={'Retry-After': str(retry_after)})
+
     def _check_authentication(self, request: web.Request) -> Optional[web.Response]:
         """检查Bearer Token认证"""
         auth_token = self.config.get('auth_token', '')
@@ -382,107 +1810,499 @@ class HttpRenderBridge(Star):
                 'message': "Header 'X-Target-Type' must be 'group' or 'private'"
             }, status=400)
         
-        # 检查X-Target-Id
-        target_id = request.headers.get('X-Target-Id')
-        if not target_id:
+        # X-Target-Id 可以和表单字段 target_ids 一起指定，解析请求体后由 _resolve_target_ids 检查
+        return template_name, target_type
+
+    def _resolve_platform(self, request: web.Request):
+        """读取X-Platform请求头（平台ID或名称），未指定时返回None，指定的平台不存在时返回400响应"""
+        platform = request.headers.get('X-Platform', '').strip()
+        if not platform:
+            return None
+        if self.platform_registry.find(platform) is None:
             return web.json_response({
                 'status': 'error',
-                'message': "Header 'X-Target-Id' is missing"
+                'message': f"Platform '{platform}' not found"
             }, status=400)
-        
-        return template_name, target_type, target_id
+        return platform
+
+    def _resolve_target_ids(self, request: web.Request, form_data: Dict[str, Any]):
+        """合并X-Target-Id请求头和target_ids表单字段中的目标ID（逗号或空白分隔，自动去重）"""
+        target_ids = self._split_target_ids(request.headers.get('X-Target-Id', ''), form_data.pop('target_ids', ''))
+        error_message = self._check_target_ids(target_ids)
+        if error_message:
+            return web.json_response({
+                'status': 'error',
+                'message': error_message
+            }, status=400)
+        return target_ids
 
-    async def _parse_form_data(self, request: web.Request):
-        """解析multipart/form-data请求体，支持文本和图片文件"""
+    @staticmethod
+    def _split_target_ids(*raw_values) -> List[str]:
+        """拆分目标ID，支持逗号/空白分隔的字符串和列表，保持顺序并去重"""
+        target_ids: List[str] = []
+        for raw_value in raw_values:
+            if isinstance(raw_value, (list, tuple)):
+                items = [str(item) for item in raw_value]
+            else:
+                items = re.split(r'[\s,;]+', str(raw_value or ''))
+            for target_id in items:
+                target_id = target_id.strip()
+                if target_id and target_id not in target_ids:
+                    target_ids.append(target_id)
+        return target_ids
+
+    @staticmethod
+    def _check_target_ids(target_ids: List[str]) -> Optional[str]:
+        """检查目标ID，返回错误信息，合法时返回None"""
+        if not target_ids:
+            return "Header 'X-Target-Id' is missing"
+        invalid_ids = [target_id for target_id in target_ids if not target_id.isdigit()]
+        if invalid_ids:
+            return f"Invalid target id: {', '.join(invalid_ids)}"
+        return None
+
+    async def _parse_form_data(self, request: web.Request, template_alias: Optional[str] = None):
+        """解析请求体，支持multipart/form-data（文本和图片文件）以及JSON/MessagePack（见 _read_structured_body）
+
+        multipart字段按块流式读取，超出单个文件或整个请求的大小限制时立即中止并返回413；图片类型按文件头魔数判断，
+        较大的文件在读取时写入临时文件而不是留在内存中。带Idempotency-Key的请求同时计算请求体摘要（request['body_digest']）。
+        传入模板名时检查模板必填字段，缺少时返回400；图片处理和二维码生成在必填字段齐全后作为任务启动（见 DeferredFieldTasks），
+        与后续字段的读取并行进行，任务暂存在表单数据中，由渲染步骤统一等待（见 _resolve_pending_fields）。
+        """
+        form_data = {}
+        tasks = None
         try:
-            if request.content_type != 'multipart/form-data':
+            structured = request.content_type in JSON_CONTENT_TYPES + MSGPACK_CONTENT_TYPES
+            if not structured and request.content_type != 'multipart/form-data':
                 return web.json_response({
                     'status': 'error',
-                    'message': 'Content-Type must be multipart/form-data'
+                    'message': 'Content-Type must be multipart/form-data, application/json or application/msgpack'
                 }, status=400)
+            if request.content_type in MSGPACK_CONTENT_TYPES and not MSGPACK_AVAILABLE:
+                return web.json_response({
+                    'status': 'error',
+                    'message': 'MessagePack support requires the msgpack package'
+                }, status=415)
+            
+            # 声明的长度已经超出限制时不读取请求体
+            if request.content_length is not None and request.content_length > self.request_max_bytes:
+                raise UploadTooLarge(f"Request body exceeds {self.request_max_bytes} bytes")
+            
+            if template_alias:
+                tasks = DeferredFieldTasks(form_data, await self._template_required_fields(template_alias))
+            
+            if structured:
+                await self._read_structured_body(request, form_data, template_alias, tasks)
+                return self._finish_form_data(form_data, template_alias, tasks)
             
             reader = await request.multipart()
-            form_data = {}
+            remaining = self.request_max_bytes
+            digest = hashlib.sha256() if request.get('idempotency_key') else None
             
             async for field in reader:
                 if field.name:
+                    if digest is not None:
+                        digest.update(f"\0{field.name}\0{field.filename or ''}\0".encode('utf-8'))
                     # 检查是否是文件字段
                     if field.filename:
                         # 这是一个文件字段
-                        file_data = await field.read()
-                        file_info = await process_uploaded_image(field.filename, file_data)
-                        if file_info:
-                            # 使用字段名作为键，存储图片的base64数据
-                            form_data[field.name] = file_info['base64']
-                            # 同时存储文件信息
-                            form_data[f"{field.name}_filename"] = file_info['filename']
-                            form_data[f"{field.name}_size"] = file_info['size']
-                            logger.info(f"[AstrBot Plugin HTTP Render Bridge] 处理图片文件: {field.name} -> {file_info['filename']} ({file_info['size']} bytes)")
-                        else:
-                            logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 图片处理失败: {field.filename}")
+                        upload_file, size, mime_type = await self._read_upload_field(field, remaining, digest)
+                        remaining -= size
+                        if upload_file is None:
+                            logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 不支持的图片格式: {field.filename}")
+                            continue
+                        await self._add_upload_field(form_data, field.name, field.filename, upload_file, size, mime_type,
+                                                     template_alias, tasks)
                     else:
                         # 这是一个文本字段
-                        value = await field.text()
+                        value = await self._read_text_field(field, remaining, digest)
+                        remaining -= len(value.encode('utf-8'))
                         form_data[field.name] = value
+                        if tasks is not None:
+                            tasks.field_present(field.name, value)
+                            # 收到link字段后开始生成二维码
+                            if field.name == 'link' and value:
+                                tasks.add('_qr_code', functools.partial(self._generate_qr_code, template_alias, value))
             
-            logger.info(f"[AstrBot Plugin HTTP Render Bridge] 解析到表单数据: {list(form_data.keys())}")
-            return form_data
+            if digest is not None:
+                request['body_digest'] = digest.hexdigest()
+            return self._finish_form_data(form_data, template_alias, tasks)
             
+        except UploadTooLarge as e:
+            logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 请求体超出大小限制: {e}")
+            self._discard_form_data(form_data, tasks)
+            return web.json_response({
+                'status': 'error',
+                'message': str(e)
+            }, status=413)
+        except BodyFormatError as e:
+            logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 请求体格式错误: {e}")
+            self._discard_form_data(form_data, tasks)
+            return web.json_response({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
         except Exception as e:
             logger.error(f"[AstrBot Plugin HTTP Render Bridge] 解析表单数据失败: {e}")
+            self._discard_form_data(form_data, tasks)
             return web.json_response({
                 'status': 'error',
                 'message': 'Failed to parse form data'
             }, status=400)
 
+    def _finish_form_data(self, form_data: Dict[str, Any], template_alias: Optional[str],
+                          tasks: Optional[DeferredFieldTasks]):
+        """请求体读取完成：缺少模板必填字段时丢弃登记的任务并返回400，否则返回表单数据"""
+        logger.info(f"[AstrBot Plugin HTTP Render Bridge] 解析到表单数据: {list(form_data.keys())}")
+        if tasks is None or not tasks.missing:
+            return form_data
+        
+        missing_fields = tasks.missing_fields()
+        self._discard_form_data(form_data, tasks)
+        return web.json_response({
+            'status': 'error',
+            'message': self._missing_fields_message(template_alias, missing_fields),
+            'missing_fields': missing_fields
+        }, status=400)
+
+    def _discard_form_data(self, form_data: Dict[str, Any], tasks: Optional[DeferredFieldTasks]):
+        """解析失败时取消已启动的字段任务，丢弃尚未启动的任务"""
+        self._cancel_pending_fields(form_data)
+        if tasks is not None:
+            tasks.discard()
+
+    async def _read_structured_body(self, request: web.Request, form_data: Dict[str, Any],
+                                    template_alias: Optional[str] = None, tasks: Optional[DeferredFieldTasks] = None):
+        """读取JSON/MessagePack请求体并写入form_data
+
+        请求体整体读入（大小受client_max_size限制），较大的请求体在执行器中解析；列表、嵌套对象等结构化字段原样传给模板。
+        文件字段与multipart一样检查单文件大小和文件头魔数，之后的处理流程相同。
+        """
+        try:
+            body = await request.read()
+        except web.HTTPRequestEntityTooLarge:
+            raise UploadTooLarge(f"Request body exceeds {self.request_max_bytes} bytes")
+        
+        fields, files = await self.offload.run('parse_body', parse_structured_body, body, request.content_type,
+                                               size=len(body))
+        if request.get('idempotency_key'):
+            request['body_digest'] = await self.offload.run('body_digest', body_digest, body, size=len(body))
+        
+        form_data.update(fields)
+        uploads = []
+        for name, filename, data in files:
+            if len(data) > self.upload_max_file_bytes:
+                raise UploadTooLarge(f"File '{filename}' exceeds {self.upload_max_file_bytes} bytes")
+            mime_type = detect_image_type(data[:IMAGE_HEADER_SIZE])
+            if mime_type is None:
+                logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 不支持的图片格式: {filename}")
+                continue
+            uploads.append((name, filename, data, mime_type))
+        
+        # 所有字段已经读完：先检查必填字段，再登记二维码和图片处理任务
+        if tasks is not None:
+            for name, value in fields.items():
+                tasks.field_present(name, value)
+            for name, _, data, _ in uploads:
+                tasks.field_present(name, data)
+            link = fields.get('link')
+            if link and isinstance(link, str):
+                tasks.add('_qr_code', functools.partial(self._generate_qr_code, template_alias, link))
+        
+        for name, filename, data, mime_type in uploads:
+            await self._add_upload_field(form_data, name, filename, io.BytesIO(data), len(data), mime_type,
+                                         template_alias, tasks)
+
+    async def _add_upload_field(self, form_data: Dict[str, Any], field_name: str, filename: str, upload_file,
+                                size: int, mime_type: str, template_alias: Optional[str] = None,
+                                tasks: Optional[DeferredFieldTasks] = None):
+        """把上传的图片加入表单数据：解析模板请求时登记为字段任务（必填字段齐全后启动），否则直接处理"""
+        if tasks is not None:
+            tasks.field_present(field_name, upload_file)
+            tasks.add(field_name, functools.partial(self._process_image_field, field_name, filename, upload_file,
+                                                    size, mime_type, template_alias), upload_file)
+        else:
+            form_data.update(await self._process_image_field(field_name, filename, upload_file, size, mime_type))
+
+    async def _read_upload_field(self, field, remaining: int, digest=None) -> Tuple[Optional[Any], int, Optional[str]]:
+        """分块读取文件字段，返回(临时文件, 字节数, MIME类型)
+
+        读到的字节数超过单文件限制或请求剩余额度时抛出UploadTooLarge；文件头不是支持的图片时丢弃剩余内容，返回的临时文件为None。
+        传入digest（hashlib对象）时读到的内容同时计入请求体摘要。
+        """
+        max_bytes = min(self.upload_max_file_bytes, remaining)
+        upload_file = tempfile.SpooledTemporaryFile(max_size=self.upload_spill_bytes)
+        size = 0
+        header = b''
+        mime_type = None
+        try:
+            while True:
+                chunk = await field.read_chunk(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if digest is not None:
+                    digest.update(chunk)
+                size += len(chunk)
+                if size > max_bytes:
+                    if max_bytes == self.upload_max_file_bytes:
+                        raise UploadTooLarge(f"File '{field.filename}' exceeds {self.upload_max_file_bytes} bytes")
+                    raise UploadTooLarge(f"Request body exceeds {self.request_max_bytes} bytes")
+                
+                # 凑够文件头后按魔数判断类型，不支持的类型不再保存后续内容
+                if mime_type is None:
+                    header += chunk[:IMAGE_HEADER_SIZE]
+                    if len(header) < IMAGE_HEADER_SIZE:
+                        upload_file.write(chunk)
+                        continue
+                    mime_type = detect_image_type(header)
+                    if mime_type is None:
+                        upload_file.close()
+                        # 丢弃的内容同样计入请求大小
+                        size += await self._drain_field(field, max_bytes - size, max_bytes == self.upload_max_file_bytes, digest)
+                        return None, size, None
+                upload_file.write(chunk)
+            
+            # 文件很小，读完都没凑够文件头
+            if mime_type is None:
+                mime_type = detect_image_type(header)
+                if mime_type is None:
+                    upload_file.close()
+                    return None, size, None
+            return upload_file, size, mime_type
+        except BaseException:
+            upload_file.close()
+            raise
+
+    async def _drain_field(self, field, max_bytes: int, file_limit: bool, digest=None) -> int:
+        """读完并丢弃字段的剩余内容，返回读取的字节数；超过剩余额度时抛出UploadTooLarge（file_limit表示额度来自单文件限制）"""
+        size = 0
+        while True:
+            chunk = await field.read_chunk(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                return size
+            if digest is not None:
+                digest.update(chunk)
+            size += len(chunk)
+            if size > max_bytes:
+                if file_limit:
+                    raise UploadTooLarge(f"File '{field.filename}' exceeds {self.upload_max_file_bytes} bytes")
+                raise UploadTooLarge(f"Request body exceeds {self.request_max_bytes} bytes")
+
+    async def _read_text_field(self, field, remaining: int, digest=None) -> str:
+        """分块读取文本字段，超出请求剩余额度时抛出UploadTooLarge；传入digest时内容同时计入请求体摘要"""
+        chunks = []
+        size = 0
+        while True:
+            chunk = await field.read_chunk(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if digest is not None:
+                digest.update(chunk)
+            size += len(chunk)
+            if size > remaining:
+                raise UploadTooLarge(f"Request body exceeds {self.request_max_bytes} bytes")
+            chunks.append(chunk)
+        return field.decode(b''.join(chunks)).decode(field.get_charset(default='utf-8'))
+
+    async def _process_image_field(self, field_name: str, filename: str, upload_file, size: int,
+                                   mime_type: str, template_alias: Optional[str] = None) -> Dict[str, Any]:
+        """处理上传的图片字段，返回要写入表单数据的字段
+
+        模板通过image_max_width/image_max_height声明了最大尺寸时，图片会先缩小再嵌入。
+        """
+        def option(key: str, default: Any) -> Any:
+            if template_alias is None:
+                return self.config.get(key, default)
+            return self._get_template_option(template_alias, key, self.config.get(key, default))
+        
+        file_info = await process_uploaded_image(
+            filename, upload_file, size, mime_type,
+            max_width=int(option('image_max_width', 0)),
+            max_height=int(option('image_max_height', 0)),
+            quality=int(option('image_quality', 85)),
+            offload=self.offload,
+            asset_store=self.asset_store if option('asset_mode', 'inline') == 'url' and self.asset_base_url else None
+        )
+        if not file_info:
+            logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 图片处理失败: {filename}")
+            return {}
+        logger.info(f"[AstrBot Plugin HTTP Render Bridge] 处理图片文件: {field_name} -> {file_info['filename']} ({file_info['size']} bytes)")
+        # 使用字段名作为键，存储图片（URL模式下为资源地址），同时存储文件信息
+        return {
+            field_name: self._asset_url(file_info['asset']) if 'asset' in file_info else file_info['image'],
+            f"{field_name}_filename": file_info['filename'],
+            f"{field_name}_size": file_info['size']
+        }
+
+    @staticmethod
+    async def _resolve_pending_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+        """等待表单数据中所有尚未完成的字段任务，把结果合并回表单数据"""
+        pending = {key: value for key, value in data.items() if isinstance(value, asyncio.Future)}
+        if not pending:
+            return data
+        
+        resolved = {key: value for key, value in data.items() if key not in pending}
+        results = await asyncio.gather(*pending.values(), return_exceptions=True)
+        for key, result in zip(pending, results):
+            if isinstance(result, dict):
+                resolved.update(result)
+            else:
+                logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 字段 {key} 处理失败: {result}")
+        return resolved
+
+    @staticmethod
+    def _cancel_pending_fields(data: Any):
+        """请求提前结束时取消表单数据中尚未完成的字段任务"""
+        if isinstance(data, dict):
+            for value in data.values():
+                if isinstance(value, asyncio.Future):
+                    value.cancel()
+
     async def _render_template_to_image(self, template_alias: str, data: Dict[str, Any]) -> Optional[str]:
         """渲染模板为图片 - 直接使用HTML本地渲染"""
         try:
-            template_info = self.templates_cache.get(template_alias)
+            template_info = await self._get_compiled_template(template_alias)
             if not template_info:
-                logger.error(f"[AstrBot Plugin HTTP Render Bridge] 模板 {template_alias} 不存在")
+                logger.error(f"[AstrBot Plugin HTTP Render Bridge] 模板 {template_alias} 不存在或编译失败")
+                self._cancel_pending_fields(data)
                 return None
             
+            # 等待解析请求体时启动的图片处理和二维码生成
+            data = await self._resolve_pending_fields(data)
+            render_key = RenderCache.make_key(template_alias, template_info.get('version', ''), data, json_default)
+            
+            # 查询渲染结果缓存（相同模板版本和相同数据直接复用图片）
+            cache_ttl = float(self._get_template_option(template_alias, 'cache_ttl', self.config.get('render_cache_ttl', 300)))
+            if cache_ttl > 0:
+                cached_image = self.render_cache.get(render_key)
+                if cached_image:
+                    logger.info(f"[AstrBot Plugin HTTP Render Bridge] 命中渲染缓存: {template_alias} -> {cached_image}")
+                    return cached_image
+            
+            # 相同的并发渲染请求共享同一次渲染的结果（包括失败）
+            return await self.render_flights.do(
+                render_key,
+                lambda: self._render_template_uncached(template_alias, template_info, data, render_key, cache_ttl)
+            )
+            
+        except RenderQueueFull:
+            raise
+        except Exception as e:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 渲染图片时发生错误: {e}")
+            return None
+
+    async def _generate_qr_code(self, template_alias: str, link_url: str) -> Dict[str, str]:
+        """为link参数生成二维码，返回要合并到渲染数据中的字段
+
+        默认在本地线程中编码，不依赖网络；PNG格式提供qr_code_base64，SVG格式提供qr_code_svg，
+        两种格式都提供qr_code_data_uri。二维码参数可通过template_options按模板覆盖，
+        生成结果按链接和参数缓存在内存和磁盘中。
+        """
+        def option(key: str, default: Any) -> Any:
+            return self._get_template_option(template_alias, key, self.config.get(key, default))
+
+        engine = option('qr_engine', 'local')
+        image_format = str(option('qr_format', 'png')).lower()
+
+        if engine != 'remote':
+            error_correction = str(option('qr_error_correction', 'M')).upper()
+            module_size = int(option('qr_module_size', 10))
+            quiet_zone = int(option('qr_quiet_zone', 4))
+            cache_key = QRCodeCache.make_key(link_url, 'local', image_format, error_correction, module_size, quiet_zone)
+            image = await self.qr_cache.get(cache_key)
+            if image is not None:
+                return self._qr_code_fields(image, image_format)
+
+            try:
+                start_time = time.monotonic()
+                image = await self.offload.run(
+                    'qr_code', generate_qr_code, link_url, error_correction, module_size, quiet_zone, image_format
+                )
+                logger.info(f"[AstrBot Plugin HTTP Render Bridge] 本地二维码生成完成({image_format}, {len(image)} bytes)，"
+                            f"耗时 {(time.monotonic() - start_time) * 1000:.1f}ms")
+                await self.qr_cache.put(cache_key, image)
+                return self._qr_code_fields(image, image_format)
+            except Exception as e:
+                logger.error(f"[AstrBot Plugin HTTP Render Bridge] 本地二维码生成失败: {e}")
+                if not option('qr_remote_fallback', False):
+                    return {}
+                logger.info(f"[AstrBot Plugin HTTP Render Bridge] 回退到远程二维码API")
+
+        # 远程API只返回PNG
+        cache_key = QRCodeCache.make_key(link_url, 'remote')
+        image = await self.qr_cache.get(cache_key)
+        if image is None:
+            qr_base64 = await fetch_qr_code_as_base64(link_url, self.http_client.get_session())
+            if not qr_base64:
+                return {}
+            image = base64.b64decode(qr_base64)
+            await self.qr_cache.put(cache_key, image)
+        return self._qr_code_fields(image, 'png')
+
+    @staticmethod
+    def _qr_code_fields(image: bytes, image_format: str) -> Dict[str, str]:
+        """把二维码图片转换为模板字段"""
+        encoded = base64.b64encode(image).decode('utf-8')
+        if image_format == 'svg':
+            return {'qr_code_svg': image.decode('utf-8'), 'qr_code_data_uri': f"data:image/svg+xml;base64,{encoded}"}
+        return {'qr_code_base64': encoded, 'qr_code_data_uri': f"data:image/png;base64,{encoded}"}
+
+    async def _render_template_uncached(self, template_alias: str, template_info: Dict[str, Any],
+                                        data: Dict[str, Any], render_key: str, cache_ttl: float) -> Optional[str]:
+        """实际执行模板渲染，成功后写入渲染结果缓存"""
+        try:
             # 处理二维码生成
             render_data = data.copy()
             
-            # 如果传入了link参数，自动生成二维码
-            if 'link' in data and data['link']:
+            # 如果传入了link参数，自动生成二维码（解析请求体时已经生成的直接使用）
+            if 'link' in data and data['link'] and not any(field in data for field in PLUGIN_PROVIDED_FIELDS):
                 link_url = data['link']
                 logger.info(f"[AstrBot Plugin HTTP Render Bridge] 检测到link参数，生成二维码: {link_url}")
                 
-                qr_base64 = await fetch_qr_code_as_base64(link_url)
-                if qr_base64:
-                    render_data['qr_code_base64'] = qr_base64
+                qr_fields = await self._generate_qr_code(template_alias, link_url)
+                if qr_fields:
+                    render_data.update(qr_fields)
                     # 如果没有提供qr_text，让模板使用自己的默认值
                     # 不在这里设置默认值，让Jinja2模板的default过滤器处理
                     logger.info(f"[AstrBot Plugin HTTP Render Bridge] 二维码生成成功，已添加到渲染数据")
                 else:
                     logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 二维码生成失败，将不显示二维码")
             
-            # 渲染HTML
+            # 只为模板用到的上传图片生成base64，较大的图片在执行器中编码
+            uploads = await self._encode_template_uploads(template_info, render_data)
+            
+            # 渲染HTML（数据较大时在线程中渲染，编译后的模板不能跨进程传递）
             template = template_info['template']
-            html_content = template.render(**render_data)
+            html_content = await self.offload.run(
+                'template_render', template.render, render_data,
+                size=estimate_render_size(render_data), process_safe=False
+            )
+            self.render_memory.record(uploads, len(html_content))
             
-            # 完全按照http_forwarder的方式进行渲染
-            try:
-                logger.info(f"[AstrBot Plugin HTTP Render Bridge] 尝试渲染HTML为图片")
-                image_url = await self.html_render(html_content, data)
-                logger.info(f"[AstrBot Plugin HTTP Render Bridge] html_render返回URL: {image_url}")
-                return image_url
-                
-            except Exception as render_error:
-                logger.error(f"[AstrBot Plugin HTTP Render Bridge] HTML本地渲染失败: {render_error}")
-                # 如果HTML渲染失败，尝试Markdown作为后备方案
+            # 完全按照http_forwarder的方式进行渲染（受渲染调度器并发限制）
+            async with self.render_scheduler.slot():
                 try:
-                    markdown_content = self._html_to_markdown(html_content, data)
-                    image_path = await self.html_render(markdown_content, {}, return_url=False)
-                    logger.info(f"[AstrBot Plugin HTTP Render Bridge] Markdown后备渲染成功: {image_path}")
-                    return image_path
-                except Exception as fallback_error:
-                    logger.error(f"[AstrBot Plugin HTTP Render Bridge] Markdown后备渲染也失败: {fallback_error}")
-                    return None
+                    logger.info(f"[AstrBot Plugin HTTP Render Bridge] 尝试渲染HTML为图片")
+                    image_url = await self.html_render(html_content, self._renderer_data(data))
+                    logger.info(f"[AstrBot Plugin HTTP Render Bridge] html_render返回URL: {image_url}")
+                    if cache_ttl > 0:
+                        await self.render_cache.put(render_key, template_alias, image_url, cache_ttl)
+                    return image_url
+                
+                except Exception as render_error:
+                    logger.error(f"[AstrBot Plugin HTTP Render Bridge] HTML本地渲染失败: {render_error}")
+                    # 如果HTML渲染失败，尝试Markdown作为后备方案
+                    try:
+                        markdown_content = self._html_to_markdown(html_content, data)
+                        image_path = await self.html_render(markdown_content, {}, return_url=False)
+                        logger.info(f"[AstrBot Plugin HTTP Render Bridge] Markdown后备渲染成功: {image_path}")
+                        return image_path
+                    except Exception as fallback_error:
+                        logger.error(f"[AstrBot Plugin HTTP Render Bridge] Markdown后备渲染也失败: {fallback_error}")
+                        return None
             
+        except RenderQueueFull:
+            raise
         except TemplateError as e:
             logger.error(f"[AstrBot Plugin HTTP Render Bridge] 模板渲染错误: {e}")
             return None
@@ -490,6 +2310,28 @@ class HttpRenderBridge(Star):
             logger.error(f"[AstrBot Plugin HTTP Render Bridge] 渲染图片时发生错误: {e}")
             return None
 
+    async def _encode_template_uploads(self, template_info: Dict[str, Any],
+                                       render_data: Dict[str, Any]) -> List[UploadedImage]:
+        """为模板字段定义中出现的上传图片生成base64（没有字段定义时全部生成），返回所有上传图片"""
+        schema = template_info.get('schema')
+        used_fields = set(schema['required']) | set(schema['optional']) if schema else None
+        uploads = []
+        for key, value in render_data.items():
+            if isinstance(value, UploadedImage):
+                uploads.append(value)
+                if used_fields is None or key in used_fields:
+                    await value.encode(self.offload)
+        return uploads
+
+    @staticmethod
+    def _renderer_data(data: Dict[str, Any]) -> Dict[str, Any]:
+        """传给html_render的数据：已编码的上传图片替换为数据URI，模板没有用到的直接去掉"""
+        return {
+            key: value.data_uri() if isinstance(value, UploadedImage) else value
+            for key, value in data.items()
+            if not isinstance(value, UploadedImage) or value.encoded
+        }
+
     def _html_to_markdown(self, html_content: str, data: Dict[str, Any]) -> str:
         """将HTML内容转换为Markdown格式，仅作为HTML渲染失败时的后备方案"""
         # 提取关键数据
@@ -513,60 +2355,99 @@ class HttpRenderBridge(Star):
         
         return markdown
 
-    async def _send_message(self, target_type: str, target_id: str, image_path: str) -> bool:
-        """发送消息到指定目标"""
-        try:
-            # 获取平台实例（参考http_forwarder的做法）
-            platforms = self.context.platform_manager.get_insts()
-            if not platforms:
-                logger.error(f"[AstrBot Plugin HTTP Render Bridge] 没有找到可用的平台实例")
-                return False
-            
-            # 使用第一个可用的平台实例
-            platform_inst = platforms[0]
-            client = platform_inst.get_client()
-            
-            if not client:
-                logger.error(f"[AstrBot Plugin HTTP Render Bridge] 平台客户端不可用")
-                return False
-            
-            # 检查渲染结果
-            if not image_path:
-                logger.error(f"[AstrBot Plugin HTTP Render Bridge] 渲染返回空结果")
-                return False
-            
-            logger.info(f"[AstrBot Plugin HTTP Render Bridge] 准备发送图片: {image_path}")
-            
-            # 如果是本地文件路径，尝试转换为base64数据URI
-            if not image_path.startswith('http') and os.path.exists(image_path):
-                try:
-                    import base64
-                    with open(image_path, 'rb') as f:
-                        image_data = f.read()
-                    base64_data = base64.b64encode(image_data).decode('utf-8')
-                    file_data = f"base64://{base64_data}"
-                    logger.info(f"[AstrBot Plugin HTTP Render Bridge] 转换为base64数据URI，长度: {len(base64_data)}")
-                except Exception as e:
-                    logger.warning(f"[AstrBot Plugin HTTP Render Bridge] base64转换失败，使用原路径: {e}")
-                    file_data = image_path
-            else:
+    async def _send_message(self, target_type: str, target_id: str, image_path: str,
+                            platform: Optional[str] = None) -> Tuple[bool, bool]:
+        """发送消息到指定目标，返回(是否成功, 失败时能否重试)"""
+        message_data = await self._build_image_message(image_path)
+        if not message_data:
+            return False, False
+        return await self._send_direct_message(target_type, target_id, message_data, platform)
+
+    async def _build_image_message(self, image_path: str):
+        """把渲染结果构建为OneBot v11格式的图片消息，多目标发送时只需构建一次"""
+        # 检查渲染结果
+        if not image_path:
+            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 渲染返回空结果")
+            return None
+        
+        logger.info(f"[AstrBot Plugin HTTP Render Bridge] 准备发送图片: {image_path}")
+        
+        # 本地文件转换为file://路径或base64数据
+        if not image_path.startswith('http') and os.path.exists(image_path):
+            try:
+                file_data = await self._image_file_value(image_path)
+            except Exception as e:
+                logger.warning(f"[AstrBot Plugin HTTP Render Bridge] base64转换失败，使用原路径: {e}")
                 file_data = image_path
-            
-            # 构建OneBot v11格式的消息
-            message_data = [{'type': 'image', 'data': {'file': file_data}}]
-            
-            # 根据目标类型发送消息
-            if target_type == 'group':
-                await client.send_group_msg(group_id=int(target_id), message=message_data)
-            else:
-                await client.send_private_msg(user_id=int(target_id), message=message_data)
-            
-            logger.info(f"[AstrBot Plugin HTTP Render Bridge] 成功发送图片到 {target_type}:{target_id}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"[AstrBot Plugin HTTP Render Bridge] 发送消息失败: {e}")
-            return False
+        else:
+            file_data = image_path
+        
+        return [{'type': 'image', 'data': {'file': file_data}}]
+
+    async def _image_file_value(self, image_path: str) -> str:
+        """把本地图片转换为图片消息段的file值
+
+        image_delivery为file时直接使用file://路径，不读取文件；否则在执行器中分块读取并编码为 base64://，
+        结果按文件缓存，并发发送同一个文件时只编码一次。
+        """
+        if self.image_delivery == 'file':
+            return Path(os.path.abspath(image_path)).as_uri()
+        
+        key = ImagePayloadCache.make_key(image_path)
+        payload = self.image_payload_cache.get(key)
+        if payload is not None:
+            return payload
+        
+        async def encode() -> str:
+            base64_data = await self.offload.run('render_base64', read_file_base64, image_path, size=key[1])
+            logger.info(f"[AstrBot Plugin HTTP Render Bridge] 转换为base64数据，长度: {len(base64_data)}")
+            encoded = f"base64://{base64_data}"
+            self.image_payload_cache.put(key, encoded)
+            return encoded
+        
+        return await self.payload_flights.do(repr(key), encode)
+
+    async def _send_to_targets(self, target_type: str, target_ids: List[str], message_content,
+                               platform: Optional[str] = None) -> List[Dict[str, Any]]:
+        """把同一条消息并发发送到多个目标（受send_max_parallel限制），返回每个目标的结果"""
+        semaphore = asyncio.Semaphore(max(1, int(self.config.get('send_max_parallel', 5))))
+        
+        async def send_one(target_id: str) -> Dict[str, Any]:
+            async with semaphore:
+                success, retryable = await self._send_direct_message(target_type, target_id, message_content, platform)
+            return {'target': f"{target_type}:{target_id}", 'success': success, '_retryable': retryable}
+        
+        return list(await asyncio.gather(*(send_one(target_id) for target_id in target_ids)))
+
+    @staticmethod
+    def _fan_out_result(results: List[Dict[str, Any]], label: str, **extra):
+        """汇总多目标发送结果，返回(响应数据, 状态码)"""
+        # 能否重试是内部信息，不出现在每个目标的结果中
+        retry_targets = [item['target'].split(':', 1)[1] for item in results if item.pop('_retryable')]
+        succeeded = sum(1 for item in results if item['success'])
+        if succeeded == len(results):
+            status = 'success'
+        elif succeeded:
+            status = 'partial'
+        else:
+            status = 'error'
+        
+        result = {
+            'status': status,
+            'message': f'{label} sent to {succeeded}/{len(results)} targets'
+        }
+        result.update(extra)
+        result['targets'] = results
+        if succeeded < len(results):
+            # 暂时性失败的目标可以由发件箱重试（内部字段，返回前去掉）
+            result['_retry_targets'] = retry_targets
+        return result, 200 if succeeded else 500
+
+    async def _upload_value(self, value: Any) -> Any:
+        """消息段用到上传图片时才生成数据URI"""
+        if isinstance(value, UploadedImage):
+            return await value.encode(self.offload)
+        return value
 
     async def _build_message_content(self, message_type: str, form_data: Dict[str, Any]):
         """根据消息类型构建消息内容"""
@@ -581,7 +2462,7 @@ class HttpRenderBridge(Star):
             elif message_type == 'image':
                 # 图片消息
                 if 'image' in form_data:
-                    return [{'type': 'image', 'data': {'file': form_data['image']}}]
+                    return [{'type': 'image', 'data': {'file': await self._upload_value(form_data['image'])}}]
                 elif 'url' in form_data:
                     return [{'type': 'image', 'data': {'file': form_data['url']}}]
                 return None
@@ -672,7 +2553,7 @@ class HttpRenderBridge(Star):
                 url = form_data.get('url', '')
                 title = form_data.get('title', '')
                 content = form_data.get('content', form_data.get('description', ''))
-                image = form_data.get('image', '')
+                image = await self._upload_value(form_data.get('image', ''))
                 
                 if not url:
                     return None
@@ -717,7 +2598,7 @@ class HttpRenderBridge(Star):
                 
                 # 添加图片
                 if 'image' in form_data:
-                    message.append({'type': 'image', 'data': {'file': form_data['image']}})
+                    message.append({'type': 'image', 'data': {'file': await self._upload_value(form_data['image'])}})
                 
                 # 添加@用户
                 if 'at' in form_data:
@@ -737,40 +2618,52 @@ class HttpRenderBridge(Star):
             logger.error(f"[AstrBot Plugin HTTP Render Bridge] 构建消息内容失败: {e}")
             return None
 
-    async def _send_direct_message(self, target_type: str, target_id: str, message_content):
-        """发送直接消息"""
+    async def _send_direct_message(self, target_type: str, target_id: str, message_content,
+                                   platform: Optional[str] = None) -> Tuple[bool, bool]:
+        """发送直接消息，platform为空时由平台注册表按负载均衡策略选择适配器，返回(是否成功, 失败时能否重试)
+
+        同一目标的消息在发送调度器中排队按顺序发送，并受目标和账号的令牌桶限速。
+        没有可用的适配器、网络错误和超时可以重试；平台返回了错误码（如群不存在、不是好友）时重试也不会成功。
+        """
         try:
-            # 获取平台实例
-            platforms = self.context.platform_manager.get_insts()
-            if not platforms:
-                logger.error(f"[AstrBot Plugin HTTP Render Bridge] 没有找到可用的平台实例")
-                return False
-            
-            # 使用第一个可用的平台实例
-            platform_inst = platforms[0]
-            client = platform_inst.get_client()
-            
-            if not client:
-                logger.error(f"[AstrBot Plugin HTTP Render Bridge] 平台客户端不可用")
-                return False
-            
-            logger.info(f"[AstrBot Plugin HTTP Render Bridge] 准备发送直接消息: {message_content}")
-            
-            # 根据目标类型发送消息
-            if target_type == 'group':
-                await client.send_group_msg(group_id=int(target_id), message=message_content)
-            else:
-                await client.send_private_msg(user_id=int(target_id), message=message_content)
+            async with self.send_scheduler.lane(f"{target_type}:{target_id}"):
+                adapter = await self.platform_registry.choose(target_type, target_id, platform)
+                if adapter is None:
+                    if platform:
+                        logger.error(f"[AstrBot Plugin HTTP Render Bridge] 指定的平台不可用: {platform}")
+                    else:
+                        logger.error(f"[AstrBot Plugin HTTP Render Bridge] 没有找到可用的平台实例")
+                    return False, True
+                await self.send_scheduler.throttle_account(adapter['id'])
+                
+                # 只记录消息段类型，避免把base64数据写入日志
+                segment_types = [segment.get('type') for segment in message_content]
+                logger.info(f"[AstrBot Plugin HTTP Render Bridge] 准备通过 {adapter['id']} 发送直接消息到 {target_type}:{target_id}: {segment_types}")
+                
+                # 根据目标类型发送消息
+                async with self.platform_registry.sending(adapter) as client:
+                    if target_type == 'group':
+                        await client.send_group_msg(group_id=int(target_id), message=message_content)
+                    else:
+                        await client.send_private_msg(user_id=int(target_id), message=message_content)
             
             logger.info(f"[AstrBot Plugin HTTP Render Bridge] 成功发送直接消息到 {target_type}:{target_id}")
-            return True
+            return True, True
             
         except Exception as e:
             logger.error(f"[AstrBot Plugin HTTP Render Bridge] 发送直接消息失败: {e}")
-            return False
+            # OneBot的ActionFailed带retcode，表示平台已处理并拒绝了这条消息
+            return False, getattr(e, 'retcode', None) is None
 
     async def terminate(self):
         """插件终止时的清理工作"""
+        for task in list(self.background_tasks):
+            task.cancel()
+        # 未完成的发件箱任务保留在数据库中，下次启动时继续
+        if self.outbox is not None:
+            await self.outbox.close()
+        await self.http_client.close()
+        self.offload.shutdown()
         if self.runner:
             await self.runner.cleanup()
             logger.info("[AstrBot Plugin HTTP Render Bridge] HTTP服务器已停止")
\ No newline at end of file
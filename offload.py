@@ -0,0 +1,124 @@
+"""
+CPU密集步骤的执行器
+
+模板渲染、base64编码、图片缩放等步骤在数据较大时转交给线程池或进程池执行，避免阻塞AstrBot的事件循环。
+在进程池中执行的函数及其参数需要能被pickle，函数应定义在不依赖AstrBot的模块中（如image_processing、qr_encoder）。
+"""
+
+import asyncio
+import concurrent.futures
+import multiprocessing
+import time
+from typing import Any, Dict, Optional
+
+
+def call_timed(func, *args):
+    """在执行器中调用func(*args)，返回(开始执行的时间, 结果)；使用time.time()以便在进程池中也能计算排队时间"""
+    return time.time(), func(*args)
+
+
+class OffloadExecutor:
+    """CPU密集步骤的执行器 - 模板渲染、base64编码、图片缩放等步骤超过大小阈值时转交给线程池或进程池，避免阻塞事件循环
+
+    小于阈值的直接在事件循环中执行，省去调度开销；不能跨进程执行的步骤（如Jinja2渲染）即使配置为进程池也使用线程池。
+    按步骤统计内联/转交次数、排队等待时间和执行时间。
+    """
+
+    def __init__(self, mode: str = 'thread', max_workers: int = 4, threshold: int = 64 * 1024):
+        self.mode = mode if mode in ('thread', 'process') else 'thread'
+        self.max_workers = max(1, max_workers)
+        self.threshold = threshold
+        self._thread_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._process_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self.active = 0
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    async def run(self, stage: str, func, *args, size: Optional[int] = None, process_safe: bool = True):
+        """执行func(*args)：size小于阈值时直接调用，否则（包括size为None）转交给执行器
+
+        func和参数需要能被pickle才能在进程池中执行，不能的步骤传入process_safe=False。
+        """
+        stats = self._stage(stage)
+        if size is not None and size < self.threshold:
+            stats['inline'] += 1
+            return func(*args)
+        
+        executor = self._executor(process_safe)
+        submitted_at = time.time()
+        self.active += 1
+        try:
+            started_at, result = await asyncio.get_running_loop().run_in_executor(executor, call_timed, func, *args)
+        except concurrent.futures.BrokenExecutor:
+            # 工作进程异常退出后执行器不可再用，下次调用时重新创建
+            if self._process_pool is executor:
+                self._process_pool = None
+            elif self._thread_pool is executor:
+                self._thread_pool = None
+            stats['errors'] += 1
+            raise
+        except Exception:
+            stats['errors'] += 1
+            raise
+        finally:
+            self.active -= 1
+        
+        wait_time = max(0.0, started_at - submitted_at)
+        run_time = max(0.0, time.time() - started_at)
+        stats['offloaded'] += 1
+        stats['wait_total'] += wait_time
+        stats['wait_max'] = max(stats['wait_max'], wait_time)
+        stats['run_total'] += run_time
+        stats['run_max'] = max(stats['run_max'], run_time)
+        return result
+
+    def _executor(self, process_safe: bool) -> concurrent.futures.Executor:
+        if self.mode == 'process' and process_safe:
+            if self._process_pool is None:
+                # 使用spawn启动工作进程：不继承插件进程的线程、事件循环和监听端口，只导入执行的函数所在的模块
+                self._process_pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._process_pool
+        if self._thread_pool is None:
+            self._thread_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='http_render_bridge'
+            )
+        return self._thread_pool
+
+    def _stage(self, stage: str) -> Dict[str, float]:
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = {
+                'inline': 0, 'offloaded': 0, 'errors': 0,
+                'wait_total': 0.0, 'wait_max': 0.0, 'run_total': 0.0, 'run_max': 0.0
+            }
+        return stats
+
+    def shutdown(self):
+        for pool in (self._thread_pool, self._process_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._thread_pool = None
+        self._process_pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        """执行器统计信息，耗时单位为毫秒"""
+        stages = {}
+        for stage, stats in self.stages.items():
+            offloaded = stats['offloaded']
+            stages[stage] = {
+                'inline': stats['inline'],
+                'offloaded': offloaded,
+                'errors': stats['errors'],
+                'avg_wait_ms': round(stats['wait_total'] / offloaded * 1000, 2) if offloaded else 0.0,
+                'max_wait_ms': round(stats['wait_max'] * 1000, 2),
+                'avg_run_ms': round(stats['run_total'] / offloaded * 1000, 2) if offloaded else 0.0,
+                'max_run_ms': round(stats['run_max'] * 1000, 2)
+            }
+        return {
+            'mode': self.mode,
+            'max_workers': self.max_workers,
+            'threshold_bytes': self.threshold,
+            'active': self.active,
+            'stages': stages
+        }
@@ -0,0 +1,256 @@
+"""
+持久化发件箱
+
+异步任务在确认（返回202）之前写入本地SQLite数据库（WAL模式），同步任务在第一次发送失败后才写入，发送成功后删除；
+插件重启后重新加载未完成的任务继续发送。多次失败的任务移入死信表，可以通过接口重新投递。
+
+写入按批提交：同一时间到达的写操作合并到一个事务中，一次提交后再统一通知等待的调用方。
+所有数据库操作都在同一个专用线程中执行，不阻塞事件循环。这里的代码不依赖AstrBot。
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import random
+import sqlite3
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    targets TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dead_letter (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    targets TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    failed_at REAL NOT NULL
+);
+"""
+
+
+def retry_delay(attempts: int, base: float, max_delay: float) -> float:
+    """第attempts次失败后的重试等待秒数：指数退避，在上限的一半到全部之间随机抖动，避免大量任务同时重试"""
+    delay = min(max_delay, base * (2 ** max(0, attempts - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class Outbox:
+    """SQLite发件箱 - outbox表保存未完成的任务，dead_letter表保存多次失败的任务
+
+    payload为调用方序列化好的JSON文本，targets为尚未发送成功的目标列表（部分成功后只重试剩余的目标）。
+    """
+
+    def __init__(self, path: str, batch_size: int = 200):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='outbox')
+        self._pending: List[tuple] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self.pending_count = 0
+        self.dead_count = 0
+        self.writes = 0
+        self.commits = 0
+        self.write_errors = 0
+
+    async def _call(self, func: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def open(self) -> List[Dict[str, Any]]:
+        """打开数据库并返回所有未完成的任务"""
+        return await self._call(self._open)
+
+    def _open(self) -> List[Dict[str, Any]]:
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # WAL模式下NORMAL在进程崩溃时不会丢失已提交的事务，只有断电时可能丢失最后几个事务
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        rows = [self._row(row) for row in self._conn.execute('SELECT * FROM outbox ORDER BY created_at')]
+        self.pending_count = len(rows)
+        self.dead_count = self._conn.execute('SELECT COUNT(*) FROM dead_letter').fetchone()[0]
+        return rows
+
+    async def close(self):
+        if self._flush_task is not None:
+            await asyncio.shield(self._flush_task)
+        if self._conn is not None:
+            await self._call(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> Dict[str, Any]:
+        item = dict(row)
+        item['targets'] = json.loads(item['targets'])
+        return item
+
+    # 写操作：加入当前批次，提交后返回
+
+    async def _write(self, op: Callable[[sqlite3.Connection], Any]):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((op, future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+        return await future
+
+    async def _flush(self):
+        try:
+            # 让同一轮事件循环中到达的写操作进入同一批
+            await asyncio.sleep(0)
+            while self._pending:
+                batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                try:
+                    results = await self._call(self._write_batch, [op for op, _ in batch])
+                except Exception as e:
+                    results = [e] * len(batch)
+                for (_, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        self.write_errors += 1
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        finally:
+            self._flush_task = None
+
+    def _write_batch(self, ops: List[Callable]) -> List[Any]:
+        """一个事务提交整批写操作；失败时逐个提交，只让出错的操作失败"""
+        try:
+            with self._conn:
+                results = [op(self._conn) for op in ops]
+            self.commits += 1
+            self.writes += len(ops)
+            return results
+        except Exception:
+            results = []
+            for op in ops:
+                try:
+                    with self._conn:
+                        results.append(op(self._conn))
+                    self.commits += 1
+                    self.writes += 1
+                except Exception as e:
+                    results.append(e)
+            return results
+
+    async def add(self, entry_id: str, kind: str, payload: str, targets: List[str], attempts: int = 0,
+                  next_attempt_at: Optional[float] = None, error: Optional[str] = None):
+        """写入新任务，返回时已提交；已经失败过的任务同时记录重试次数、下次重试时间和错误"""
+        now = time.time()
+
+        def op(conn):
+            conn.execute(
+                'INSERT INTO outbox (id, kind, payload, targets, attempts, next_attempt_at, last_error, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (entry_id, kind, payload, json.dumps(targets), attempts,
+                 now if next_attempt_at is None else next_attempt_at, error, now, now)
+            )
+
+        await self._write(op)
+        self.pending_count += 1
+
+    async def reschedule(self, entry_id: str, targets: List[str], attempts: int, next_attempt_at: float, error: str):
+        """记录一次失败，更新剩余目标和下次重试时间"""
+        def op(conn):
+            conn.execute(
+                'UPDATE outbox SET targets = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?',
+                (json.dumps(targets), attempts, next_attempt_at, error, time.time(), entry_id)
+            )
+
+        await self._write(op)
+
+    async def complete(self, entry_id: str):
+        """任务已完成（或不再需要），从发件箱中删除"""
+        def op(conn):
+            return conn.execute('DELETE FROM outbox WHERE id = ?', (entry_id,)).rowcount
+
+        if await self._write(op):
+            self.pending_count -= 1
+
+    async def bury(self, entry_id: str, targets: List[str], attempts: int, error: str):
+        """把任务移入死信表"""
+        def op(conn):
+            moved = conn.execute(
+                'INSERT OR REPLACE INTO dead_letter (id, kind, payload, targets, attempts, last_error, created_at, failed_at) '
+                'SELECT id, kind, payload, ?, ?, ?, created_at, ? FROM outbox WHERE id = ?',
+                (json.dumps(targets), attempts, error, time.time(), entry_id)
+            ).rowcount
+            conn.execute('DELETE FROM outbox WHERE id = ?', (entry_id,))
+            return moved
+
+        if await self._write(op):
+            self.pending_count -= 1
+            self.dead_count += 1
+
+    async def add_dead(self, entry_id: str, kind: str, payload: str, targets: List[str], attempts: int, error: str):
+        """直接写入死信任务（不经过outbox表）"""
+        now = time.time()
+
+        def op(conn):
+            conn.execute(
+                'INSERT OR REPLACE INTO dead_letter (id, kind, payload, targets, attempts, last_error, created_at, failed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (entry_id, kind, payload, json.dumps(targets), attempts, error, now, now)
+            )
+
+        await self._write(op)
+        self.dead_count += 1
+
+    async def replay(self, entry_id: str) -> Optional[Dict[str, Any]]:
+        """把死信任务移回发件箱（重置重试次数），返回任务；不存在时返回None"""
+        def op(conn):
+            row = conn.execute('SELECT * FROM dead_letter WHERE id = ?', (entry_id,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            conn.execute(
+                'INSERT OR REPLACE INTO outbox (id, kind, payload, targets, attempts, next_attempt_at, last_error, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?)',
+                (row['id'], row['kind'], row['payload'], row['targets'], now, row['last_error'], row['created_at'], now)
+            )
+            conn.execute('DELETE FROM dead_letter WHERE id = ?', (entry_id,))
+            return self._row(conn.execute('SELECT * FROM outbox WHERE id = ?', (entry_id,)).fetchone())
+
+        entry = await self._write(op)
+        if entry is not None:
+            self.pending_count += 1
+            self.dead_count -= 1
+        return entry
+
+    async def list_dead(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """列出最近的死信任务（不含payload）"""
+        def query():
+            rows = self._conn.execute(
+                'SELECT id, kind, targets, attempts, last_error, created_at, failed_at FROM dead_letter '
+                'ORDER BY failed_at DESC LIMIT ?', (limit,)
+            )
+            return [self._row(row) for row in rows]
+
+        return await self._call(query)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'path': self.path,
+            'pending': self.pending_count,
+            'dead': self.dead_count,
+            'writes': self.writes,
+            'commits': self.commits,
+            'writes_per_commit': round(self.writes / self.commits, 2) if self.commits else 0.0,
+            'write_errors': self.write_errors
+        }
@@ -0,0 +1,163 @@
+"""
+OneBot平台客户端注册表
+
+从AstrBot的平台管理器中找出能发送OneBot消息的适配器，支持按平台ID/名称指定和多账号负载均衡。
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+from astrbot.api.star import Context
+
+from .scheduling import SingleFlight
+
+
+class PlatformRegistry:
+    """OneBot平台客户端注册表 - 缓存AstrBot平台实例对应的客户端，平台列表变化（增删或重新加载）时重新构建
+
+    发送时可以通过X-Platform指定适配器（平台ID或名称），否则按balance策略选择：first为第一个适配器，
+    round_robin为轮询，least_in_flight为正在发送的消息最少的适配器。轮询和最少发送只在能到达目标
+    （群列表/好友列表中包含目标，结果按membership_ttl缓存）的适配器之间进行。
+    """
+
+    BALANCE_MODES = ('first', 'round_robin', 'least_in_flight')
+
+    def __init__(self, context: Context, balance: str = 'first', membership_ttl: float = 300):
+        self.context = context
+        self.balance = balance if balance in self.BALANCE_MODES else 'first'
+        self.membership_ttl = membership_ttl
+        self.refreshes = 0
+        self._signature: Optional[Tuple[int, ...]] = None
+        self._adapters: List[Dict[str, Any]] = []
+        self._next_index = 0
+        self._membership_flights = SingleFlight()
+
+    def adapters(self) -> List[Dict[str, Any]]:
+        """返回可以发送OneBot消息的适配器，平台实例没有变化时直接使用缓存"""
+        platforms = self.context.platform_manager.get_insts()
+        signature = tuple(id(platform) for platform in platforms)
+        if signature != self._signature:
+            self._adapters = self._build_adapters(platforms)
+            self._signature = signature
+            self.refreshes += 1
+            logger.info(f"[AstrBot Plugin HTTP Render Bridge] 平台列表已更新，可用适配器: "
+                        f"{[adapter['id'] for adapter in self._adapters]}")
+        return self._adapters
+
+    def _build_adapters(self, platforms) -> List[Dict[str, Any]]:
+        previous = {adapter['id']: adapter for adapter in self._adapters}
+        adapters = []
+        for platform_inst in platforms:
+            try:
+                client = platform_inst.get_client()
+                platform_meta = platform_inst.meta()
+            except Exception as e:
+                logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 读取平台实例失败: {e}")
+                continue
+            # 只保留能发送OneBot消息的客户端
+            if client is None or not hasattr(client, 'send_group_msg'):
+                continue
+            name = str(getattr(platform_meta, 'name', '') or '')
+            adapter_id = str(getattr(platform_meta, 'id', '') or name or len(adapters))
+            adapter = {
+                'id': adapter_id,
+                'name': name,
+                'client': client,
+                'in_flight': 0,
+                'sent': 0,
+                'failed': 0,
+                'membership': {}
+            }
+            # 同一适配器重新加载后保留累计统计（in_flight由仍在发送的旧条目自行递减）
+            old_adapter = previous.get(adapter_id)
+            if old_adapter is not None:
+                adapter.update({key: old_adapter[key] for key in ('sent', 'failed')})
+                if old_adapter['client'] is client:
+                    adapter['membership'] = old_adapter['membership']
+            adapters.append(adapter)
+        return adapters
+
+    def find(self, platform: str) -> Optional[Dict[str, Any]]:
+        """按平台ID（优先）或名称查找适配器"""
+        adapters = self.adapters()
+        for adapter in adapters:
+            if adapter['id'] == platform:
+                return adapter
+        for adapter in adapters:
+            if adapter['name'] == platform:
+                return adapter
+        return None
+
+    async def choose(self, target_type: str, target_id: str, platform: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """选择发送消息使用的适配器，没有可用适配器时返回None"""
+        if platform:
+            return self.find(platform)
+        
+        adapters = self.adapters()
+        if not adapters:
+            return None
+        if self.balance == 'first' or len(adapters) == 1:
+            return adapters[0]
+        
+        # 优先选择确认能到达目标的适配器，其次是无法确认的，都没有时在全部适配器中选择
+        reachable = await asyncio.gather(*(self._can_reach(adapter, target_type, target_id) for adapter in adapters))
+        candidates = [adapter for adapter, result in zip(adapters, reachable) if result is True]
+        if not candidates:
+            candidates = [adapter for adapter, result in zip(adapters, reachable) if result is None] or adapters
+        
+        if self.balance == 'round_robin':
+            adapter = candidates[self._next_index % len(candidates)]
+            self._next_index += 1
+            return adapter
+        return min(candidates, key=lambda adapter: (adapter['in_flight'], adapter['sent']))
+
+    async def _can_reach(self, adapter: Dict[str, Any], target_type: str, target_id: str) -> Optional[bool]:
+        """目标是否在适配器的群列表/好友列表中，无法获取列表时返回None"""
+        cached = adapter['membership'].get(target_type)
+        if cached is not None and cached[1] > time.monotonic():
+            members = cached[0]
+        else:
+            members = await self._membership_flights.do(
+                f"{adapter['id']}:{target_type}", lambda: self._fetch_membership(adapter, target_type)
+            )
+        if members is None:
+            return None
+        return str(target_id) in members
+
+    async def _fetch_membership(self, adapter: Dict[str, Any], target_type: str) -> Optional[set]:
+        action, key = ('get_group_list', 'group_id') if target_type == 'group' else ('get_friend_list', 'user_id')
+        try:
+            items = await asyncio.wait_for(getattr(adapter['client'], action)(), timeout=5)
+            members = {str(item.get(key)) for item in items or [] if isinstance(item, dict)}
+        except Exception as e:
+            logger.warning(f"[AstrBot Plugin HTTP Render Bridge] 获取适配器 {adapter['id']} 的{action}失败: {e}")
+            members = None
+        # 获取失败也缓存，避免每次发送都重试
+        adapter['membership'][target_type] = (members, time.monotonic() + self.membership_ttl)
+        return members
+
+    @asynccontextmanager
+    async def sending(self, adapter: Dict[str, Any]):
+        """发送期间计入适配器的in_flight，并统计成功和失败次数"""
+        adapter['in_flight'] += 1
+        try:
+            yield adapter['client']
+            adapter['sent'] += 1
+        except Exception:
+            adapter['failed'] += 1
+            raise
+        finally:
+            adapter['in_flight'] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'balance': self.balance,
+            'refreshes': self.refreshes,
+            'adapters': [
+                {key: adapter[key] for key in ('id', 'name', 'in_flight', 'sent', 'failed')}
+                for adapter in self._adapters
+            ]
+        }
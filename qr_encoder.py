@@ -0,0 +1,450 @@
+"""
+纯Python实现的二维码编码器
+
+支持字节模式、版本1-40、L/M/Q/H四种纠错等级，输出PNG或SVG，不依赖任何第三方库和网络服务。
+"""
+
+import re
+import struct
+import zlib
+from typing import List, Optional, Tuple
+
+# 纠错等级 -> (表格下标, 格式信息中的编码)
+ERROR_CORRECTION_LEVELS = {
+    'L': (0, 1),
+    'M': (1, 0),
+    'Q': (2, 3),
+    'H': (3, 2),
+}
+
+# 每个纠错块的纠错码字数，按纠错等级和版本索引（下标0无意义）
+ECC_CODEWORDS_PER_BLOCK = (
+    (-1, 7, 10, 15, 20, 26, 18, 20, 24, 30, 18, 20, 24, 26, 30, 22, 24, 28, 30, 28, 28, 28, 28, 30, 30, 26, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+    (-1, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26, 30, 22, 22, 24, 24, 28, 28, 26, 26, 26, 26, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28),
+    (-1, 13, 22, 18, 26, 18, 24, 18, 22, 20, 24, 28, 26, 24, 20, 30, 24, 28, 28, 26, 30, 28, 30, 30, 30, 30, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+    (-1, 17, 28, 22, 16, 22, 28, 26, 26, 24, 28, 24, 28, 22, 24, 24, 30, 28, 28, 26, 28, 30, 24, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+)
+
+# 纠错块数量，按纠错等级和版本索引（下标0无意义）
+NUM_ERROR_CORRECTION_BLOCKS = (
+    (-1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 4, 4, 4, 4, 4, 6, 6, 6, 6, 7, 8, 8, 9, 9, 10, 12, 12, 12, 13, 14, 15, 16, 17, 18, 19, 19, 20, 21, 22, 24, 25),
+    (-1, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5, 5, 8, 9, 9, 10, 10, 11, 13, 14, 16, 17, 17, 18, 20, 21, 23, 25, 26, 28, 29, 31, 33, 35, 37, 38, 40, 43, 45, 47, 49),
+    (-1, 1, 1, 2, 2, 4, 4, 6, 6, 8, 8, 8, 10, 12, 16, 12, 17, 16, 18, 21, 20, 23, 23, 25, 27, 29, 34, 34, 35, 38, 40, 43, 45, 48, 51, 53, 56, 59, 62, 65, 68),
+    (-1, 1, 1, 2, 4, 4, 4, 5, 6, 8, 8, 11, 11, 16, 16, 18, 16, 19, 21, 25, 25, 25, 34, 30, 32, 35, 37, 40, 42, 45, 48, 51, 54, 57, 60, 63, 66, 70, 74, 77, 81),
+)
+
+# 掩码条件，参数为(x, y)
+MASK_PATTERNS = (
+    lambda x, y: (x + y) % 2 == 0,
+    lambda x, y: y % 2 == 0,
+    lambda x, y: x % 3 == 0,
+    lambda x, y: (x + y) % 3 == 0,
+    lambda x, y: (x // 3 + y // 2) % 2 == 0,
+    lambda x, y: x * y % 2 + x * y % 3 == 0,
+    lambda x, y: (x * y % 2 + x * y % 3) % 2 == 0,
+    lambda x, y: ((x + y) % 2 + x * y % 3) % 2 == 0,
+)
+
+# 掩码评分规则中的类定位图形（1:1:3:1:1，一侧带4个浅色模块）
+_FINDER_LIKE_PATTERNS = ('10111010000', '00001011101')
+_LONG_RUN = re.compile(r'0{5,}|1{5,}')
+
+# GF(256) 指数表和对数表（本原多项式 0x11D）
+_GF_EXP = [0] * 512
+_GF_LOG = [0] * 256
+_value = 1
+for _i in range(255):
+    _GF_EXP[_i] = _value
+    _GF_LOG[_value] = _i
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11D
+for _i in range(255, 512):
+    _GF_EXP[_i] = _GF_EXP[_i - 255]
+del _value, _i
+
+_DIVISOR_CACHE = {}
+_MASK_ROWS_CACHE = {}
+
+
+def _gf_multiply(x: int, y: int) -> int:
+    if x == 0 or y == 0:
+        return 0
+    return _GF_EXP[_GF_LOG[x] + _GF_LOG[y]]
+
+
+def _reed_solomon_divisor(degree: int) -> List[int]:
+    """生成指定次数的Reed-Solomon生成多项式（不含最高次项的系数）"""
+    divisor = _DIVISOR_CACHE.get(degree)
+    if divisor is not None:
+        return divisor
+
+    divisor = [0] * (degree - 1) + [1]
+    root = 1
+    for _ in range(degree):
+        for j in range(degree):
+            divisor[j] = _gf_multiply(divisor[j], root)
+            if j + 1 < degree:
+                divisor[j] ^= divisor[j + 1]
+        root = _gf_multiply(root, 0x02)
+    _DIVISOR_CACHE[degree] = divisor
+    return divisor
+
+
+def _reed_solomon_remainder(data: List[int], divisor: List[int]) -> List[int]:
+    """计算数据码字的纠错码字"""
+    result = [0] * len(divisor)
+    for byte in data:
+        factor = byte ^ result.pop(0)
+        result.append(0)
+        if factor:
+            log_factor = _GF_LOG[factor]
+            for i, coefficient in enumerate(divisor):
+                if coefficient:
+                    result[i] ^= _GF_EXP[_GF_LOG[coefficient] + log_factor]
+    return result
+
+
+def _num_raw_data_modules(version: int) -> int:
+    """指定版本中除功能图形外可用于存放数据的模块数"""
+    result = (16 * version + 128) * version + 64
+    if version >= 2:
+        num_align = version // 7 + 2
+        result -= (25 * num_align - 10) * num_align - 55
+        if version >= 7:
+            result -= 36
+    return result
+
+
+def _num_data_codewords(version: int, ecc_index: int) -> int:
+    return (_num_raw_data_modules(version) // 8
+            - ECC_CODEWORDS_PER_BLOCK[ecc_index][version] * NUM_ERROR_CORRECTION_BLOCKS[ecc_index][version])
+
+
+def _alignment_pattern_positions(version: int) -> List[int]:
+    if version == 1:
+        return []
+    num_align = version // 7 + 2
+    step = 26 if version == 32 else (version * 4 + num_align * 2 + 1) // (num_align * 2 - 2) * 2
+    positions = [version * 4 + 17 - 7 - i * step for i in range(num_align - 1)] + [6]
+    return list(reversed(positions))
+
+
+class _QRMatrix:
+    """二维码模块矩阵，负责绘制功能图形、放置数据和掩码"""
+
+    def __init__(self, version: int, ecc_format_bits: int):
+        self.version = version
+        self.size = version * 4 + 17
+        self.ecc_format_bits = ecc_format_bits
+        self.modules = [[False] * self.size for _ in range(self.size)]
+        self.is_function = [[False] * self.size for _ in range(self.size)]
+        self._draw_function_patterns()
+
+    def _set_function_module(self, x: int, y: int, is_dark: bool):
+        self.modules[y][x] = is_dark
+        self.is_function[y][x] = True
+
+    def _draw_function_patterns(self):
+        size = self.size
+        # 定时图形
+        for i in range(size):
+            self._set_function_module(6, i, i % 2 == 0)
+            self._set_function_module(i, 6, i % 2 == 0)
+
+        # 三个定位图形（含分隔符）
+        for cx, cy in ((3, 3), (size - 4, 3), (3, size - 4)):
+            for dy in range(-4, 5):
+                for dx in range(-4, 5):
+                    x, y = cx + dx, cy + dy
+                    if 0 <= x < size and 0 <= y < size:
+                        self._set_function_module(x, y, max(abs(dx), abs(dy)) not in (2, 4))
+
+        # 校正图形（避开三个定位图形所在的角）
+        positions = _alignment_pattern_positions(self.version)
+        count = len(positions)
+        for i in range(count):
+            for j in range(count):
+                if (i, j) in ((0, 0), (0, count - 1), (count - 1, 0)):
+                    continue
+                for dy in range(-2, 3):
+                    for dx in range(-2, 3):
+                        self._set_function_module(positions[i] + dx, positions[j] + dy, max(abs(dx), abs(dy)) != 1)
+
+        # 先占位格式信息，选定掩码后再写入真实值
+        self.draw_format_bits(0)
+        self._draw_version()
+
+    def format_bit_positions(self) -> List[Tuple[int, int, int]]:
+        """格式信息两份拷贝中每一位的位置，返回(位序号, x, y)"""
+        size = self.size
+        positions = [(i, 8, i) for i in range(0, 6)]
+        positions += [(6, 8, 7), (7, 8, 8), (8, 7, 8)]
+        positions += [(i, 14 - i, 8) for i in range(9, 15)]
+        positions += [(i, size - 1 - i, 8) for i in range(0, 8)]
+        positions += [(i, 8, size - 15 + i) for i in range(8, 15)]
+        return positions
+
+    def draw_format_bits(self, mask: int):
+        bits = _format_bits(self.ecc_format_bits, mask)
+        for i, x, y in self.format_bit_positions():
+            self._set_function_module(x, y, (bits >> i) & 1 != 0)
+        self._set_function_module(8, self.size - 8, True)
+
+    def _draw_version(self):
+        if self.version < 7:
+            return
+        remainder = self.version
+        for _ in range(12):
+            remainder = (remainder << 1) ^ ((remainder >> 11) * 0x1F25)
+        bits = self.version << 12 | remainder
+        for i in range(18):
+            is_dark = (bits >> i) & 1 != 0
+            a = self.size - 11 + i % 3
+            b = i // 3
+            self._set_function_module(a, b, is_dark)
+            self._set_function_module(b, a, is_dark)
+
+    def draw_codewords(self, codewords: List[int]):
+        """按照之字形顺序放置数据码字"""
+        size = self.size
+        total_bits = len(codewords) * 8
+        i = 0
+        right = size - 1
+        while right >= 1:
+            if right == 6:
+                right = 5
+            upward = (right + 1) & 2 == 0
+            for vertical in range(size):
+                y = size - 1 - vertical if upward else vertical
+                for j in range(2):
+                    x = right - j
+                    if not self.is_function[y][x] and i < total_bits:
+                        self.modules[y][x] = (codewords[i >> 3] >> (7 - (i & 7))) & 1 != 0
+                        i += 1
+            right -= 2
+
+    def apply_mask(self, mask: int):
+        """应用掩码（再次应用同一个掩码即可撤销）"""
+        condition = MASK_PATTERNS[mask]
+        for y in range(self.size):
+            row = self.modules[y]
+            function_row = self.is_function[y]
+            for x in range(self.size):
+                if not function_row[x] and condition(x, y):
+                    row[x] = not row[x]
+
+    def mask_rows(self, mask: int) -> List[int]:
+        """掩码在每一行上翻转的位（最高位为x=0），只和版本有关，按版本缓存"""
+        key = (self.version, mask)
+        rows = _MASK_ROWS_CACHE.get(key)
+        if rows is None:
+            condition = MASK_PATTERNS[mask]
+            rows = [
+                int(''.join('1' if not function_row[x] and condition(x, y) else '0' for x in range(self.size)), 2)
+                for y, function_row in enumerate(self.is_function)
+            ]
+            _MASK_ROWS_CACHE[key] = rows
+        return rows
+
+    def choose_mask(self) -> int:
+        """在整数位图上试用8种掩码，返回评分最低的掩码"""
+        size = self.size
+        base = [int(''.join('1' if dark else '0' for dark in row), 2) for row in self.modules]
+        positions = self.format_bit_positions()
+        best_mask, best_score = 0, None
+        for candidate in range(8):
+            rows = [row ^ flip for row, flip in zip(base, self.mask_rows(candidate))]
+            bits = _format_bits(self.ecc_format_bits, candidate)
+            for i, x, y in positions:
+                if (bits >> i) & 1:
+                    rows[y] |= 1 << (size - 1 - x)
+                else:
+                    rows[y] &= ~(1 << (size - 1 - x))
+            score = _penalty_score(rows, size)
+            if best_score is None or score < best_score:
+                best_mask, best_score = candidate, score
+        return best_mask
+
+
+def _format_bits(ecc_format_bits: int, mask: int) -> int:
+    """15位格式信息（纠错等级+掩码，BCH编码后异或0x5412）"""
+    data = ecc_format_bits << 3 | mask
+    remainder = data
+    for _ in range(10):
+        remainder = (remainder << 1) ^ ((remainder >> 9) * 0x537)
+    return (data << 10 | remainder) ^ 0x5412
+
+
+def _penalty_score(rows: List[int], size: int) -> int:
+    """按照标准的四条规则计算掩码评分，分数越低越好；rows为每行的整数位图"""
+    row_strings = [format(row, f'0{size}b') for row in rows]
+    column_strings = [''.join(column) for column in zip(*row_strings)]
+    score = 0
+
+    for line in row_strings + column_strings:
+        # 规则1：同色连续5个及以上的模块
+        for match in _LONG_RUN.finditer(line):
+            score += len(match.group()) - 2
+        # 规则3：类似定位图形的图案
+        for pattern in _FINDER_LIKE_PATTERNS:
+            start = line.find(pattern)
+            while start != -1:
+                score += 40
+                start = line.find(pattern, start + 1)
+
+    # 规则2：2x2的同色块（相邻两位相同且上下两行相同）
+    low_bits = (1 << (size - 1)) - 1
+    for upper, lower in zip(rows, rows[1:]):
+        same = ~(upper ^ lower)
+        score += 3 * bin(same & (same >> 1) & ~(upper ^ (upper >> 1)) & low_bits).count('1')
+
+    # 规则4：深色模块比例偏离50%
+    dark = sum(bin(row).count('1') for row in rows)
+    total = size * size
+    k = (abs(dark * 20 - total * 10) + total - 1) // total - 1
+    score += k * 10
+    return score
+
+
+def encode_qr_matrix(data, error_correction: str = 'M', mask: Optional[int] = None) -> List[List[bool]]:
+    """把文本或字节编码为二维码模块矩阵（True表示深色模块）
+
+    使用字节模式，自动选择能容纳数据的最小版本；未指定掩码时按评分选择最优掩码。
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    level = ERROR_CORRECTION_LEVELS.get(str(error_correction).upper())
+    if level is None:
+        raise ValueError(f"Unknown error correction level: {error_correction}")
+    ecc_index, ecc_format_bits = level
+
+    # 选择最小的可用版本
+    for version in range(1, 41):
+        count_bits = 8 if version <= 9 else 16
+        capacity_bits = _num_data_codewords(version, ecc_index) * 8
+        if len(data) < (1 << count_bits) and 4 + count_bits + len(data) * 8 <= capacity_bits:
+            break
+    else:
+        raise ValueError(f"Data too long for a QR code: {len(data)} bytes")
+
+    # 模式指示符 + 字符计数 + 数据
+    bits = [0, 1, 0, 0]
+    bits.extend((len(data) >> i) & 1 for i in range(count_bits - 1, -1, -1))
+    for byte in data:
+        bits.extend((byte >> i) & 1 for i in range(7, -1, -1))
+
+    # 终止符、字节对齐和填充字节
+    bits.extend([0] * min(4, capacity_bits - len(bits)))
+    bits.extend([0] * (-len(bits) % 8))
+    codewords = [int(''.join(map(str, bits[i:i + 8])), 2) for i in range(0, len(bits), 8)]
+    pad_byte = 0xEC
+    while len(codewords) < capacity_bits // 8:
+        codewords.append(pad_byte)
+        pad_byte ^= 0xEC ^ 0x11
+
+    matrix = _QRMatrix(version, ecc_format_bits)
+    matrix.draw_codewords(_add_ecc_and_interleave(codewords, version, ecc_index))
+
+    if mask is None:
+        mask = matrix.choose_mask()
+    matrix.apply_mask(mask)
+    matrix.draw_format_bits(mask)
+    return matrix.modules
+
+
+def _add_ecc_and_interleave(data: List[int], version: int, ecc_index: int) -> List[int]:
+    """分块计算纠错码字并交错排列"""
+    num_blocks = NUM_ERROR_CORRECTION_BLOCKS[ecc_index][version]
+    block_ecc_len = ECC_CODEWORDS_PER_BLOCK[ecc_index][version]
+    raw_codewords = _num_raw_data_modules(version) // 8
+    num_short_blocks = num_blocks - raw_codewords % num_blocks
+    short_block_len = raw_codewords // num_blocks
+    divisor = _reed_solomon_divisor(block_ecc_len)
+
+    blocks = []
+    offset = 0
+    for i in range(num_blocks):
+        data_len = short_block_len - block_ecc_len + (0 if i < num_short_blocks else 1)
+        block = data[offset:offset + data_len]
+        offset += data_len
+        ecc = _reed_solomon_remainder(block, divisor)
+        if i < num_short_blocks:
+            block.append(0)
+        blocks.append(block + ecc)
+
+    result = []
+    for i in range(len(blocks[0])):
+        for j, block in enumerate(blocks):
+            # 短块在数据部分末尾的占位字节不输出
+            if i != short_block_len - block_ecc_len or j >= num_short_blocks:
+                result.append(block[i])
+    return result
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+
+
+def render_qr_png(matrix: List[List[bool]], module_size: int = 10, quiet_zone: int = 4) -> bytes:
+    """把模块矩阵输出为1位灰度PNG"""
+    module_size = max(1, int(module_size))
+    quiet_zone = max(0, int(quiet_zone))
+    count = len(matrix) + quiet_zone * 2
+    width = count * module_size
+    row_bytes = (width + 7) // 8
+
+    def encode_row(modules_row: Tuple[bool, ...]) -> bytes:
+        # 1位灰度：0为黑，1为白；每行以过滤类型0开头
+        pixels = ''.join(('0' if dark else '1') * module_size for dark in modules_row)
+        return b'\x00' + int(pixels.ljust(row_bytes * 8, '0'), 2).to_bytes(row_bytes, 'big')
+
+    blank = (False,) * quiet_zone
+    quiet_row = encode_row((False,) * count)
+    raw = bytearray()
+    raw += quiet_row * (quiet_zone * module_size)
+    for row in matrix:
+        raw += encode_row(blank + tuple(row) + blank) * module_size
+    raw += quiet_row * (quiet_zone * module_size)
+
+    header = struct.pack('>IIBBBBB', width, width, 1, 0, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n'
+            + _png_chunk(b'IHDR', header)
+            + _png_chunk(b'IDAT', zlib.compress(bytes(raw), 6))
+            + _png_chunk(b'IEND', b''))
+
+
+def render_qr_svg(matrix: List[List[bool]], module_size: int = 10, quiet_zone: int = 4) -> str:
+    """把模块矩阵输出为SVG（同一行相邻的深色模块合并为一段路径）"""
+    module_size = max(1, int(module_size))
+    quiet_zone = max(0, int(quiet_zone))
+    count = len(matrix) + quiet_zone * 2
+    pixel_size = count * module_size
+
+    path_parts = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if row[x]:
+                start = x
+                while x < len(row) and row[x]:
+                    x += 1
+                path_parts.append(f"M{start + quiet_zone} {y + quiet_zone}h{x - start}v1h-{x - start}z")
+            else:
+                x += 1
+
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {count} {count}" '
+            f'width="{pixel_size}" height="{pixel_size}" shape-rendering="crispEdges">'
+            f'<rect width="{count}" height="{count}" fill="#fff"/>'
+            f'<path d="{"".join(path_parts)}" fill="#000"/></svg>')
+
+
+def generate_qr_code(data, error_correction: str = 'M', module_size: int = 10,
+                     quiet_zone: int = 4, image_format: str = 'png') -> bytes:
+    """生成二维码图片，image_format为png时返回PNG字节，为svg时返回UTF-8编码的SVG"""
+    matrix = encode_qr_matrix(data, error_correction)
+    if image_format == 'svg':
+        return render_qr_svg(matrix, module_size, quiet_zone).encode('utf-8')
+    if image_format != 'png':
+        raise ValueError(f"Unknown QR image format: {image_format}")
+    return render_qr_png(matrix, module_size, quiet_zone)
@@ -0,0 +1,90 @@
+"""
+JSON / MessagePack 请求体解析
+
+作为multipart/form-data之外的请求格式：顶层必须是对象，字段值可以是字符串、数字、列表或嵌套对象。
+文件字段写作 {"filename": "a.png", "base64": "..."}（base64也可以是data URI），
+MessagePack中还可以写作 {"filename": "a.png", "data": <bin>} 或直接使用bin类型（文件名即字段名）。
+
+msgpack为可选依赖，未安装时只支持JSON。这里的函数不依赖AstrBot，可以在线程中执行。
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+from typing import Any, Dict, List, Tuple
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_AVAILABLE = msgpack is not None
+
+JSON_CONTENT_TYPES = ('application/json',)
+MSGPACK_CONTENT_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+
+class BodyFormatError(ValueError):
+    """请求体格式错误"""
+
+
+def is_file_value(value: Any) -> bool:
+    """判断字段值是否为文件：bin数据，或带filename和base64/data的对象"""
+    if isinstance(value, (bytes, bytearray)):
+        return True
+    return isinstance(value, dict) and 'filename' in value and ('base64' in value or 'data' in value)
+
+
+def decode_file_value(name: str, value: Any) -> Tuple[str, bytes]:
+    """把文件字段解码为(文件名, 数据)"""
+    if isinstance(value, (bytes, bytearray)):
+        return name, bytes(value)
+
+    data = value.get('data')
+    if isinstance(data, (bytes, bytearray)):
+        return str(value['filename']), bytes(data)
+
+    encoded = value.get('base64', data)
+    if not isinstance(encoded, str):
+        raise BodyFormatError(f"File field '{name}' must contain base64 text or binary data")
+    if encoded.startswith('data:'):
+        encoded = encoded.split(',', 1)[-1]
+    try:
+        return str(value['filename']), base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError):
+        raise BodyFormatError(f"File field '{name}' contains invalid base64 data")
+
+
+def parse_structured_body(body: bytes, content_type: str) -> Tuple[Dict[str, Any], List[Tuple[str, str, bytes]]]:
+    """解析JSON/MessagePack请求体，返回(普通字段, 文件字段列表[(字段名, 文件名, 数据)])"""
+    try:
+        if content_type in MSGPACK_CONTENT_TYPES:
+            if not MSGPACK_AVAILABLE:
+                raise BodyFormatError('MessagePack support requires the msgpack package')
+            payload = msgpack.unpackb(body, raw=False)
+        else:
+            payload = json.loads(body)
+    except BodyFormatError:
+        raise
+    except Exception as e:
+        raise BodyFormatError(f"Invalid request body: {e}")
+
+    if not isinstance(payload, dict):
+        raise BodyFormatError('Request body must be an object')
+
+    fields: Dict[str, Any] = {}
+    files: List[Tuple[str, str, bytes]] = []
+    for name, value in payload.items():
+        name = str(name)
+        if is_file_value(value):
+            filename, data = decode_file_value(name, value)
+            files.append((name, filename, data))
+        else:
+            fields[name] = value
+    return fields, files
+
+
+def body_digest(body: bytes) -> str:
+    """请求体的SHA-256摘要，用于比较带同一个Idempotency-Key的请求内容是否相同"""
+    return hashlib.sha256(body).hexdigest()
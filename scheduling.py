@@ -0,0 +1,268 @@
+"""
+请求合并、渲染调度和发送限速
+
+SingleFlight合并相同的并发调用，RenderScheduler限制同时进行的渲染数量，SendScheduler按目标排队并用令牌桶限速。
+这里的代码不依赖AstrBot。
+"""
+
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+
+class SingleFlight:
+    """合并相同键的并发调用 - 同一时间只执行一次，其余调用等待并共享其结果"""
+
+    def __init__(self):
+        self.calls: Dict[str, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, func):
+        """执行func()，如果相同键的调用正在进行则直接等待它的结果"""
+        future = self.calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        
+        future = asyncio.ensure_future(func())
+        self.calls[key] = future
+        self.executed += 1
+        future.add_done_callback(lambda f: self._finish(key, f))
+        # shield: 某个调用方被取消（如客户端断开）不影响其他等待者
+        return await asyncio.shield(future)
+
+    def _finish(self, key: str, future: asyncio.Future):
+        if self.calls.get(key) is future:
+            del self.calls[key]
+        if not future.cancelled():
+            # 标记异常已被获取，避免所有调用方都取消时产生警告
+            future.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """统计信息"""
+        return {
+            'in_flight': len(self.calls),
+            'executed': self.executed,
+            'coalesced': self.coalesced
+        }
+
+
+class RenderQueueFull(Exception):
+    """渲染队列已满"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"render queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class RenderScheduler:
+    """渲染调度器 - 限制同时进行的html_render数量，超出队列上限的请求直接拒绝"""
+
+    def __init__(self, max_workers: int = 3, max_queue: int = 50):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._semaphore = asyncio.Semaphore(self.max_workers)
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        # 渲染耗时和排队耗时的指数移动平均值（秒）
+        self.avg_render_time = 1.0
+        self.avg_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def is_full(self) -> bool:
+        """所有工作槽都在使用并且队列已满"""
+        return self.active >= self.max_workers and self.waiting >= self.max_queue
+
+    def retry_after(self) -> int:
+        """根据当前积压和观测到的渲染耗时估算重试等待秒数"""
+        backlog = self.active + self.waiting
+        return max(1, math.ceil(backlog / self.max_workers * self.avg_render_time))
+
+    def reject(self) -> int:
+        """记录一次拒绝并返回建议的重试等待秒数"""
+        self.rejected += 1
+        return self.retry_after()
+
+    @asynccontextmanager
+    async def slot(self):
+        """获取一个渲染工作槽，队列已满时抛出RenderQueueFull"""
+        if self.is_full():
+            raise RenderQueueFull(self.reject())
+        
+        self.waiting += 1
+        enqueued_at = time.monotonic()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        
+        wait_time = time.monotonic() - enqueued_at
+        self.avg_wait_time = self.avg_wait_time * 0.8 + wait_time * 0.2
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        
+        self.active += 1
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            render_time = time.monotonic() - started_at
+            if self.completed == 0:
+                self.avg_render_time = render_time
+            else:
+                self.avg_render_time = self.avg_render_time * 0.8 + render_time * 0.2
+            self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """调度器统计信息"""
+        return {
+            'active_workers': self.active,
+            'max_workers': self.max_workers,
+            'queue_depth': self.waiting,
+            'max_queue': self.max_queue,
+            'avg_wait_ms': round(self.avg_wait_time * 1000, 1),
+            'max_wait_ms': round(self.max_wait_time * 1000, 1),
+            'avg_render_ms': round(self.avg_render_time * 1000, 1),
+            'completed': self.completed,
+            'rejected': self.rejected
+        }
+
+
+class TokenBucket:
+    """令牌桶 - 预约式取令牌：立即扣除，令牌不足时返回需要等待的秒数（rate为0时不限速）"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = max(0.0, rate)
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill(time.monotonic())
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self):
+        """退还一个预约的令牌（等待中的请求被取消时调用）"""
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+    def is_full(self) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
+
+
+class SendScheduler:
+    """发送调度器 - 每个目标一个有序队列和令牌桶，每个平台账号一个全局令牌桶
+
+    同一目标的消息按进入队列的顺序逐条发送，不同目标之间并行；发送前先等待目标的令牌桶，
+    再等待所用账号的令牌桶，避免短时间内大量发送触发QQ风控。
+    速率为0时对应的限速不启用：target_rate为0时消息不进入目标队列，直接发送。
+    """
+
+    def __init__(self, target_rate: float = 0.0, target_burst: float = 5,
+                 account_rate: float = 0.0, account_burst: float = 10):
+        self.target_rate = target_rate
+        self.target_burst = target_burst
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self.lanes: Dict[str, Dict[str, Any]] = {}
+        self.accounts: Dict[str, Dict[str, Any]] = {}
+        self.throttled = 0
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+
+    def _lane(self, target: str) -> Dict[str, Any]:
+        lane = self.lanes.get(target)
+        if lane is None:
+            # 新建队列时清理空闲且令牌已补满的队列，它们的状态与新建的相同
+            for key in [key for key, item in self.lanes.items() if item['queued'] == 0 and item['bucket'].is_full()]:
+                del self.lanes[key]
+            lane = {
+                'lock': asyncio.Lock(),
+                'bucket': TokenBucket(self.target_rate, self.target_burst),
+                'queued': 0,
+                'throttled': 0
+            }
+            self.lanes[target] = lane
+        return lane
+
+    async def _wait(self, bucket: TokenBucket, stats: Dict[str, Any]) -> float:
+        delay = bucket.reserve()
+        if delay > 0:
+            stats['throttled'] += 1
+            self.throttled += 1
+            self.total_delay += delay
+            self.max_delay = max(self.max_delay, delay)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                # 没有发送的消息不占用令牌
+                bucket.refund()
+                raise
+        return delay
+
+    @asynccontextmanager
+    async def lane(self, target: str):
+        """进入目标的发送队列，轮到本条消息且目标令牌桶允许时返回（未启用目标限速时直接返回）"""
+        if self.target_rate <= 0:
+            yield
+            return
+        lane = self._lane(target)
+        lane['queued'] += 1
+        try:
+            async with lane['lock']:
+                await self._wait(lane['bucket'], lane)
+                yield
+        finally:
+            lane['queued'] -= 1
+
+    async def throttle_account(self, account: str):
+        """等待平台账号的全局令牌桶"""
+        if self.account_rate <= 0:
+            return
+        state = self.accounts.get(account)
+        if state is None:
+            state = self.accounts[account] = {
+                'bucket': TokenBucket(self.account_rate, self.account_burst),
+                'throttled': 0
+            }
+        await self._wait(state['bucket'], state)
+
+    def stats(self) -> Dict[str, Any]:
+        """发送调度器统计信息，queues只列出排队最长的10个目标"""
+        busy_lanes = sorted(
+            ((target, lane) for target, lane in self.lanes.items() if lane['queued'] > 0),
+            key=lambda item: item[1]['queued'], reverse=True
+        )
+        return {
+            'enabled': self.target_rate > 0 or self.account_rate > 0,
+            'target_rate': self.target_rate,
+            'target_burst': self.target_burst,
+            'account_rate': self.account_rate,
+            'account_burst': self.account_burst,
+            'queued': sum(lane['queued'] for lane in self.lanes.values()),
+            'busy_targets': len(busy_lanes),
+            'queues': [
+                {'target': target, 'queued': lane['queued'], 'throttled': lane['throttled']}
+                for target, lane in busy_lanes[:10]
+            ],
+            'accounts': {account: {'throttled': state['throttled']} for account, state in self.accounts.items()},
+            'throttled': self.throttled,
+            'avg_throttle_ms': round(self.total_delay / self.throttled * 1000, 1) if self.throttled else 0.0,
+            'max_throttle_ms': round(self.max_delay * 1000, 1)
+        }
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+异步任务模式测试：X-Async: true 返回202和任务ID，通过 /api/jobs/{id} 查询进度和结果
+"""
+
+import requests
+import time
+
+# 测试配置
+BASE_URL = "http://localhost:11451"
+API_PATH = "/api/render/image"
+AUTH_TOKEN = ""  # 如果配置了auth_token，请填写
+TARGET_GROUP_ID = "000000000"  # 使用无效ID避免实际发送
+POLL_INTERVAL = 0.5
+POLL_TIMEOUT = 60
+
+def auth_headers():
+    return {'Authorization': f'Bearer {AUTH_TOKEN}'} if AUTH_TOKEN else {}
+
+def wait_for_job(job_url):
+    """轮询任务状态直到结束（done或failed），返回最后一次查询到的任务"""
+    deadline = time.time() + POLL_TIMEOUT
+    last_status = None
+    while time.time() < deadline:
+        response = requests.get(f"{BASE_URL}{job_url}", headers=auth_headers(), timeout=10)
+        if response.status_code != 200:
+            print(f"❌ 查询任务失败: {response.status_code} {response.text}")
+            return None
+        job = response.json()['job']
+        if job['status'] != last_status:
+            print(f"   ⏳ 任务状态: {job['status']}")
+            last_status = job['status']
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(POLL_INTERVAL)
+    print("❌ 等待任务结束超时")
+    return None
+
+def submit(headers, files):
+    """提交异步请求，返回202响应中的任务信息"""
+    start_time = time.time()
+    response = requests.post(
+        f"{BASE_URL}{API_PATH}",
+        headers={**auth_headers(), **headers, 'X-Async': 'true'},
+        files=files,
+        timeout=30
+    )
+    elapsed_ms = (time.time() - start_time) * 1000
+    print(f"📊 响应状态码: {response.status_code}（{elapsed_ms:.0f}ms）")
+    if response.status_code != 202:
+        print(f"❌ 期望202，实际响应: {response.text}")
+        return None
+    result = response.json()
+    print(f"🆔 任务ID: {result['job_id']}")
+    return result
+
+def test_async_template_job():
+    """模板渲染任务：立即返回202，渲染和发送在后台完成"""
+    print("🚀 测试异步模板渲染任务...")
+    print("-" * 50)
+    test_data = {
+        'title': '异步任务测试',
+        'content': '这条消息在后台渲染和发送，请求立即返回任务ID',
+        'timestamp': '2024-10-30 15:30:00'
+    }
+    headers = {
+        'X-Html-Template': 'notification',
+        'X-Target-Type': 'group',
+        'X-Target-Id': TARGET_GROUP_ID
+    }
+    try:
+        accepted = submit(headers, {k: (None, v) for k, v in test_data.items()})
+        if not accepted:
+            return False
+        job = wait_for_job(accepted['job_url'])
+        if not job:
+            return False
+        print(f"📄 最终状态: {job['status']}，HTTP状态码: {job.get('http_status')}")
+        print(f"⏱️ 各阶段耗时: {job.get('timings')}")
+        print(f"📋 结果: {job.get('result')}")
+        # 无效目标ID发送失败是预期的，只要任务正常结束即可
+        print("✅ 异步模板任务完成" if job['status'] == 'done' else "✅ 异步模板任务已结束（发送失败是预期的）")
+        return True
+    except requests.exceptions.ConnectionError:
+        print("❌ 连接失败: 请确保AstrBot服务正在运行")
+        return False
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_async_text_job():
+    """直接消息任务：没有渲染阶段，状态直接从queued进入sending"""
+    print("\n🚀 测试异步文本消息任务...")
+    print("-" * 50)
+    headers = {
+        'X-Message-Type': 'text',
+        'X-Target-Type': 'group',
+        'X-Target-Id': TARGET_GROUP_ID
+    }
+    try:
+        accepted = submit(headers, {'text': (None, '异步文本消息测试')})
+        if not accepted:
+            return False
+        job = wait_for_job(accepted['job_url'])
+        if not job:
+            return False
+        print(f"📄 最终状态: {job['status']}，阶段: {list(job.get('timings', {}))}")
+        return True
+    except requests.exceptions.ConnectionError:
+        print("❌ 连接失败: 请确保AstrBot服务正在运行")
+        return False
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_unknown_job():
+    """不存在或已过期的任务返回404"""
+    print("\n🚀 测试查询不存在的任务...")
+    print("-" * 50)
+    try:
+        response = requests.get(f"{BASE_URL}/api/jobs/not-exists", headers=auth_headers(), timeout=10)
+        print(f"📊 响应状态码: {response.status_code}")
+        if response.status_code == 404:
+            print("✅ 不存在的任务返回404")
+            return True
+        print(f"❌ 期望404，实际响应: {response.text}")
+        return False
+    except requests.exceptions.ConnectionError:
+        print("❌ 连接失败: 请确保AstrBot服务正在运行")
+        return False
+
+if __name__ == "__main__":
+    results = [test_async_template_job(), test_async_text_job(), test_unknown_job()]
+
+    print("\n" + "="*50)
+    print(f"📊 测试结果: {sum(results)}/{len(results)} 通过")
+    print("📝 说明:")
+    print("使用无效的群号时任务最终为failed（HTTP状态码500），这是为了避免在测试中实际发送消息")
+    print("启用发件箱（outbox_enabled为true）且平台暂时不可用时，任务会先进入retrying状态，重试结束后再变为done或failed")
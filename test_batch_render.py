@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+批量渲染接口测试
+"""
+
+import requests
+import json
+import time
+
+# 测试配置
+BASE_URL = "http://localhost:11451"
+BATCH_PATH = "/api/render/image/batch"
+AUTH_TOKEN = ""  # 如果配置了auth_token，请填写
+TARGET_GROUP_ID = "000000000"  # 使用无效ID避免实际发送
+
+def test_batch_render():
+    """测试批量渲染，并按完成顺序逐行读取NDJSON结果"""
+
+    jobs = [
+        {
+            'id': f'job-{i}',
+            'template': 'notification',
+            'target_type': 'group',
+            'target_id': TARGET_GROUP_ID,
+            'fields': {
+                'title': f'批量通知 #{i}',
+                'content': f'这是批量渲染测试中的第 {i} 条消息',
+                'timestamp': '2024-10-30 15:30:00'
+            }
+        }
+        for i in range(1, 6)
+    ]
+    # 故意加入一个不存在的模板，验证单项错误不影响其他项
+    jobs.append({'id': 'job-bad', 'template': 'not_exists', 'target_type': 'group', 'target_id': TARGET_GROUP_ID})
+
+    headers = {}
+    if AUTH_TOKEN:
+        headers['Authorization'] = f'Bearer {AUTH_TOKEN}'
+
+    print("🚀 开始测试批量渲染接口...")
+    print(f"📡 API地址: {BASE_URL}{BATCH_PATH}")
+    print(f"📦 任务数量: {len(jobs)}")
+    print("-" * 50)
+
+    try:
+        start_time = time.time()
+        response = requests.post(f"{BASE_URL}{BATCH_PATH}", headers=headers, json=jobs, stream=True, timeout=120)
+        print(f"📊 响应状态码: {response.status_code}")
+
+        if response.status_code != 200:
+            print(f"❌ 请求失败: {response.text}")
+            return False
+
+        summary = None
+        for line in response.iter_lines():
+            if not line:
+                continue
+            result = json.loads(line)
+            elapsed = time.time() - start_time
+            if result.get('done'):
+                summary = result
+                continue
+            print(f"   [{elapsed:6.2f}s] #{result['index']} {result.get('id')}: "
+                  f"{result['http_status']} {result.get('message')}")
+
+        if summary:
+            print(f"\n📋 汇总: 共 {summary['total']} 项，成功 {summary['succeeded']} 项，"
+                  f"等待重试 {summary.get('retrying', 0)} 项，失败 {summary['failed']} 项")
+            return True
+
+        print("❌ 没有收到汇总行，响应可能被中断")
+        return False
+
+    except requests.exceptions.ConnectionError:
+        print("❌ 连接失败: 请确保AstrBot服务正在运行")
+        return False
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    test_batch_render()
+
+    print("\n" + "="*50)
+    print("📝 说明:")
+    print("使用无效的群号时发送会失败，返回500，可以观察到结果按完成顺序逐行返回")
+    print("启用发件箱（outbox_enabled为true）且平台暂时不可用时返回202（status为retrying，发件箱稍后重试）")
+    print("不存在的模板会单独返回400，不影响其他任务")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Idempotency-Key测试：重复请求返回保存的响应，同一个键用于不同的请求返回422
+"""
+
+import requests
+import uuid
+
+# 测试配置
+BASE_URL = "http://localhost:11451"
+API_PATH = "/api/render/image"
+AUTH_TOKEN = ""  # 如果配置了auth_token，请填写
+TARGET_GROUP_ID = "000000000"  # 使用无效ID避免实际发送
+
+TEST_DATA = {
+    'title': '幂等请求测试',
+    'content': '同一个Idempotency-Key只处理一次，重复请求直接返回第一次的响应',
+    'timestamp': '2024-10-30 15:30:00'
+}
+
+def build_headers(idempotency_key, **extra):
+    headers = {
+        'X-Html-Template': 'notification',
+        'X-Target-Type': 'group',
+        'X-Target-Id': TARGET_GROUP_ID,
+        # 异步模式返回202，会被保存；同步发送到无效群号返回500，5xx响应不保存
+        'X-Async': 'true',
+        'Idempotency-Key': idempotency_key
+    }
+    if AUTH_TOKEN:
+        headers['Authorization'] = f'Bearer {AUTH_TOKEN}'
+    headers.update(extra)
+    return headers
+
+def post(headers, data):
+    response = requests.post(
+        f"{BASE_URL}{API_PATH}",
+        headers=headers,
+        files={k: (None, v) for k, v in data.items()},
+        timeout=30
+    )
+    replayed = response.headers.get('Idempotent-Replayed', 'false')
+    print(f"📊 响应状态码: {response.status_code}，Idempotent-Replayed: {replayed}")
+    return response
+
+def test_replay():
+    """同一个键、同样的请求：第二次直接返回保存的响应"""
+    print("🚀 测试重复请求返回保存的响应...")
+    print("-" * 50)
+    key = uuid.uuid4().hex
+    try:
+        first = post(build_headers(key), TEST_DATA)
+        second = post(build_headers(key), TEST_DATA)
+        if second.headers.get('Idempotent-Replayed') != 'true':
+            print("❌ 第二次请求没有返回保存的响应")
+            return False
+        if second.status_code != first.status_code or second.content != first.content:
+            print("❌ 保存的响应和第一次的响应不一致")
+            return False
+        print(f"✅ 第二次请求返回了同一个任务: {second.json().get('job_id')}")
+        return True
+    except requests.exceptions.ConnectionError:
+        print("❌ 连接失败: 请确保AstrBot服务正在运行")
+        return False
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_conflict():
+    """同一个键用于不同的请求体或请求头时返回422"""
+    print("\n🚀 测试同一个键用于不同的请求...")
+    print("-" * 50)
+    key = uuid.uuid4().hex
+    try:
+        post(build_headers(key), TEST_DATA)
+
+        print("📝 修改请求体字段:")
+        changed_body = post(build_headers(key), {**TEST_DATA, 'content': '内容不同的请求'})
+        print("📝 修改目标请求头:")
+        changed_header = post(build_headers(key, **{'X-Target-Id': '000000001'}), TEST_DATA)
+
+        if changed_body.status_code == 422 and changed_header.status_code == 422:
+            print(f"✅ 返回422: {changed_body.json().get('message')}")
+            return True
+        print("❌ 期望两次都返回422")
+        return False
+    except requests.exceptions.ConnectionError:
+        print("❌ 连接失败: 请确保AstrBot服务正在运行")
+        return False
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def show_idempotency_stats():
+    """查看健康检查中的幂等统计"""
+    print("\n🏥 幂等统计:")
+    print("-" * 50)
+    try:
+        stats = requests.get(f"{BASE_URL}/health", timeout=10).json().get('idempotency', {})
+        print(f"   - 保存的键: {stats.get('keys')} / {stats.get('max_keys')}")
+        print(f"   - 处理中: {stats.get('in_progress')}")
+        print(f"   - 返回保存的响应: {stats.get('replayed')}")
+        print(f"   - 等待处理中的请求: {stats.get('waited')}")
+        print(f"   - 键用于不同的请求: {stats.get('mismatched')}")
+    except Exception as e:
+        print(f"❌ 获取统计失败: {e}")
+
+if __name__ == "__main__":
+    results = [test_replay(), test_conflict()]
+    show_idempotency_stats()
+
+    print("\n" + "="*50)
+    print(f"📊 测试结果: {sum(results)}/{len(results)} 通过")
+    print("📝 说明:")
+    print("5xx和429响应不保存，生产者用同一个键重试时会重新处理")
+    print("指纹包含请求路径、决定请求含义的请求头（X-Message-Type、X-Html-Template、X-Target-*、X-Platform、X-Async）和请求体摘要")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试本地二维码生成：直接调用 qr_encoder 输出PNG/SVG文件，再通过模板请求检查二维码缓存命中
+"""
+
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from qr_encoder import generate_qr_code
+
+# 测试配置
+BASE_URL = "http://localhost:11451"
+API_PATH = "/api/render/image"
+AUTH_TOKEN = ""  # 如果配置了auth_token，请填写
+TARGET_GROUP_ID = "000000000"  # 使用无效ID避免实际发送
+TEST_LINK = "https://github.com/Akinokuni/astrbot_plugin_http_render_bridge"
+OUTPUT_NAME = "test_qr_local"
+
+def test_local_encoder():
+    """本地生成PNG和SVG二维码并写入文件，可以用手机扫码确认内容"""
+    print("🚀 测试本地二维码编码器...")
+    print("-" * 50)
+    try:
+        for image_format in ('png', 'svg'):
+            start_time = time.perf_counter()
+            image = generate_qr_code(TEST_LINK, error_correction='M', image_format=image_format)
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            path = f"{OUTPUT_NAME}.{image_format}"
+            with open(path, 'wb') as f:
+                f.write(image)
+            print(f"✅ {image_format.upper()}: {len(image)} 字节，耗时 {elapsed_ms:.1f}ms，已保存到 {path}")
+
+        png = generate_qr_code(TEST_LINK, image_format='png')
+        if not png.startswith(b'\x89PNG\r\n\x1a\n'):
+            print("❌ PNG数据格式不正确")
+            return False
+        svg = generate_qr_code(TEST_LINK, image_format='svg')
+        if b'<svg' not in svg:
+            print("❌ SVG数据格式不正确")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def get_qr_cache_stats():
+    return requests.get(f"{BASE_URL}/health", timeout=10).json().get('qr_cache', {})
+
+def render_with_link(link):
+    headers = {
+        'X-Html-Template': 'success',
+        'X-Target-Type': 'group',
+        'X-Target-Id': TARGET_GROUP_ID
+    }
+    if AUTH_TOKEN:
+        headers['Authorization'] = f'Bearer {AUTH_TOKEN}'
+    test_data = {
+        'title': '本地二维码测试',
+        'message': '扫码查看项目',
+        'link': link
+    }
+    start_time = time.time()
+    response = requests.post(
+        f"{BASE_URL}{API_PATH}",
+        headers=headers,
+        files={k: (None, v) for k, v in test_data.items()},
+        timeout=30
+    )
+    elapsed_ms = (time.time() - start_time) * 1000
+    print(f"📊 响应状态码: {response.status_code}（{elapsed_ms:.0f}ms）")
+
+def test_qr_cache():
+    """同一个链接第一次生成二维码，第二次命中缓存"""
+    print("\n🚀 测试模板请求的二维码缓存...")
+    print("-" * 50)
+    # 每次运行使用不同的链接，避免命中上次运行留下的磁盘缓存
+    link = f"{TEST_LINK}?t={int(time.time())}"
+    print(f"🔗 链接: {link}")
+    try:
+        before = get_qr_cache_stats()
+        render_with_link(link)
+        first = get_qr_cache_stats()
+        render_with_link(link)
+        second = get_qr_cache_stats()
+
+        first_misses = first['misses'] - before['misses']
+        second_hits = (second['memory_hits'] + second['disk_hits']) - (first['memory_hits'] + first['disk_hits'])
+        print(f"📋 第一次请求: 未命中 +{first_misses}")
+        print(f"📋 第二次请求: 命中 +{second_hits}")
+        print(f"🏥 二维码缓存: {second['entries']} 项，命中率 {second['hit_rate']}")
+        if first_misses == 1 and second_hits == 1:
+            print("✅ 第二次请求复用了缓存的二维码")
+            return True
+        print("❌ 缓存统计不符合预期")
+        return False
+    except requests.exceptions.ConnectionError:
+        print("❌ 连接失败: 请确保AstrBot服务正在运行")
+        return False
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    results = [test_local_encoder(), test_qr_cache()]
+
+    print("\n" + "="*50)
+    print(f"📊 测试结果: {sum(results)}/{len(results)} 通过")
+    print("📝 说明:")
+    print("qr_engine为local（默认）时二维码在本地生成，不需要访问在线API；qr_format可选png或svg")
+    print(f"生成的 {OUTPUT_NAME}.png 和 {OUTPUT_NAME}.svg 可以用手机扫码确认内容正确")
+    print("使用无效的群号时发送会失败，这是为了避免在测试中实际发送消息，二维码在渲染前已经生成")
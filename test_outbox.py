@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+发件箱测试：发送失败的消息进入重试或死信表，查询死信任务并重新投递
+
+需要在插件配置中开启 outbox_enabled，否则死信接口返回503。
+"""
+
+import requests
+import time
+
+# 测试配置
+BASE_URL = "http://localhost:11451"
+API_PATH = "/api/render/image"
+AUTH_TOKEN = ""  # 如果配置了auth_token，请填写
+TARGET_GROUP_ID = "000000000"  # 使用无效ID，发送会失败
+
+def auth_headers():
+    return {'Authorization': f'Bearer {AUTH_TOKEN}'} if AUTH_TOKEN else {}
+
+def get_outbox_stats():
+    return requests.get(f"{BASE_URL}/health", timeout=10).json().get('outbox', {})
+
+def show_outbox_stats():
+    stats = get_outbox_stats()
+    print("🏥 发件箱状态:")
+    print(f"   - 等待重试: {stats.get('retrying')}，未完成: {stats.get('pending')}，死信: {stats.get('dead')}")
+    print(f"   - 写入: {stats.get('writes')}，提交: {stats.get('commits')}，每次提交的写入数: {stats.get('writes_per_commit')}")
+
+def test_failed_send():
+    """发送到无效群号：暂时性失败返回202并安排重试，平台拒绝（如群不存在）返回500并直接移入死信表"""
+    print("🚀 测试发送失败的消息...")
+    print("-" * 50)
+    headers = {
+        **auth_headers(),
+        'X-Message-Type': 'text',
+        'X-Target-Type': 'group',
+        'X-Target-Id': TARGET_GROUP_ID
+    }
+    try:
+        if not get_outbox_stats().get('enabled'):
+            print("❌ 发件箱未启用，请在插件配置中开启 outbox_enabled")
+            return False
+        before = get_outbox_stats()
+
+        response = requests.post(
+            f"{BASE_URL}{API_PATH}",
+            headers=headers,
+            files={'text': (None, f'发件箱测试 {time.strftime("%H:%M:%S")}')},
+            timeout=30
+        )
+        result = response.json()
+        print(f"📊 响应状态码: {response.status_code}")
+        print(f"📄 响应内容: {result}")
+
+        after = get_outbox_stats()
+        show_outbox_stats()
+        if response.status_code == 202 and result.get('status') == 'retrying':
+            print(f"✅ 发送失败，任务 {result['outbox']['id']} 将在 {result['outbox']['retry_in']} 秒后重试")
+            return True
+        if response.status_code == 500 and after.get('dead', 0) > before.get('dead', 0):
+            print("✅ 平台拒绝发送，任务已移入死信表")
+            return True
+        if response.status_code == 200:
+            print("⚠️ 消息发送成功，请把 TARGET_GROUP_ID 改为无效的群号")
+            return False
+        print("❌ 响应不符合预期")
+        return False
+    except requests.exceptions.ConnectionError:
+        print("❌ 连接失败: 请确保AstrBot服务正在运行")
+        return False
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_dead_letters():
+    """查询死信任务并重新投递第一个"""
+    print("\n🚀 测试死信查询和重新投递...")
+    print("-" * 50)
+    try:
+        response = requests.get(f"{BASE_URL}/api/outbox/dead", headers=auth_headers(),
+                                params={'limit': 10}, timeout=10)
+        print(f"📊 响应状态码: {response.status_code}")
+        if response.status_code == 503:
+            print("❌ 发件箱未启用，请在插件配置中开启 outbox_enabled")
+            return False
+        dead_letters = response.json()['dead_letters']
+        print(f"📋 死信任务: {len(dead_letters)} 个")
+        for item in dead_letters:
+            print(f"   - {item['id']} {item['kind']} -> {item['targets']}，"
+                  f"尝试 {item['attempts']} 次，错误: {item['last_error']}")
+        if not dead_letters:
+            print("⚠️ 没有死信任务，暂时性失败要重试 outbox_max_attempts 次后才会移入死信表")
+            return True
+
+        entry_id = dead_letters[0]['id']
+        response = requests.post(f"{BASE_URL}/api/outbox/dead/{entry_id}/replay",
+                                 headers=auth_headers(), timeout=10)
+        print(f"📊 重新投递响应状态码: {response.status_code}")
+        print(f"📄 响应内容: {response.json()}")
+        if response.status_code != 202:
+            print("❌ 重新投递失败")
+            return False
+        print(f"✅ 任务 {entry_id} 已移回发件箱")
+        return True
+    except requests.exceptions.ConnectionError:
+        print("❌ 连接失败: 请确保AstrBot服务正在运行")
+        return False
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_replay_unknown():
+    """不存在的死信任务返回404"""
+    print("\n🚀 测试重新投递不存在的任务...")
+    print("-" * 50)
+    try:
+        response = requests.post(f"{BASE_URL}/api/outbox/dead/not-exists/replay",
+                                 headers=auth_headers(), timeout=10)
+        print(f"📊 响应状态码: {response.status_code}")
+        if response.status_code == 404:
+            print("✅ 不存在的任务返回404")
+            return True
+        print(f"❌ 期望404，实际响应: {response.text}")
+        return False
+    except requests.exceptions.ConnectionError:
+        print("❌ 连接失败: 请确保AstrBot服务正在运行")
+        return False
+
+if __name__ == "__main__":
+    results = [test_failed_send(), test_dead_letters(), test_replay_unknown()]
+    print()
+    try:
+        show_outbox_stats()
+    except requests.exceptions.ConnectionError:
+        pass
+
+    print("\n" + "="*50)
+    print(f"📊 测试结果: {sum(results)}/{len(results)} 通过")
+    print("📝 说明:")
+    print("发件箱默认关闭，需要在插件配置中开启 outbox_enabled")
+    print("重新投递的任务会立即重试，目标仍然无效时会再次移入死信表")
+    print("同步请求发送成功时不写入数据库，只有需要重试或移入死信表时才写入")
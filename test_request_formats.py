@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+请求体格式测试：同一个带图片的模板请求分别用multipart/form-data、JSON和MessagePack发送
+"""
+
+import base64
+import io
+import json
+import requests
+from PIL import Image
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 测试配置
+BASE_URL = "http://localhost:11451"
+API_PATH = "/api/render/image"
+AUTH_TOKEN = ""  # 如果配置了auth_token，请填写
+TARGET_GROUP_ID = "000000000"  # 使用无效ID避免实际发送
+
+FIELDS = {
+    'title': '请求体格式测试',
+    'description': '同一个请求分别用multipart、JSON和MessagePack发送'
+}
+
+def create_test_image():
+    """在内存中创建一个测试图片，返回PNG数据"""
+    img = Image.new('RGB', (200, 100), color='lightblue')
+    buffer = io.BytesIO()
+    img.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def build_headers(content_type=None):
+    headers = {
+        'X-Html-Template': 'image_showcase',
+        'X-Target-Type': 'group',
+        'X-Target-Id': TARGET_GROUP_ID
+    }
+    if content_type:
+        headers['Content-Type'] = content_type
+    if AUTH_TOKEN:
+        headers['Authorization'] = f'Bearer {AUTH_TOKEN}'
+    return headers
+
+def report(name, response, body_size):
+    print(f"📊 {name} 响应状态码: {response.status_code}，请求体大小: {body_size} 字节")
+    try:
+        result = response.json()
+    except ValueError:
+        result = {'message': response.text}
+    print(f"📄 响应: {result.get('message')}")
+    return response.status_code
+
+def send_multipart(image):
+    """multipart/form-data：文本字段和文件字段"""
+    files = {k: (None, v) for k, v in FIELDS.items()}
+    files['image'] = ('test_image.png', image, 'image/png')
+    request = requests.Request('POST', f"{BASE_URL}{API_PATH}", headers=build_headers(), files=files).prepare()
+    response = requests.Session().send(request, timeout=30)
+    return report("multipart", response, len(request.body))
+
+def send_json(image):
+    """JSON：文件字段写作 {"filename": ..., "base64": ...}"""
+    payload = dict(FIELDS)
+    payload['image'] = {'filename': 'test_image.png', 'base64': base64.b64encode(image).decode('ascii')}
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    response = requests.post(f"{BASE_URL}{API_PATH}", headers=build_headers('application/json'),
+                             data=body, timeout=30)
+    return report("JSON", response, len(body))
+
+def send_msgpack(image):
+    """MessagePack：文件字段写作 {"filename": ..., "data": <bin>}，不需要base64编码"""
+    payload = dict(FIELDS)
+    payload['image'] = {'filename': 'test_image.png', 'data': image}
+    body = msgpack.packb(payload, use_bin_type=True)
+    response = requests.post(f"{BASE_URL}{API_PATH}", headers=build_headers('application/msgpack'),
+                             data=body, timeout=30)
+    return report("MessagePack", response, len(body))
+
+def send_invalid_json():
+    """格式错误的JSON请求体返回400"""
+    body = b'{"title": '
+    response = requests.post(f"{BASE_URL}{API_PATH}", headers=build_headers('application/json'),
+                             data=body, timeout=30)
+    return report("错误JSON", response, len(body))
+
+def test_request_formats():
+    """三种格式应得到相同的处理结果"""
+    print("🚀 测试请求体格式...")
+    print("-" * 50)
+    image = create_test_image()
+    try:
+        statuses = {'multipart': send_multipart(image), 'JSON': send_json(image)}
+        print("-" * 50)
+        if msgpack is None:
+            print("⚠️ 客户端未安装msgpack，跳过MessagePack测试（pip install msgpack）")
+        else:
+            status = send_msgpack(image)
+            if status == 415:
+                print("⚠️ 服务端未安装msgpack，返回415")
+            else:
+                statuses['MessagePack'] = status
+        print("-" * 50)
+        invalid_status = send_invalid_json()
+
+        print("-" * 50)
+        if len(set(statuses.values())) != 1:
+            print(f"❌ 各格式的处理结果不一致: {statuses}")
+            return False
+        if invalid_status != 400:
+            print("❌ 错误的JSON请求体应返回400")
+            return False
+        print(f"✅ {'、'.join(statuses)} 的处理结果一致（状态码 {next(iter(statuses.values()))}）")
+        return True
+    except requests.exceptions.ConnectionError:
+        print("❌ 连接失败: 请确保AstrBot服务正在运行")
+        return False
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    test_request_formats()
+
+    print("\n📝 说明:")
+    print("使用无效的群号时状态码为500，这是为了避免在测试中实际发送消息，三种格式的状态码一致即可")
+    print("MessagePack为可选依赖，服务端未安装msgpack时返回415，客户端未安装时跳过")
+    print("JSON和MessagePack的字段值可以是列表或对象，模板中可以直接遍历，multipart只能传字符串")